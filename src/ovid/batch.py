@@ -0,0 +1,272 @@
+import csv
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+import re
+import time
+from typing import Any, Callable, Dict, Optional
+
+from pydantic import ValidationError
+
+from .encode import FORMATS
+from .metrics import stage_totals
+from .pipeline import BatchItem, VideoPipeline
+from .registry import ModelSpec, get_model, list_models
+from .request import GenerateRequest, resolve_request
+
+MANIFEST_NAME = "results.jsonl"
+ROW_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+ResultCallback = Callable[[Dict[str, Any]], None]
+
+
+@dataclass
+class Row:
+    id: str
+    request: Optional[GenerateRequest] = None
+    model: Optional[ModelSpec] = None
+    out_path: Optional[Path] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchSummary:
+    ok: int = 0
+    failed: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    failures: list[str] = field(default_factory=list)
+
+
+def read_rows(path: Path) -> list[tuple[str, Dict[str, Any]]]:
+    rows = []
+    with path.open("r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            for number, values in enumerate(csv.DictReader(f), start=1):
+                # Empty cells mean "use the default", as a missing JSON key would.
+                rows.append((str(number), {k: v for k, v in values.items() if k and v != ""}))
+            return rows
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                values = json.loads(line)
+            except ValueError as exc:
+                values = {"__error__": f"Invalid JSON: {exc}"}
+            if not isinstance(values, dict):
+                values = {"__error__": "Each line must be a JSON object."}
+            rows.append((str(number), values))
+    return rows
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+    )
+
+
+def _resolve(row: Row, values: Dict[str, Any], out_dir: Path) -> None:
+    if "__error__" in values:
+        row.error = values["__error__"]
+        return
+    out = values.pop("out", None)
+    try:
+        req = GenerateRequest.model_validate(values)
+    except ValidationError as exc:
+        row.error = _validation_message(exc)
+        return
+    if req.draft or req.refine:
+        row.error = "Drafts and refines are kept per server job; use the HTTP API for them."
+        return
+    model = get_model(req.model) if req.model else next(iter(list_models().values()), None)
+    if model is None:
+        row.error = f"Model '{req.model}' not found." if req.model else "No local models found."
+        return
+    try:
+        resolved = resolve_request(req, model)
+    except RuntimeError as exc:
+        row.error = str(exc)
+        return
+    name = out or f"{row.id}{FORMATS[req.format]}"
+    if Path(name).name != name:
+        row.error = "'out' must be a file name inside the output folder."
+        return
+    row.model = model
+    row.out_path = out_dir / name
+    row.request = resolved.model_copy(update={"model": model.name})
+
+
+def _group_key(row: Row) -> tuple:
+    req = row.request
+    # Rows sharing a key render as one batch on one resident pipeline; post-processing and
+    # encode settings are per batch in generate_batch, so they are part of the key too.
+    return (
+        req.model,
+        req.device,
+        req.dtype,
+        req.sampler,
+        req.steps,
+        req.guidance,
+        req.context(),
+        req.post_process(),
+        req.encode_options(),
+    )
+
+
+class BatchManifest:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        entries: Dict[str, Dict[str, Any]] = {}
+        if not self.path.exists():
+            return entries
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash; that row simply runs again.
+                    continue
+                if isinstance(entry, dict) and "id" in entry:
+                    entries[str(entry["id"])] = entry
+        return entries
+
+    def done(self, row_id: str) -> bool:
+        entry = self.entries.get(row_id)
+        if entry is None or entry.get("status") != "ok":
+            return False
+        return Path(entry.get("output", "")).is_file()
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries[entry["id"]] = entry
+
+
+def _entry(row: Row, status: str, **fields: Any) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "status": status,
+        "model": row.model.name if row.model else None,
+        "output": str(row.out_path) if row.out_path else None,
+        **fields,
+    }
+
+
+def _render(rows: list[Row]) -> None:
+    req = rows[0].request
+    pipeline = VideoPipeline(
+        rows[0].model,
+        device=req.device,
+        dtype=req.dtype,
+        sampler=req.sampler,
+        context=req.context(),
+    )
+    items = [
+        BatchItem(
+            prompt=row.request.prompt,
+            negative_prompt=row.request.negative_prompt,
+            out_path=row.out_path,
+            fps=row.request.fps,
+            seed=row.request.seed,
+        )
+        for row in rows
+    ]
+    pipeline.generate_batch(
+        items,
+        req.frames,
+        req.width,
+        req.height,
+        req.steps,
+        req.guidance,
+        req.post_process(),
+        req.encode_options(),
+    )
+
+
+def run_batch(
+    src: Path,
+    out_dir: Path,
+    batch_size: int,
+    on_result: Optional[ResultCallback] = None,
+) -> BatchSummary:
+    started = time.perf_counter()
+    summary = BatchSummary()
+    manifest = BatchManifest(out_dir / MANIFEST_NAME)
+
+    def record(row: Row, status: str, **fields: Any) -> None:
+        entry = _entry(row, status, **fields)
+        manifest.record(entry)
+        if status == "ok":
+            summary.ok += 1
+        else:
+            summary.failed += 1
+            summary.failures.append(row.id)
+        if on_result:
+            on_result(entry)
+
+    pending: list[Row] = []
+    seen: set[str] = set()
+    for number, values in read_rows(src):
+        row_id = str(values.pop("id", number))
+        row = Row(id=row_id)
+        if row_id in seen:
+            row.error = f"Duplicate id '{row_id}'."
+        elif not ROW_ID.match(row_id):
+            row.error = "Ids may only contain letters, digits, '.', '_' and '-'."
+        seen.add(row_id)
+        if row.error is None and manifest.done(row_id):
+            summary.skipped += 1
+            continue
+        if row.error is None:
+            _resolve(row, values, out_dir)
+        if row.error is not None:
+            record(row, "failed", error=row.error)
+            continue
+        pending.append(row)
+
+    # Group by model first, in order of first appearance, so each model loads once.
+    groups: Dict[tuple, list[Row]] = {}
+    for row in pending:
+        groups.setdefault(_group_key(row), []).append(row)
+    models = list(dict.fromkeys(key[0] for key in groups))
+    ordered = sorted(groups.items(), key=lambda group: models.index(group[0][0]))
+
+    def render(rows: list[Row]) -> None:
+        start = time.perf_counter()
+        with stage_totals() as totals:
+            try:
+                _render(rows)
+            except Exception as exc:
+                if len(rows) > 1:
+                    # Render the rows one by one so a single bad row does not fail its batch.
+                    for row in rows:
+                        render([row])
+                    return
+                record(rows[0], "failed", error=str(exc) or type(exc).__name__)
+                return
+        seconds = time.perf_counter() - start
+        stages = {stage: round(value, 3) for stage, value in totals.items()}
+        # The rows render together, so times are per batch; row_seconds is an even share.
+        for row in rows:
+            record(
+                row,
+                "ok",
+                batch_size=len(rows),
+                batch_seconds=round(seconds, 3),
+                batch_stages=stages,
+                row_seconds=round(seconds / len(rows), 3),
+            )
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for _, rows in ordered:
+        for start in range(0, len(rows), batch_size):
+            render(rows[start : start + batch_size])
+    summary.seconds = time.perf_counter() - started
+    return summary
@@ -0,0 +1,86 @@
+import argparse
+from dataclasses import replace
+import itertools
+import json
+from pathlib import Path
+import statistics
+import tempfile
+from typing import Dict, Optional
+
+from ..cache import PipelineCache
+from ..pipeline import BatchItem, StepProgress, VideoPipeline
+from ..registry import ModelSpec
+from .tiny import build_tiny_model, load_spec
+
+
+def seconds_per_step(
+    spec: ModelSpec,
+    cache: PipelineCache,
+    dtype: str,
+    threads: int,
+    frames: int,
+    size: int,
+    steps: int,
+) -> Dict[str, float]:
+    pipeline = VideoPipeline(spec, cache=cache, device="cpu", dtype=dtype, threads=threads)
+    progress: list[StepProgress] = []
+    item = BatchItem(prompt="a cat walking", negative_prompt=None, out_path=Path("unused"), seed=0)
+    pipeline.render_batch([item], frames, size, size, steps, 7.5, on_step=progress.append)
+    # The first step includes lazy initialisation (oneDNN primitives, allocator warm-up).
+    timed = [p.step_seconds for p in progress[1:]] or [p.step_seconds for p in progress]
+    return {"median": statistics.median(timed), "min": min(timed)}
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Seconds per denoising step on CPU.")
+    parser.add_argument("--model", type=Path, default=None, help="Model folder with model.json")
+    parser.add_argument("--dtypes", default="float32,bfloat16")
+    parser.add_argument("--threads", default="1,4")
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=6)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = args.model or build_tiny_model(Path(tmp))
+        base = load_spec(model_dir)
+        cache = PipelineCache(budget_bytes=0, idle_ttl=0)
+        variants = itertools.product(
+            args.dtypes.split(","),
+            [int(t) for t in args.threads.split(",")],
+            (True, False),
+            (True, False),
+        )
+        for dtype, threads, channels_last, inference_mode in variants:
+            extra = {**base.extra, "channels_last": channels_last, "inference_mode": inference_mode}
+            spec = replace(base, extra=extra)
+            timing = seconds_per_step(
+                spec, cache, dtype, threads, args.frames, args.size, args.steps
+            )
+            rows.append(
+                {
+                    "dtype": dtype,
+                    "threads": threads,
+                    "channels_last": channels_last,
+                    "inference_mode": inference_mode,
+                    "seconds_per_step": round(timing["median"], 4),
+                    "best_step": round(timing["min"], 4),
+                }
+            )
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'dtype':>9} {'threads':>7} {'ch_last':>7} {'inf_mode':>8} {'s/step':>8} {'best':>8}")
+    for row in rows:
+        print(
+            f"{row['dtype']:>9} {row['threads']:>7} {str(row['channels_last']):>7} "
+            f"{str(row['inference_mode']):>8} {row['seconds_per_step']:>8.4f} "
+            f"{row['best_step']:>8.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
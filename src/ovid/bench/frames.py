@@ -0,0 +1,106 @@
+import argparse
+import json
+import multiprocessing
+from pathlib import Path
+import resource
+import tempfile
+import time
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+from ..encode import write_video
+from ..longvideo import video_to_uint8
+
+PATHS = ("pil", "vectorized")
+
+
+def _peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _legacy(video, out_path: Path, fps: int) -> tuple[float, float]:
+    import imageio
+
+    start = time.perf_counter()
+    # What output_type="pil" did: float numpy, one PIL image per frame, then back to numpy.
+    images = video[0].permute(0, 2, 3, 1).float().cpu().numpy()
+    images = (images * 255).round().astype("uint8")
+    pil = [Image.fromarray(image) for image in images]
+    frames = [np.array(frame).astype(np.uint8) for frame in pil]
+    converted = time.perf_counter()
+    imageio.mimsave(out_path, frames, fps=fps)
+    return converted - start, time.perf_counter() - converted
+
+
+def _vectorized(video, out_path: Path, fps: int) -> tuple[float, float]:
+    start = time.perf_counter()
+    frames = video_to_uint8(video)[0]
+    converted = time.perf_counter()
+    write_video(frames, out_path, fps)
+    return converted - start, time.perf_counter() - converted
+
+
+def _run(path: str, frames: int, size: int, device: str, fmt: str, results) -> None:
+    import torch
+
+    torch.manual_seed(0)
+    # Stand-in for the VAE output: (batch, frames, channels, h, w) in [0, 1].
+    video = torch.rand(1, frames, 3, size, size, device=device)
+    base = _peak_rss()
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = Path(tmp) / f"clip.{fmt}"
+        run = _legacy if path == "pil" else _vectorized
+        convert, encode = run(video, out_path, 8)
+    results.put(
+        {
+            "frames": frames,
+            "path": path,
+            "convert_seconds": convert,
+            "encode_seconds": encode,
+            "host_peak_mb": max(0, _peak_rss() - base) / 2**20,
+        }
+    )
+
+
+def measure(path: str, frames: int, size: int, device: str, fmt: str) -> Dict:
+    # A fresh process per case keeps the peak RSS of one case out of the next.
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(path, frames, size, device, fmt, results))
+    proc.start()
+    row = results.get(timeout=3600)
+    proc.join()
+    return row
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Decoded frames to encoded file, old vs. new.")
+    parser.add_argument("--frames", default="16,64,240")
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--format", default="mp4", choices=("mp4", "webm"))
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    rows = [
+        measure(path, frames, args.size, args.device, args.format)
+        for frames in (int(f) for f in args.frames.split(","))
+        for path in PATHS
+    ]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'frames':>7} {'path':>11} {'convert':>9} {'encode':>9} {'total':>9} {'host peak':>10}")
+    for row in rows:
+        total = row["convert_seconds"] + row["encode_seconds"]
+        print(
+            f"{row['frames']:>7} {row['path']:>11} {row['convert_seconds']:>8.3f}s "
+            f"{row['encode_seconds']:>8.3f}s {total:>8.3f}s {row['host_peak_mb']:>8.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from ..cache import PipelineCache
+from ..longvideo import ContextWindows
+from ..pipeline import BatchItem, VideoPipeline
+from .tiny import build_tiny_model, load_spec
+
+
+def _rss() -> int:
+    with open("/proc/self/statm", "r", encoding="ascii") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class _PeakSampler(threading.Thread):
+    def __init__(self, interval: float = 0.01) -> None:
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _rss()
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, _rss())
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return max(self.peak, _rss())
+
+
+def _render(
+    model_dir: str,
+    frames: int,
+    size: int,
+    steps: int,
+    device: str,
+    windows: ContextWindows,
+    results: "multiprocessing.Queue",
+) -> None:
+    import torch
+
+    spec = load_spec(Path(model_dir))
+    cache = PipelineCache(budget_bytes=0, idle_ttl=0)
+    pipeline = VideoPipeline(spec, cache=cache, device=device, context=windows)
+    pipeline.load()
+    item = BatchItem(prompt="a cat walking", negative_prompt=None, out_path=Path("unused"), seed=0)
+    received = [0]
+
+    def on_frames(index: int, chunk: np.ndarray) -> None:
+        received[0] += len(chunk)
+
+    cuda = device.startswith("cuda")
+    if cuda:
+        torch.cuda.reset_peak_memory_stats()
+    before = _rss()
+    sampler = _PeakSampler()
+    sampler.start()
+    start = time.perf_counter()
+    rendered = pipeline.render_batch([item], frames, size, size, steps, on_frames=on_frames)
+    elapsed = time.perf_counter() - start
+    peak = sampler.stop()
+    received[0] += sum(len(video) for video in rendered)
+    results.put(
+        {
+            "frames": received[0],
+            "seconds_per_frame": elapsed / frames,
+            "rss_peak_mb": peak / 2**20,
+            "render_mb": (peak - before) / 2**20,
+            "cuda_peak_mb": torch.cuda.max_memory_allocated() / 2**20 if cuda else None,
+        }
+    )
+
+
+def measure(
+    model_dir: Path, frames: int, size: int, steps: int, device: str, windows: ContextWindows
+) -> Dict:
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(
+        target=_render, args=(str(model_dir), frames, size, steps, device, windows, results)
+    )
+    proc.start()
+    row = results.get(timeout=3600)
+    proc.join()
+    return row
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Peak memory and time per frame vs. length.")
+    parser.add_argument("--model", type=Path, default=None, help="Model folder with model.json")
+    parser.add_argument("--frames", default="16,32,64,128")
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--context-length", type=int, default=16)
+    parser.add_argument("--context-stride", type=int, default=4)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = args.model or build_tiny_model(Path(tmp))
+        windows = ContextWindows(args.context_length, args.context_stride)
+        for frames in (int(f) for f in args.frames.split(",")):
+            row = measure(model_dir, frames, args.size, args.steps, args.device, windows)
+            rows.append({"requested": frames, **row})
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'frames':>7} {'s/frame':>9} {'rss peak':>10} {'render':>9} {'cuda peak':>10}")
+    for row in rows:
+        cuda = f"{row['cuda_peak_mb']:>8.1f}MB" if row["cuda_peak_mb"] is not None else "-"
+        print(
+            f"{row['requested']:>7} {row['seconds_per_frame']:>9.4f} "
+            f"{row['rss_peak_mb']:>8.1f}MB {row['render_mb']:>7.1f}MB {cuda:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
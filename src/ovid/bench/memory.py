@@ -0,0 +1,82 @@
+import argparse
+import json
+import math
+from pathlib import Path
+from typing import Dict, Optional
+
+from ..memory import RenderShape, plan_memory
+from ..weights import read_safetensors_header
+
+# Parameter counts of SD 1.5 plus an AnimateDiff v1.5 motion adapter.
+SD15_PARAMS = {"unet": 859_520_964 + 453_213_696, "vae": 83_653_863, "text_encoder": 123_060_480}
+
+
+def weight_sizes(model_json: Path, dtype_bytes: int) -> Dict[str, int]:
+    with model_json.open("r", encoding="utf-8") as f:
+        spec = json.load(f)
+    base_dir = Path(spec["base_model_path"])
+    sizes: Dict[str, int] = {}
+    for name in ("unet", "vae", "text_encoder"):
+        folders = [base_dir / name] + ([Path(spec["adapter_path"])] if name == "unet" else [])
+        for path in (p for folder in folders for p in sorted(folder.glob("*.safetensors"))):
+            _, header = read_safetensors_header(path)
+            numel = sum(math.prod(info["shape"]) for info in header.values())
+            sizes[name] = sizes.get(name, 0) + numel * dtype_bytes
+    return sizes
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Memory plans chosen for budgets and shapes.")
+    parser.add_argument("--model", type=Path, default=None, help="Model folder with model.json")
+    parser.add_argument("--budgets-gb", default="4,6,8,12,16,24")
+    parser.add_argument(
+        "--shapes", default="512x512x16,512x288x32,768x768x16", help="WIDTHxHEIGHTxFRAMES"
+    )
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--dtype-bytes", type=int, default=2)
+    parser.add_argument("--no-sdpa", action="store_true", help="Assume eager attention")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.model:
+        weights = weight_sizes(args.model / "model.json", args.dtype_bytes)
+    else:
+        weights = {name: count * args.dtype_bytes for name, count in SD15_PARAMS.items()}
+    rows = []
+    for shape_spec in args.shapes.split(","):
+        width, height, frames = (int(v) for v in shape_spec.lower().split("x"))
+        shape = RenderShape(args.batch, frames, width, height)
+        for budget_gb in (float(b) for b in args.budgets_gb.split(",")):
+            plan = plan_memory(
+                weights,
+                shape,
+                int(budget_gb * 2**30),
+                dtype_bytes=args.dtype_bytes,
+                sdpa=not args.no_sdpa,
+            )
+            rows.append(
+                {
+                    "shape": shape_spec,
+                    "budget_gb": budget_gb,
+                    "placement": plan.placement,
+                    "vae": plan.vae,
+                    "attention_slicing": plan.attention_slicing,
+                    "peak_gb": round(plan.peak_bytes / 2**30, 2),
+                    "fits": plan.fits,
+                }
+            )
+
+    if args.json:
+        print(json.dumps({"weights": weights, "plans": rows}, indent=2))
+        return
+    print(f"{'shape':>12} {'budget':>7} {'placement':>18} {'vae':>6} {'attn':>5} {'peak':>7}")
+    for row in rows:
+        print(
+            f"{row['shape']:>12} {row['budget_gb']:>6.0f}G {row['placement']:>18} "
+            f"{row['vae']:>6} {str(row['attention_slicing']):>5} {row['peak_gb']:>6.2f}G"
+            + ("" if row["fits"] else "  (over budget)")
+        )
+
+
+if __name__ == "__main__":
+    main()
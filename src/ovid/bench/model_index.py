@@ -0,0 +1,72 @@
+import argparse
+import json
+from pathlib import Path
+import tempfile
+import time
+from typing import Callable, Dict, Optional
+
+from ..registry import ModelIndex, discover_models
+
+
+def _populate(models_dir: Path, count: int) -> None:
+    for i in range(count):
+        model_dir = models_dir / f"model-{i:05d}"
+        model_dir.mkdir()
+        with (model_dir / "model.json").open("w", encoding="utf-8") as f:
+            json.dump({"name": f"model-{i:05d}", "pipeline": "animatediff"}, f)
+
+
+def _per_call(fn: Callable[[], object], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(count: int, repeat: int = 200, root: Optional[Path] = None) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory(dir=root) as tmp:
+        models_dir = Path(tmp)
+        _populate(models_dir, count)
+        name = f"model-{count // 2:05d}"
+        scan_repeat = max(1, min(repeat, 20_000 // max(count, 1)))
+
+        index = ModelIndex(models_dir, rescan_interval=3600)
+        start = time.perf_counter()
+        index.models()
+        cold = time.perf_counter() - start
+
+        rescan = ModelIndex(models_dir, rescan_interval=0)
+        rescan.models()
+        scan_get = _per_call(lambda: discover_models(models_dir).get(name), scan_repeat)
+        return {
+            "models": count,
+            "scan_get_us": scan_get * 1e6,
+            "index_cold_ms": cold * 1e3,
+            "index_get_us": _per_call(lambda: index.get(name), repeat) * 1e6,
+            "index_list_us": _per_call(index.models, repeat) * 1e6,
+            "index_rescan_ms": _per_call(rescan.models, scan_repeat) * 1e3,
+            "parses_after_rescan": rescan.parses,
+        }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Model lookup cost versus model count.")
+    parser.add_argument("--counts", default="10,100,1000,5000")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--root", type=Path, default=None, help="Directory to create models in")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    rows = [run(int(n), args.repeat, args.root) for n in args.counts.split(",")]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    columns = list(rows[0])
+    print("  ".join(f"{column:>20}" for column in columns))
+    for row in rows:
+        cells = [f"{row[c]:.2f}" if isinstance(row[c], float) else str(row[c]) for c in columns]
+        print("  ".join(f"{cell:>20}" for cell in cells))
+
+
+if __name__ == "__main__":
+    main()
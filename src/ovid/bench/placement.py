@@ -0,0 +1,70 @@
+import argparse
+import json
+from pathlib import Path
+import sys
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+from ..pipeline import BatchItem
+from ..registry import ModelSpec
+from ..scheduler import DeviceScheduler, parse_devices
+from .tiny import build_tiny_model, load_spec
+
+
+def _holders(scheduler: DeviceScheduler, spec: ModelSpec) -> list[int]:
+    return [i for i, row in enumerate(scheduler.stats()) if spec.name in row["resident"]]
+
+
+def check(model_dir: Path, frames: int, size: int, steps: int) -> Dict[str, Any]:
+    spec = load_spec(model_dir)
+    scheduler = DeviceScheduler(parse_devices("cpu:1,cpu:1"))
+    scheduler.start()
+    started = threading.Event()
+
+    def render(seed: int, on_step=None) -> None:
+        item = BatchItem(prompt="a cat", negative_prompt=None, out_path=Path("unused"), seed=seed)
+        scheduler.render(spec, [item], frames, size, size, steps, None, on_step=on_step)
+
+    try:
+        scheduler.load(spec)
+        loaded = _holders(scheduler, spec)
+        # The second request arrives while the worker holding the model is busy with the
+        # first; the idle worker must not load a second copy.
+        first = threading.Thread(target=render, args=(0, lambda *_: started.set()))
+        first.start()
+        started.wait(timeout=600)
+        render(1)
+        first.join()
+        resident = _holders(scheduler, spec)
+    finally:
+        scheduler.close()
+    return {"loaded_on": loaded, "resident_on": resident, "ok": resident == loaded}
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Check that requests stay on the CPU worker holding their model."
+    )
+    parser.add_argument("--model", type=Path, default=None, help="Model folder with model.json")
+    parser.add_argument("--frames", type=int, default=4)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=8)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = args.model or build_tiny_model(Path(tmp))
+        report = check(model_dir, args.frames, args.size, args.steps)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"model loaded on worker(s) {report['loaded_on']}")
+        print(f"model resident on worker(s) {report['resident_on']} after two requests")
+    if not report["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import tempfile
+from typing import Dict, Optional
+
+from ..cache import PipelineCache
+from ..pipeline import BatchItem, VideoPipeline
+from .tiny import build_tiny_model, load_spec
+
+
+def memory_breakdown() -> Dict[str, int]:
+    fields = {}
+    with open("/proc/self/smaps_rollup", "r", encoding="ascii") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "private": private,
+        "shared": shared,
+    }
+
+
+def _worker(model_dir: str, share: bool, ready, release, results) -> None:
+    # Set before anything reads the settings, so the load below takes the default CPU path
+    # of a server worker with or without mapped weights.
+    os.environ["OVID_MMAP_WEIGHTS"] = "1" if share else "0"
+    import torch
+
+    torch.set_num_threads(1)
+    spec = load_spec(Path(model_dir))
+    before = memory_breakdown()
+    pipeline = VideoPipeline(spec, cache=PipelineCache(budget_bytes=0, idle_ttl=0), device="cpu")
+    pipeline.load()
+    gc.collect()
+    item = BatchItem(prompt="a cat", negative_prompt=None, out_path=Path("unused"), seed=0)
+    pipeline.render_batch([item], 4, 32, 32, 5)
+    ready.put(None)
+    release.wait()
+    results.put({"share": share, "before": before, "after": memory_breakdown()})
+
+
+def measure(model_dir: Path, workers: int, share: bool) -> list[Dict]:
+    ctx = multiprocessing.get_context("spawn")
+    ready, results, release = ctx.Queue(), ctx.Queue(), ctx.Event()
+    procs = [
+        ctx.Process(target=_worker, args=(str(model_dir), share, ready, release, results))
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    for _ in procs:
+        ready.get(timeout=600)
+    # Every worker is alive while it measures, so PSS reflects the sharing between them.
+    release.set()
+    rows = [results.get(timeout=600) for _ in procs]
+    for proc in procs:
+        proc.join()
+    return rows
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Per-process memory with and without mmap.")
+    parser.add_argument("--model", type=Path, default=None, help="Model folder with model.json")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--channels", default="64,128", help="Tiny model widths")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = args.model
+        if model_dir is None:
+            low, high = (int(c) for c in args.channels.split(","))
+            model_dir = build_tiny_model(Path(tmp), channels=(low, high))
+        report = {
+            mode: measure(model_dir, args.workers, share=mode == "mmap")
+            for mode in ("copy", "mmap")
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    mb = 2**20
+    for mode, rows in report.items():
+        for i, row in enumerate(rows):
+            after, before = row["after"], row["before"]
+            print(
+                f"{mode:>5} worker {i}: private {before['private'] / mb:8.1f} -> "
+                f"{after['private'] / mb:8.1f} MB  pss {after['pss'] / mb:8.1f} MB"
+            )
+        total = sum(row["after"]["private"] for row in rows) / mb
+        print(f"{mode:>5} total private: {total:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import argparse
+from dataclasses import dataclass
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+from typing import Dict, Optional
+
+HEAVY = ("torch", "diffusers", "transformers", "accelerate", "safetensors", "imageio")
+
+MARKER = "OVID-STARTUP "
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    code: str
+    forbidden: tuple[str, ...]
+
+
+SCENARIOS = (
+    Scenario(
+        "cli-models",
+        "from ovid.cli import app\nrun(app, ['models'])",
+        HEAVY + ("numpy", "uvicorn", "fastapi"),
+    ),
+    Scenario(
+        "cli-registry",
+        "from ovid.cli import app\nrun(app, ['registry'])",
+        HEAVY + ("numpy", "uvicorn", "fastapi"),
+    ),
+    Scenario(
+        "cli-help",
+        "from ovid.cli import app\nrun(app, ['--help'])",
+        HEAVY + ("numpy", "uvicorn", "fastapi"),
+    ),
+    Scenario(
+        "server-app",
+        "from ovid.server import create_app\ncreate_app()",
+        HEAVY + ("numpy", "PIL"),
+    ),
+)
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+
+def run(app, args):
+    try:
+        app(args, standalone_mode=False)
+    except BaseException:
+        pass
+
+{code}
+elapsed = time.perf_counter() - start
+print({marker!r} + json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def _parse_importtime(stderr: str) -> tuple[float, Dict[str, float]]:
+    total = 0.0
+    packages: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        cumulative = int(parts[1]) / 1000
+        if not name.startswith("  "):
+            total += cumulative
+        if "." not in name:
+            packages[name.strip()] = max(packages.get(name.strip(), 0.0), cumulative)
+    return total, packages
+
+
+BASELINE = Scenario("baseline", "pass", ())
+
+
+def run_scenario(scenario: Scenario, home: Path) -> Dict:
+    package_root = str(Path(__file__).resolve().parents[2])
+    python_path = os.pathsep.join(filter(None, [package_root, os.getenv("PYTHONPATH")]))
+    env = dict(
+        os.environ,
+        PYTHONPATH=python_path,
+        OVID_HOME=str(home),
+        OVID_REGISTRY=str(home / "registry.json"),
+    )
+    code = PROBE.format(code=scenario.code, marker=MARKER)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=home,
+    )
+    lines = [line for line in proc.stdout.splitlines() if line.startswith(MARKER)]
+    if not lines:
+        raise RuntimeError(f"{scenario.name} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(lines[-1][len(MARKER):])
+    modules = set(result["modules"])
+    import_ms, packages = _parse_importtime(proc.stderr)
+    return {
+        "scenario": scenario.name,
+        "seconds": round(result["seconds"], 3),
+        "import_ms": round(import_ms, 1),
+        "slowest": sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:12],
+        "forbidden": sorted(
+            name for name in scenario.forbidden
+            if name in modules or any(m.startswith(name + ".") for m in modules)
+        ),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Import time of lightweight entry points.")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail above this many ms")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = run_scenario(BASELINE, Path(tmp))
+        rows = [run_scenario(scenario, Path(tmp)) for scenario in SCENARIOS]
+    baseline_modules = {name for name, _ in baseline["slowest"]}
+    for row in rows:
+        row["import_ms"] = round(row["import_ms"] - baseline["import_ms"], 1)
+        slowest = [item for item in row["slowest"] if item[0] not in baseline_modules]
+        row["slowest"] = [item for item in slowest if item[0] != "ovid"][:5]
+
+    failures = []
+    for row in rows:
+        if row["forbidden"]:
+            failures.append(f"{row['scenario']} imported {', '.join(row['forbidden'])}")
+        if args.budget_ms is not None and row["import_ms"] > args.budget_ms:
+            failures.append(f"{row['scenario']} took {row['import_ms']} ms to import")
+
+    if args.json:
+        print(json.dumps({"results": rows, "failures": failures}, indent=2))
+    else:
+        for row in rows:
+            slowest = ", ".join(f"{name} {ms:.0f}ms" for name, ms in row["slowest"])
+            print(f"{row['scenario']:>14}  {row['import_ms']:>8.1f} ms  ({slowest})")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
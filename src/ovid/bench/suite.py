@@ -0,0 +1,344 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import platform
+import queue
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+import urllib.request
+
+from .startup import BASELINE, SCENARIOS, run_scenario
+from .tiny import build_tiny_model
+
+PHASES = ("startup", "pipeline", "server")
+PROMPT = "a paper boat drifting down a rainy street"
+
+# Changes smaller than these are noise on a shared CPU, whatever the relative change.
+FLOORS = {"seconds": 0.02, "ms": 10.0, "mb": 10.0, "per_second": 0.05}
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _pipeline_phase(model: str, runs: int, frames: int, size: int, steps: int, results) -> None:
+    from ..metrics import stage_totals
+    from ..pipeline import VideoPipeline
+    from ..registry import get_model
+
+    spec = get_model(model)
+    pipeline = VideoPipeline(spec, device="cpu")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in range(runs):
+            start = time.perf_counter()
+            with stage_totals() as totals:
+                pipeline.generate(
+                    PROMPT,
+                    None,
+                    Path(tmp) / f"{run}.mp4",
+                    frames=frames,
+                    width=size,
+                    height=size,
+                    steps=steps,
+                    seed=run,
+                )
+            rows.append({"total": time.perf_counter() - start, **totals})
+    # The first run loads the model and warms up oneDNN; the rest show the steady state.
+    warm = rows[1:] or rows
+    stages = sorted({stage for row in warm for stage in row} - {"total", "model_load"})
+    results.put(
+        {
+            "cold_seconds": round(rows[0]["total"], 3),
+            "load_seconds": round(rows[0].get("model_load", 0.0), 3),
+            "warm_seconds": round(statistics.median(row["total"] for row in warm), 3),
+            "stages": {
+                f"{stage}_seconds": round(
+                    statistics.median(row.get(stage, 0.0) for row in warm), 4
+                )
+                for stage in stages
+            },
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+        }
+    )
+
+
+def _post(url: str, body: Dict[str, Any]) -> float:
+    request = urllib.request.Request(
+        url, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=3600) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def _server_phase(
+    model: str, clients: list[int], requests: int, frames: int, size: int, steps: int, results
+) -> None:
+    import uvicorn
+
+    from ..server import create_app
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(create_app(), host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    url = f"http://127.0.0.1:{port}/v1/generate"
+    seeds = iter(range(1, 1 << 30))
+
+    def body() -> Dict[str, Any]:
+        return {
+            "prompt": PROMPT,
+            "model": model,
+            "frames": frames,
+            "width": size,
+            "height": size,
+            "steps": steps,
+            "seed": next(seeds),
+            "preview": False,
+        }
+
+    try:
+        _post(url, body())
+        rows = {}
+        for count in clients:
+            with ThreadPoolExecutor(max_workers=count) as pool:
+                start = time.perf_counter()
+                latencies = list(pool.map(lambda _: _post(url, body()), range(requests)))
+                elapsed = time.perf_counter() - start
+            rows[f"clients_{count}"] = {
+                "clips_per_second": round(requests / elapsed, 3),
+                "latency_p50_seconds": round(statistics.median(latencies), 3),
+                "latency_p95_seconds": round(_percentile(latencies, 0.95), 3),
+            }
+    finally:
+        server.should_exit = True
+        thread.join(timeout=30)
+    results.put({**rows, "peak_rss_mb": round(_peak_rss_mb(), 1)})
+
+
+def _spawn(phase: str, target, *args: Any) -> Dict[str, Any]:
+    # A process per phase keeps each phase's imports and peak RSS to itself.
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    proc = ctx.Process(target=target, args=(*args, results))
+    proc.start()
+    deadline = time.monotonic() + 3600
+    try:
+        while time.monotonic() < deadline:
+            alive = proc.is_alive()
+            try:
+                return results.get(timeout=1.0)
+            except queue.Empty:
+                # Checked before the wait, so a result put just before exiting still arrives.
+                if not alive:
+                    raise RuntimeError(
+                        f"The {phase} phase failed (exit code {proc.exitcode}); "
+                        "its traceback is above."
+                    ) from None
+        raise RuntimeError(f"The {phase} phase did not finish within an hour.")
+    finally:
+        if proc.is_alive():
+            proc.terminate()
+        proc.join()
+
+
+def _startup_phase(home: Path) -> Dict[str, Any]:
+    baseline = run_scenario(BASELINE, home)["import_ms"]
+    return {
+        scenario.name: {
+            "import_ms": round(run_scenario(scenario, home)["import_ms"] - baseline, 1)
+        }
+        for scenario in SCENARIOS
+    }
+
+
+def _versions() -> Dict[str, Optional[str]]:
+    from importlib.metadata import PackageNotFoundError, version
+
+    found: Dict[str, Optional[str]] = {}
+    for name in ("ovid", "torch", "diffusers", "transformers"):
+        try:
+            found[name] = version(name)
+        except PackageNotFoundError:
+            found[name] = None
+    return found
+
+
+def run_suite(
+    phases: tuple[str, ...] = PHASES,
+    clients: tuple[int, ...] = (1, 4),
+    requests: int = 8,
+    runs: int = 3,
+    frames: int = 8,
+    size: int = 128,
+    steps: int = 5,
+) -> Dict[str, Any]:
+    report: Dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "versions": _versions(),
+            "config": {
+                "clients": list(clients),
+                "requests": requests,
+                "runs": runs,
+                "frames": frames,
+                "size": size,
+                "steps": steps,
+            },
+        }
+    }
+    names = ("OVID_HOME", "OVID_MODELS", "OVID_OUTPUTS", "OVID_RESULT_CACHE_MB")
+    saved = {name: os.environ.get(name) for name in names}
+    with tempfile.TemporaryDirectory() as tmp:
+        home = Path(tmp)
+        # Spawned phases inherit this environment: a private home with the tiny model in
+        # models/, and no result cache so every request renders.
+        os.environ["OVID_HOME"] = str(home)
+        os.environ["OVID_MODELS"] = str(home / "models")
+        os.environ["OVID_OUTPUTS"] = str(home / "outputs")
+        os.environ["OVID_RESULT_CACHE_MB"] = "0"
+        try:
+            if "startup" in phases:
+                report["startup"] = _startup_phase(home)
+            if "pipeline" in phases or "server" in phases:
+                model = build_tiny_model(home / "models").name
+            if "pipeline" in phases:
+                report["pipeline"] = _spawn(
+                    "pipeline", _pipeline_phase, model, runs, frames, size, steps
+                )
+            if "server" in phases:
+                report["server"] = _spawn(
+                    "server",
+                    _server_phase, model, list(clients), requests, frames, size, steps
+                )
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+    return report
+
+
+def flatten(report: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for key, value in report.items():
+        if key == "meta":
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(
+    report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> list[Dict[str, Any]]:
+    current, previous = flatten(report), flatten(baseline)
+    rows = []
+    for name in sorted(current.keys() & previous.keys()):
+        unit = next((unit for unit in FLOORS if name.endswith(unit)), None)
+        if unit is None or previous[name] <= 0:
+            continue
+        higher_is_better = unit == "per_second"
+        change = (current[name] - previous[name]) / previous[name]
+        worse = -change if higher_is_better else change
+        regressed = worse > tolerance and abs(current[name] - previous[name]) > FLOORS[unit]
+        rows.append(
+            {
+                "metric": name,
+                "baseline": previous[name],
+                "current": current[name],
+                "change": round(change, 3),
+                "regressed": regressed,
+            }
+        )
+    return rows
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="End-to-end CPU benchmark on a tiny random AnimateDiff model."
+    )
+    parser.add_argument("--phases", default=",".join(PHASES))
+    parser.add_argument("--clients", default="1,4", help="Concurrent HTTP clients per round")
+    parser.add_argument("--requests", type=int, default=8, help="Requests per round")
+    parser.add_argument("--runs", type=int, default=3, help="Pipeline runs; the first is cold")
+    parser.add_argument("--frames", type=int, default=8)
+    parser.add_argument("--size", type=int, default=128)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--save", type=Path, default=None, help="Write the report here")
+    parser.add_argument("--baseline", type=Path, default=None, help="Compare with this report")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative change")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    phases = tuple(phase for phase in args.phases.split(",") if phase)
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        parser.error(f"unknown phases: {', '.join(sorted(unknown))}")
+    try:
+        report = run_suite(
+            phases,
+            tuple(int(c) for c in args.clients.split(",")),
+            args.requests,
+            args.runs,
+            args.frames,
+            args.size,
+            args.steps,
+        )
+    except RuntimeError as exc:
+        sys.exit(str(exc))
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    comparison = None
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        comparison = compare(report, baseline, args.tolerance)
+        report["comparison"] = comparison
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for name, value in flatten(report).items():
+            print(f"{name:<48} {value:>12g}")
+        for row in comparison or []:
+            flag = "REGRESSION" if row["regressed"] else ""
+            print(
+                f"{row['metric']:<48} {row['baseline']:>10g} -> {row['current']:<10g} "
+                f"{row['change']:+.1%} {flag}"
+            )
+    if comparison and any(row["regressed"] for row in comparison):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import json
+from pathlib import Path
+import string
+from typing import Optional
+
+from ..registry import ModelSpec, discover_models
+
+TOKENS = list(string.ascii_lowercase + string.digits)
+
+
+def _write_tokenizer_files(folder: Path) -> tuple[Path, Path]:
+    folder.mkdir(parents=True, exist_ok=True)
+    vocab = {"<|startoftext|>": 0, "<|endoftext|>": 1}
+    for token in TOKENS + [t + "</w>" for t in TOKENS]:
+        vocab[token] = len(vocab)
+    vocab_path = folder / "vocab.json"
+    merges_path = folder / "merges.txt"
+    with vocab_path.open("w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with merges_path.open("w", encoding="utf-8") as f:
+        f.write("#version: 0.2\n")
+    return vocab_path, merges_path
+
+
+def build_tiny_model(
+    root: Path,
+    name: str = "tiny",
+    channels: tuple[int, int] = (32, 64),
+    cross_attention_dim: int = 32,
+) -> Path:
+    import torch
+    from diffusers import (
+        AutoencoderKL,
+        DDIMScheduler,
+        MotionAdapter,
+        StableDiffusionPipeline,
+        UNet2DConditionModel,
+    )
+    from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+
+    torch.manual_seed(0)
+    base_dir = root / f"{name}-base"
+    adapter_dir = root / f"{name}-adapter"
+    model_dir = root / name
+
+    unet = UNet2DConditionModel(
+        block_out_channels=channels,
+        layers_per_block=2,
+        sample_size=16,
+        in_channels=4,
+        out_channels=4,
+        down_block_types=("CrossAttnDownBlock2D", "DownBlock2D"),
+        up_block_types=("UpBlock2D", "CrossAttnUpBlock2D"),
+        cross_attention_dim=cross_attention_dim,
+        norm_num_groups=8,
+    )
+    vae = AutoencoderKL(
+        block_out_channels=channels,
+        in_channels=3,
+        out_channels=3,
+        down_block_types=("DownEncoderBlock2D", "DownEncoderBlock2D"),
+        up_block_types=("UpDecoderBlock2D", "UpDecoderBlock2D"),
+        latent_channels=4,
+        norm_num_groups=8,
+    )
+    vocab_path, merges_path = _write_tokenizer_files(root / f"{name}-tokenizer")
+    tokenizer = CLIPTokenizer(str(vocab_path), str(merges_path))
+    text_encoder = CLIPTextModel(
+        CLIPTextConfig(
+            bos_token_id=0,
+            eos_token_id=1,
+            pad_token_id=1,
+            hidden_size=cross_attention_dim,
+            intermediate_size=4 * cross_attention_dim,
+            num_attention_heads=4,
+            num_hidden_layers=2,
+            vocab_size=len(tokenizer),
+        )
+    )
+    scheduler = DDIMScheduler(
+        beta_start=0.00085,
+        beta_end=0.012,
+        beta_schedule="linear",
+        clip_sample=False,
+    )
+    base = StableDiffusionPipeline(
+        vae=vae,
+        text_encoder=text_encoder,
+        tokenizer=tokenizer,
+        unet=unet,
+        scheduler=scheduler,
+        safety_checker=None,
+        feature_extractor=None,
+        requires_safety_checker=False,
+    )
+    base.save_pretrained(base_dir, safe_serialization=True)
+
+    adapter = MotionAdapter(
+        block_out_channels=channels,
+        motion_layers_per_block=2,
+        motion_norm_num_groups=8,
+        motion_num_attention_heads=4,
+        motion_max_seq_length=32,
+    )
+    adapter.save_pretrained(adapter_dir, safe_serialization=True)
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+    with (model_dir / "model.json").open("w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "name": name,
+                "pipeline": "animatediff",
+                "adapter_path": str(adapter_dir),
+                "base_model_path": str(base_dir),
+            },
+            f,
+            indent=2,
+        )
+    return model_dir
+
+
+def load_spec(model_dir: Path) -> ModelSpec:
+    for spec in discover_models(model_dir.parent).values():
+        if spec.path.resolve() == model_dir.resolve():
+            return spec
+    raise RuntimeError(f"No model.json found in {model_dir}.")
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Write a tiny random AnimateDiff model.")
+    parser.add_argument("root", type=Path, help="Usually the models/ directory")
+    parser.add_argument("--name", default="tiny")
+    parser.add_argument("--channels", default="32,64", help="UNet/VAE block widths")
+    args = parser.parse_args(argv)
+    low, high = (int(c) for c in args.channels.split(","))
+    print(build_tiny_model(args.root, args.name, (low, high)))
+
+
+if __name__ == "__main__":
+    main()
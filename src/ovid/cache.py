@@ -0,0 +1,225 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import gc
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .config import load_settings
+from .memory import applied_plan
+from .metrics import observe_stage
+
+
+@dataclass(frozen=True)
+class PipelineKey:
+    adapter: str
+    base: str
+    dtype: str
+    device: str
+    channels_last: bool = False
+    lcm_lora: Optional[str] = None
+
+
+@dataclass
+class CacheEntry:
+    key: PipelineKey
+    pipe: Any
+    size_bytes: int
+    load_seconds: float
+    loaded_at: float
+    last_used: float
+    hits: int = 0
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    load_seconds: float = 0.0
+    loads: list[float] = field(default_factory=list)
+
+
+Loader = Callable[[PipelineKey], Tuple[Any, int]]
+
+
+def _release_accelerator_memory() -> None:
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def _describe_plan(pipe: Any) -> Optional[str]:
+    plan = applied_plan(pipe)
+    return plan.describe() if plan else None
+
+
+class PipelineCache:
+    def __init__(
+        self,
+        budget_bytes: int,
+        idle_ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.budget_bytes = budget_bytes
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[PipelineKey, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[PipelineKey, threading.Lock] = {}
+        self._stats = CacheStats()
+        self._reaper: Optional[threading.Thread] = None
+
+    def get(self, key: PipelineKey, loader: Loader) -> Any:
+        self.evict_idle()
+        with self._lock:
+            entry = self._touch(key)
+            if entry:
+                return entry.pipe
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._touch(key)
+                if entry:
+                    return entry.pipe
+                self._stats.misses += 1
+
+            start = self._clock()
+            pipe, size_bytes = loader(key)
+            elapsed = self._clock() - start
+            observe_stage("model_load", elapsed)
+
+            with self._lock:
+                self._stats.load_seconds += elapsed
+                self._stats.loads.append(elapsed)
+                del self._stats.loads[:-32]
+                evicted = self._make_room(size_bytes)
+                now = self._clock()
+                self._entries[key] = CacheEntry(
+                    key=key,
+                    pipe=pipe,
+                    size_bytes=size_bytes,
+                    load_seconds=elapsed,
+                    loaded_at=now,
+                    last_used=now,
+                )
+                self._load_locks.pop(key, None)
+
+        if evicted:
+            del evicted
+            _release_accelerator_memory()
+        return pipe
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def contains(self, key: PipelineKey) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def evict(self, predicate: Callable[[PipelineKey], bool]) -> int:
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            self._stats.evictions += len(keys)
+        if keys:
+            _release_accelerator_memory()
+        return len(keys)
+
+    def evict_idle(self) -> int:
+        if self.idle_ttl <= 0:
+            return 0
+        deadline = self._clock() - self.idle_ttl
+        with self._lock:
+            idle = {key for key, entry in self._entries.items() if entry.last_used < deadline}
+        if not idle:
+            return 0
+        return self.evict(lambda key: key in idle)
+
+    def clear(self) -> int:
+        return self.evict(lambda key: True)
+
+    def start_reaper(self, interval: float = 30.0) -> None:
+        if self.idle_ttl <= 0 or self._reaper is not None:
+            return
+
+        def run() -> None:
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+
+        self._reaper = threading.Thread(target=run, name="ovid-pipeline-reaper", daemon=True)
+        self._reaper.start()
+
+    def stats(self) -> Dict[str, Any]:
+        now = self._clock()
+        with self._lock:
+            entries = [
+                {
+                    "adapter": entry.key.adapter,
+                    "base": entry.key.base,
+                    "dtype": entry.key.dtype,
+                    "device": entry.key.device,
+                    "size_mb": round(entry.size_bytes / 2**20, 1),
+                    "load_seconds": round(entry.load_seconds, 3),
+                    "idle_seconds": round(now - entry.last_used, 1),
+                    "hits": entry.hits,
+                    "memory_plan": _describe_plan(entry.pipe),
+                }
+                for entry in self._entries.values()
+            ]
+            loads = self._stats.loads
+            return {
+                "hits": self._stats.hits,
+                "misses": self._stats.misses,
+                "evictions": self._stats.evictions,
+                "load_seconds_total": round(self._stats.load_seconds, 3),
+                "load_seconds_avg": round(sum(loads) / len(loads), 3) if loads else None,
+                "budget_mb": round(self.budget_bytes / 2**20, 1) if self.budget_bytes else None,
+                "used_mb": round(sum(e.size_bytes for e in self._entries.values()) / 2**20, 1),
+                "idle_ttl": self.idle_ttl,
+                "entries": entries,
+            }
+
+    def _touch(self, key: PipelineKey) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        entry.last_used = self._clock()
+        entry.hits += 1
+        self._stats.hits += 1
+        return entry
+
+    def _make_room(self, size_bytes: int) -> list[CacheEntry]:
+        if self.budget_bytes <= 0:
+            return []
+        evicted = []
+        used = sum(entry.size_bytes for entry in self._entries.values())
+        while self._entries and used + size_bytes > self.budget_bytes:
+            _, entry = self._entries.popitem(last=False)
+            used -= entry.size_bytes
+            evicted.append(entry)
+        self._stats.evictions += len(evicted)
+        return evicted
+
+
+_pipeline_cache: Optional[PipelineCache] = None
+_pipeline_cache_lock = threading.Lock()
+
+
+def get_pipeline_cache() -> PipelineCache:
+    global _pipeline_cache
+    with _pipeline_cache_lock:
+        if _pipeline_cache is None:
+            settings = load_settings()
+            _pipeline_cache = PipelineCache(
+                budget_bytes=settings.pipeline_cache_mb * 2**20,
+                idle_ttl=settings.pipeline_idle_ttl,
+            )
+        return _pipeline_cache
@@ -1,10 +1,8 @@
 from pathlib import Path
 import typer
-import uvicorn
 
 from .config import load_settings
-from .pipeline import VideoPipeline
-from .registry import list_models, get_model, list_remote_models, pull_model
+from .registry import list_models, get_model, list_remote_models, pull_model, verify_model
 
 app = typer.Typer(add_completion=False)
 
@@ -33,17 +31,53 @@ def registry() -> None:
 def pull(
     name: str,
     force: bool = typer.Option(False, "--force", help="Re-download files even if cached"),
+    connections: int | None = typer.Option(
+        None, "--connections", "-c", help="Maximum parallel HTTP connections"
+    ),
+) -> None:
+    from tqdm import tqdm
+
+    with tqdm(total=0, unit="B", unit_scale=True, unit_divisor=1024, desc=name) as bar:
+
+        def progress(done: int, total: int) -> None:
+            bar.total = total
+            bar.update(done - bar.n)
+
+        try:
+            target = pull_model(name, force=force, progress=progress, connections=connections)
+        except (RuntimeError, OSError) as exc:
+            bar.close()
+            typer.echo(str(exc))
+            raise typer.Exit(code=1) from exc
+    typer.echo(f"Pulled {name} into {target}")
+
+
+@app.command()
+def verify(
+    name: str,
+    deep: bool = typer.Option(
+        False, "--deep", help="Re-hash every file instead of trusting the manifest"
+    ),
+    jobs: int | None = typer.Option(None, "--jobs", "-j", help="Parallel hashing processes"),
 ) -> None:
     try:
-        target = pull_model(name, force=force)
-    except RuntimeError as exc:
+        results = verify_model(name, deep=deep, jobs=jobs)
+    except (RuntimeError, OSError) as exc:
         typer.echo(str(exc))
         raise typer.Exit(code=1) from exc
-    typer.echo(f"Pulled {name} into {target}")
+    failed = {path: status for path, status in results.items() if status != "ok"}
+    for path, status in failed.items():
+        typer.echo(f"{status}: {path}")
+    typer.echo(f"{len(results) - len(failed)}/{len(results)} files verified")
+    if failed:
+        raise typer.Exit(code=1)
 
 
 @app.command()
 def serve(host: str = "127.0.0.1", port: int = 8000) -> None:
+    import uvicorn
+
+    # One API process owns the job queue and caches; OVID_DEVICES adds render workers.
     uvicorn.run("ovid.server:create_app", host=host, port=port, factory=True)
 
 
@@ -56,10 +90,27 @@ def generate(
     fps: int = 8,
     width: int = 512,
     height: int = 512,
-    steps: int = 20,
-    guidance: float = 7.5,
+    steps: int | None = typer.Option(None, help="Defaults to the sampler's step count"),
+    guidance: float | None = None,
+    sampler: str | None = typer.Option(None, help="ddim, dpmpp, euler, euler_a, unipc or lcm"),
     negative: str | None = None,
     seed: int | None = None,
+    device: str | None = typer.Option(None, help="cpu, cuda, cuda:N or auto"),
+    dtype: str | None = typer.Option(None, help="float16, bfloat16 or float32"),
+    context_length: int | None = typer.Option(None, help="Frames per temporal window"),
+    context_stride: int | None = typer.Option(None, help="Frames between window starts"),
+    context_weighting: str | None = typer.Option(
+        None, help="pyramid, flat or delayed_reverse_sawtooth"
+    ),
+    interpolate: int = typer.Option(
+        1, min=1, max=8, help="Denoise every Nth frame and interpolate the rest"
+    ),
+    interpolator: str = typer.Option("mc", help="mc, blend or an installed plugin"),
+    render_scale: float = typer.Option(
+        1.0, min=0.25, max=1.0, help="Denoise at this fraction of the size, then upscale"
+    ),
+    upscaler: str = typer.Option("bicubic", help="bicubic, bilinear or an installed plugin"),
+    sharpen: float = typer.Option(0.0, min=0.0, max=2.0, help="Unsharp mask after upscaling"),
 ) -> None:
     models = list_models()
     if not models:
@@ -75,8 +126,21 @@ def generate(
     settings.outputs_dir.mkdir(parents=True, exist_ok=True)
     out_path = out or (settings.outputs_dir / "ovid-output.mp4")
 
+    from .longvideo import ContextWindows
+    from .pipeline import VideoPipeline
+    from .postprocess import PostProcess
+
     try:
-        pipeline = VideoPipeline(model_spec)
+        context = ContextWindows.from_model(
+            model_spec, context_length, context_stride, context_weighting
+        )
+        post = PostProcess(
+            frames, width, height, interpolate, interpolator, render_scale, upscaler, sharpen
+        )
+        post.validate()
+        pipeline = VideoPipeline(
+            model_spec, device=device, dtype=dtype, sampler=sampler, context=context
+        )
         pipeline.generate(
             prompt=prompt,
             negative_prompt=negative,
@@ -88,9 +152,94 @@ def generate(
             steps=steps,
             guidance=guidance,
             seed=seed,
+            post=post,
         )
     except RuntimeError as exc:
         typer.echo(str(exc))
         raise typer.Exit(code=1) from exc
 
     typer.echo(f"Wrote {out_path}")
+
+
+@app.command()
+def batch(
+    src: Path,
+    out: Path | None = typer.Option(None, help="Output folder, defaults to outputs/<name>"),
+    batch_size: int | None = typer.Option(
+        None, min=1, help="Rows rendered together, defaults to OVID_BATCH_MAX"
+    ),
+) -> None:
+    from .batch import MANIFEST_NAME, run_batch
+
+    if not src.is_file():
+        typer.echo(f"{src} not found.")
+        raise typer.Exit(code=1)
+    settings = load_settings()
+    out_dir = out or (settings.outputs_dir / src.stem)
+
+    def report(entry: dict) -> None:
+        if entry["status"] == "ok":
+            typer.echo(
+                f"ok {entry['id']}: {entry['output']} "
+                f"({entry['batch_seconds']:.2f}s for a batch of {entry['batch_size']})"
+            )
+        else:
+            typer.echo(f"failed {entry['id']}: {entry['error']}")
+
+    summary = run_batch(src, out_dir, batch_size or settings.batch_max, on_result=report)
+    typer.echo(
+        f"{summary.ok} ok, {summary.failed} failed, {summary.skipped} already done "
+        f"in {summary.seconds:.1f}s; results in {out_dir / MANIFEST_NAME}"
+    )
+    if summary.failed:
+        raise typer.Exit(code=1)
+
+
+@app.command(
+    context_settings={"allow_extra_args": True, "ignore_unknown_options": True},
+    add_help_option=False,
+    help="End-to-end CPU benchmark on a tiny random model (see ovid bench --help).",
+)
+def bench(ctx: typer.Context) -> None:
+    from .bench.suite import main
+
+    main(ctx.args)
+
+
+@app.command()
+def upscale(
+    src: Path,
+    out: Path | None = typer.Option(None, help="Defaults to <name>-upscaled next to the input"),
+    scale: float = typer.Option(2.0, min=0.1, help="Used unless --width/--height are given"),
+    width: int | None = None,
+    height: int | None = None,
+    upscaler: str = typer.Option("bicubic", help="bicubic, bilinear or an installed plugin"),
+    sharpen: float = typer.Option(0.0, min=0.0, max=2.0, help="Unsharp mask after upscaling"),
+    fps: int | None = typer.Option(None, help="Defaults to the input's frame rate"),
+) -> None:
+    from .encode import EncodeOptions, read_video, write_video
+    from .postprocess import FrameUpscale
+
+    out_path = out or src.with_name(f"{src.stem}-upscaled{src.suffix}")
+    try:
+        first, frames, src_fps = read_video(src)
+        src_height, src_width = first.shape[:2]
+        # Keep the aspect ratio when only one side is given; yuv420 encoders need even sizes.
+        if width is None and height is None:
+            width, height = round(src_width * scale), round(src_height * scale)
+        elif width is None:
+            width = round(src_width * height / src_height)
+        elif height is None:
+            height = round(src_height * width / src_width)
+        width, height = width // 2 * 2, height // 2 * 2
+        upscaled = FrameUpscale(frames, width, height, upscaler, sharpen)
+        result = write_video(
+            upscaled, out_path, fps or src_fps, EncodeOptions.for_path(out_path)
+        )
+    except (RuntimeError, OSError) as exc:
+        typer.echo(str(exc))
+        raise typer.Exit(code=1) from exc
+    typer.echo(
+        f"{src_width}x{src_height} -> {width}x{height} in {result.seconds:.2f}s "
+        f"(upscale {upscaled.seconds:.2f}s): {result.path}"
+    )
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 import os
 from pathlib import Path
+from typing import Optional
 
 
 @dataclass(frozen=True)
@@ -8,10 +9,74 @@ class Settings:
     home: Path
     models_dir: Path
     outputs_dir: Path
+    pipeline_cache_mb: int
+    pipeline_idle_ttl: float
+    queue_size: int
+    job_history: int
+    batch_max: int
+    batch_window: float
+    result_cache_mb: int
+    encode_workers: int
+    encode_queue: int
+    download_connections: int
+    download_segment_mb: int
+    model_rescan_interval: float
+    mmap_weights: bool
+    devices: str
+    memory_budget_mb: int
+    prompt_cache_entries: int
+    prompt_cache_dir: Optional[Path]
+    latents_dir: Path
+    latent_store_mb: int
+    latent_ttl: float
 
 
 def load_settings() -> Settings:
     home = Path(os.getenv("OVID_HOME", Path.cwd())).resolve()
     models_dir = Path(os.getenv("OVID_MODELS", home / "models")).resolve()
     outputs_dir = Path(os.getenv("OVID_OUTPUTS", home / "outputs")).resolve()
-    return Settings(home=home, models_dir=models_dir, outputs_dir=outputs_dir)
+    pipeline_cache_mb = int(os.getenv("OVID_PIPELINE_CACHE_MB", "8192"))
+    pipeline_idle_ttl = float(os.getenv("OVID_PIPELINE_TTL", "900"))
+    queue_size = int(os.getenv("OVID_QUEUE_SIZE", "16"))
+    job_history = int(os.getenv("OVID_JOB_HISTORY", "256"))
+    batch_max = int(os.getenv("OVID_BATCH_MAX", "4"))
+    batch_window = float(os.getenv("OVID_BATCH_WINDOW_MS", "50")) / 1000
+    result_cache_mb = int(os.getenv("OVID_RESULT_CACHE_MB", "10240"))
+    encode_workers = int(os.getenv("OVID_ENCODE_WORKERS", "2"))
+    encode_queue = int(os.getenv("OVID_ENCODE_QUEUE", "4"))
+    download_connections = int(os.getenv("OVID_DOWNLOAD_CONNECTIONS", "4"))
+    download_segment_mb = int(os.getenv("OVID_DOWNLOAD_SEGMENT_MB", "64"))
+    model_rescan_interval = float(os.getenv("OVID_MODEL_RESCAN_SECONDS", "5"))
+    mmap_weights = os.getenv("OVID_MMAP_WEIGHTS", "1").lower() not in ("0", "false", "no")
+    devices = os.getenv("OVID_DEVICES", "")
+    memory_budget_mb = int(os.getenv("OVID_MEMORY_BUDGET_MB", "0"))
+    prompt_cache_entries = int(os.getenv("OVID_PROMPT_CACHE", "256"))
+    prompt_cache_dir = os.getenv("OVID_PROMPT_CACHE_DIR")
+    latents_dir = Path(os.getenv("OVID_LATENTS", home / "latents")).resolve()
+    latent_store_mb = int(os.getenv("OVID_LATENT_STORE_MB", "2048"))
+    latent_ttl = float(os.getenv("OVID_LATENT_TTL", "86400"))
+    return Settings(
+        home=home,
+        models_dir=models_dir,
+        outputs_dir=outputs_dir,
+        pipeline_cache_mb=pipeline_cache_mb,
+        pipeline_idle_ttl=pipeline_idle_ttl,
+        queue_size=queue_size,
+        job_history=job_history,
+        batch_max=batch_max,
+        batch_window=batch_window,
+        result_cache_mb=result_cache_mb,
+        encode_workers=encode_workers,
+        encode_queue=encode_queue,
+        download_connections=download_connections,
+        download_segment_mb=download_segment_mb,
+        model_rescan_interval=model_rescan_interval,
+        mmap_weights=mmap_weights,
+        devices=devices,
+        memory_budget_mb=memory_budget_mb,
+        prompt_cache_entries=prompt_cache_entries,
+        prompt_cache_dir=Path(prompt_cache_dir).resolve() if prompt_cache_dir else None,
+        latents_dir=latents_dir,
+        latent_store_mb=latent_store_mb,
+        latent_ttl=latent_ttl,
+    )
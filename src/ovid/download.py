@@ -0,0 +1,283 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+from typing import Any, BinaryIO, Callable, Optional
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+CHUNK_SIZE = 1024 * 1024
+
+ProgressCallback = Callable[[int, int], None]
+
+
+class TransferProgress:
+    def __init__(self, callback: Optional[ProgressCallback] = None) -> None:
+        self.callback = callback
+        self.done = 0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def add_total(self, size: int) -> None:
+        with self._lock:
+            self.total += size
+            done, total = self.done, self.total
+        if self.callback:
+            self.callback(done, total)
+
+    def advance(self, size: int) -> None:
+        with self._lock:
+            self.done += size
+            done, total = self.done, self.total
+        if self.callback:
+            self.callback(done, total)
+
+
+@dataclass(frozen=True)
+class RemoteInfo:
+    size: Optional[int]
+    ranges: bool
+
+
+def probe(url: str) -> RemoteInfo:
+    try:
+        with urlopen(Request(url, method="HEAD")) as resp:
+            length = resp.headers.get("Content-Length")
+            ranges = resp.headers.get("Accept-Ranges", "").lower() == "bytes"
+            if length is not None and ranges:
+                return RemoteInfo(size=int(length), ranges=True)
+    except HTTPError:
+        length = None
+    with urlopen(Request(url, headers={"Range": "bytes=0-0"})) as resp:
+        content_range = resp.headers.get("Content-Range", "")
+        if resp.status == 206 and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            if total.isdigit():
+                return RemoteInfo(size=int(total), ranges=True)
+        length = resp.headers.get("Content-Length")
+        return RemoteInfo(size=int(length) if length else None, ranges=False)
+
+
+class _SegmentState:
+    def __init__(self, path: Path, url: str, size: int, segment_size: int) -> None:
+        self.path = path
+        self.url = url
+        self.size = size
+        self._lock = threading.Lock()
+        self.segments = self._load(segment_size)
+
+    def _load(self, segment_size: int) -> list[list[int]]:
+        if self.path.exists():
+            try:
+                with self.path.open("r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("url") == self.url and data.get("size") == self.size:
+                    return [list(map(int, seg)) for seg in data["segments"]]
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+        return [
+            [start, min(start + segment_size, self.size) - 1, 0]
+            for start in range(0, self.size, segment_size)
+        ]
+
+    def advance(self, index: int, written: int) -> None:
+        with self._lock:
+            self.segments[index][2] += written
+
+    def save(self) -> None:
+        with self._lock:
+            payload = {"url": self.url, "size": self.size, "segments": self.segments}
+            tmp_path = self.path.with_suffix(".tmp")
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.path)
+
+    def completed(self) -> int:
+        with self._lock:
+            return sum(done for _, _, done in self.segments)
+
+    def frontier(self, offset: int) -> int:
+        with self._lock:
+            for start, end, done in self.segments:
+                if end < offset:
+                    continue
+                if start > offset:
+                    break
+                if start + done <= end:
+                    return max(offset, start + done)
+                offset = end + 1
+            return offset
+
+
+class _OrderedHasher:
+    # Segments finish out of order; bytes are hashed from memory when they extend the
+    # hashed prefix and read back (from the page cache) only when a later segment got
+    # ahead of it.
+    def __init__(self, path: Path, state: _SegmentState) -> None:
+        self.path = path
+        self.state = state
+        self.offset = 0
+        self._hash = hashlib.sha256()
+        self._lock = threading.Lock()
+
+    def feed(self, start: int, chunk: bytes) -> None:
+        with self._lock:
+            if start == self.offset:
+                self._hash.update(chunk)
+                self.offset += len(chunk)
+            self._catch_up()
+
+    def _catch_up(self) -> None:
+        frontier = self.state.frontier(self.offset)
+        if frontier <= self.offset:
+            return
+        with self.path.open("rb") as f:
+            f.seek(self.offset)
+            while self.offset < frontier:
+                data = f.read(min(CHUNK_SIZE, frontier - self.offset))
+                if not data:
+                    break
+                self._hash.update(data)
+                self.offset += len(data)
+
+    def hexdigest(self) -> str:
+        with self._lock:
+            self._catch_up()
+            if self.offset != self.state.size:
+                raise RuntimeError(f"Incomplete download: {self.path.name}")
+            return self._hash.hexdigest()
+
+
+class Downloader:
+    def __init__(
+        self,
+        connections: int = 4,
+        segment_size: int = 64 * 2**20,
+        progress: Optional[TransferProgress] = None,
+    ) -> None:
+        self.connections = max(1, connections)
+        self.segment_size = max(CHUNK_SIZE, segment_size)
+        self.progress = progress or TransferProgress()
+        self._slots = threading.BoundedSemaphore(self.connections)
+
+    def fetch(self, url: str, tmp_path: Path) -> str:
+        tmp_path.parent.mkdir(parents=True, exist_ok=True)
+        info = probe(url)
+        if info.size is not None:
+            self.progress.add_total(info.size)
+        state_path = tmp_path.with_name(tmp_path.name + ".json")
+        large = info.size is not None and info.size > 2 * self.segment_size
+        if info.ranges and info.size is not None and (large or state_path.exists()):
+            return self._fetch_segmented(url, tmp_path, info.size, state_path)
+        if info.ranges and info.size is not None:
+            return self._fetch_resumable(url, tmp_path, info.size)
+        return self._fetch_stream(url, tmp_path)
+
+    def _copy(
+        self,
+        resp: BinaryIO,
+        f: BinaryIO,
+        on_chunk: Optional[Callable[[bytes], None]] = None,
+        limit: Optional[int] = None,
+    ) -> int:
+        written = 0
+        while limit is None or written < limit:
+            size = CHUNK_SIZE if limit is None else min(CHUNK_SIZE, limit - written)
+            chunk = resp.read(size)
+            if not chunk:
+                break
+            f.write(chunk)
+            written += len(chunk)
+            self.progress.advance(len(chunk))
+            if on_chunk:
+                on_chunk(chunk)
+        return written
+
+    def _fetch_stream(self, url: str, tmp_path: Path) -> str:
+        digest = hashlib.sha256()
+        with self._slots, urlopen(url) as resp, tmp_path.open("wb") as f:
+            self._copy(resp, f, digest.update)
+        return digest.hexdigest()
+
+    def _hash_prefix(self, tmp_path: Path, length: int, digest: Any) -> None:
+        with tmp_path.open("rb") as f:
+            while length > 0:
+                data = f.read(min(CHUNK_SIZE, length))
+                if not data:
+                    break
+                digest.update(data)
+                length -= len(data)
+
+    def _fetch_resumable(self, url: str, tmp_path: Path, size: int) -> str:
+        offset = tmp_path.stat().st_size if tmp_path.exists() else 0
+        if offset > size:
+            tmp_path.unlink()
+            offset = 0
+        self.progress.advance(offset)
+        digest = hashlib.sha256()
+        if offset:
+            self._hash_prefix(tmp_path, offset, digest)
+        if offset == size:
+            return digest.hexdigest()
+        request = Request(url, headers={"Range": f"bytes={offset}-"})
+        with self._slots, urlopen(request) as resp:
+            if resp.status != 206:
+                self.progress.advance(-offset)
+                offset = 0
+                digest = hashlib.sha256()
+            with tmp_path.open("r+b" if offset else "wb") as f:
+                f.seek(offset)
+                f.truncate()
+                self._copy(resp, f, digest.update)
+        return digest.hexdigest()
+
+    def _fetch_segmented(self, url: str, tmp_path: Path, size: int, state_path: Path) -> str:
+        if not tmp_path.exists() or tmp_path.stat().st_size != size:
+            state_path.unlink(missing_ok=True)
+            with tmp_path.open("wb") as f:
+                f.truncate(size)
+        state = _SegmentState(state_path, url, size, self.segment_size)
+        self.progress.advance(state.completed())
+        state.save()
+        hasher = _OrderedHasher(tmp_path, state)
+
+        def run(index: int) -> None:
+            start, end, done = state.segments[index]
+            remaining = end - start + 1 - done
+            if remaining <= 0:
+                return
+            request = Request(url, headers={"Range": f"bytes={start + done}-{end}"})
+            position = start + done
+            unsaved = 0
+
+            def on_chunk(chunk: bytes) -> None:
+                nonlocal position, unsaved
+                state.advance(index, len(chunk))
+                hasher.feed(position, chunk)
+                position += len(chunk)
+                unsaved += len(chunk)
+                if unsaved >= 16 * CHUNK_SIZE:
+                    state.save()
+                    unsaved = 0
+
+            # Unbuffered so bytes are visible to the hasher as soon as they are recorded.
+            with self._slots, urlopen(request) as resp, tmp_path.open("r+b", buffering=0) as f:
+                if resp.status != 206:
+                    raise RuntimeError(f"Server ignored range request for {url}")
+                f.seek(start + done)
+                written = self._copy(resp, f, on_chunk, limit=remaining)
+            if written != remaining:
+                raise RuntimeError(f"Connection closed early while downloading {url}")
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.connections) as pool:
+                for future in [pool.submit(run, i) for i in range(len(state.segments))]:
+                    future.result()
+        finally:
+            state.save()
+        digest = hasher.hexdigest()
+        state_path.unlink(missing_ok=True)
+        return digest
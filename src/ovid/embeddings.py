@@ -0,0 +1,198 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .config import load_settings
+from .results import cached_weight_identity
+
+TENSOR_NAME = "prompt_embeds"
+DISK_FACTOR = 8
+PRUNE_EVERY = 32
+
+Encoder = Callable[[list[str]], Any]
+
+
+def encoder_identity(base: str, dtype: str) -> str:
+    # The text encoder and tokenizer files, not the folder name, decide the embeddings, so
+    # persisted entries survive renames and go stale when the weights change.
+    root = Path(base)
+    payload = {
+        "text_encoder": cached_weight_identity(root / "text_encoder"),
+        "tokenizer": cached_weight_identity(root / "tokenizer"),
+        "dtype": dtype,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:32]
+
+
+def _entry_path(root: Path, encoder: str, text: str) -> Path:
+    digest = hashlib.sha256(f"{encoder}\0{text}".encode("utf-8")).hexdigest()
+    return root / f"{digest}.safetensors"
+
+
+@dataclass
+class EmbeddingStats:
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    encode_seconds: float = 0.0
+    disk_seconds: float = 0.0
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int, persist_dir: Optional[Path] = None) -> None:
+        self.max_entries = max_entries
+        self.persist_dir = persist_dir
+        self._entries: "OrderedDict[tuple[str, str, str], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = EmbeddingStats()
+        self._writes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def encode(self, encoder: str, device: str, texts: list[str], encode: Encoder) -> Any:
+        import torch
+
+        found: Dict[str, Any] = {}
+        with self._lock:
+            for text in dict.fromkeys(texts):
+                embeds = self._entries.get((encoder, device, text))
+                if embeds is not None:
+                    self._entries.move_to_end((encoder, device, text))
+                    self._stats.hits += 1
+                    found[text] = embeds
+
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        root = self.persist_dir
+        if missing and root is not None:
+            for text in list(missing):
+                embeds = self._load(root, encoder, device, text)
+                if embeds is not None:
+                    found[text] = embeds
+                    missing.remove(text)
+                    self._store(encoder, device, text, embeds)
+
+        if missing:
+            start = time.perf_counter()
+            encoded = encode(missing)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._stats.misses += len(missing)
+                self._stats.encode_seconds += elapsed
+            for index, text in enumerate(missing):
+                embeds = encoded[index : index + 1]
+                found[text] = embeds
+                self._store(encoder, device, text, embeds)
+                if root is not None:
+                    self._save(root, encoder, text, embeds)
+        return torch.cat([found[text] for text in texts])
+
+    def _store(self, encoder: str, device: str, text: str, embeds: Any) -> None:
+        with self._lock:
+            self._entries[(encoder, device, text)] = embeds
+            self._entries.move_to_end((encoder, device, text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, root: Path, encoder: str, device: str, text: str) -> Optional[Any]:
+        from safetensors import safe_open
+
+        path = _entry_path(root, encoder, text)
+        start = time.perf_counter()
+        try:
+            with safe_open(str(path), framework="pt", device=device) as f:
+                metadata = f.metadata() or {}
+                if metadata.get("encoder") != encoder or metadata.get("text") != text:
+                    return None
+                embeds = f.get_tensor(TENSOR_NAME)
+            os.utime(path)
+        except (OSError, RuntimeError, ValueError):
+            # Missing, partially written or unreadable files are simply encoded again.
+            return None
+        with self._lock:
+            self._stats.disk_hits += 1
+            self._stats.disk_seconds += time.perf_counter() - start
+        return embeds
+
+    def _save(self, root: Path, encoder: str, text: str, embeds: Any) -> None:
+        from safetensors.torch import save_file
+
+        path = _entry_path(root, encoder, text)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+        try:
+            root.mkdir(parents=True, exist_ok=True)
+            tensor = embeds.detach().to("cpu").contiguous()
+            save_file({TENSOR_NAME: tensor}, str(tmp_path), {"encoder": encoder, "text": text})
+            os.replace(tmp_path, path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            return
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self._prune(root)
+
+    def _prune(self, root: Path) -> None:
+        limit = self.max_entries * DISK_FACTOR
+        files = []
+        for path in root.glob("*.safetensors"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        if len(files) <= limit:
+            return
+        files.sort()
+        for _, path in files[: len(files) - limit]:
+            path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = self._stats
+            reused = stats.hits + stats.disk_hits
+            lookups = reused + stats.misses
+            # Every reuse skips one text-encoder pass at the measured average cost per prompt;
+            # reading persisted entries back is not free, so that time is subtracted.
+            per_prompt = stats.encode_seconds / stats.misses if stats.misses else None
+            saved = None
+            if per_prompt is not None:
+                saved = max(0.0, reused * per_prompt - stats.disk_seconds)
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "persist_dir": str(self.persist_dir) if self.persist_dir else None,
+                "hits": stats.hits,
+                "disk_hits": stats.disk_hits,
+                "misses": stats.misses,
+                "hit_rate": round(reused / lookups, 3) if lookups else None,
+                "encode_ms_avg": round(per_prompt * 1000, 2) if per_prompt is not None else None,
+                "saved_ms": round(saved * 1000, 1) if saved is not None else None,
+            }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            settings = load_settings()
+            _embedding_cache = EmbeddingCache(
+                settings.prompt_cache_entries, settings.prompt_cache_dir
+            )
+        return _embedding_cache
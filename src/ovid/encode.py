@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+import io
+import itertools
+import os
+from pathlib import Path
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, Optional, Sequence
+import zipfile
+
+from .metrics import observe_stage, stage_totals
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+FORMATS = {
+    "mp4": ".mp4",
+    "webm": ".webm",
+    "gif": ".gif",
+    "webp": ".webp",
+    "png": ".zip",
+}
+
+MEDIA_TYPES = {
+    ".mp4": "video/mp4",
+    ".webm": "video/webm",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".zip": "application/zip",
+}
+
+_DEFAULT_CODECS = {"mp4": "libx264", "webm": "libvpx-vp9"}
+
+
+@dataclass(frozen=True)
+class EncodeOptions:
+    format: str = "mp4"
+    codec: Optional[str] = None
+    crf: Optional[int] = None
+    threads: Optional[int] = None
+
+    @classmethod
+    def for_path(cls, path: Path) -> "EncodeOptions":
+        suffix = path.suffix.lower()
+        for name, ext in FORMATS.items():
+            if ext == suffix:
+                return cls(format=name)
+        return cls()
+
+
+@dataclass(frozen=True)
+class EncodeResult:
+    path: Path
+    seconds: float
+    stages: Dict[str, float] = field(default_factory=dict)
+
+
+class _StreamFailed:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+_END = object()
+
+
+class FrameStream:
+    def __init__(self, expected: Optional[int] = None, max_chunks: int = 2) -> None:
+        self.expected = expected
+        self.received = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(max_chunks)
+        self._abandoned = threading.Event()
+        self._closed = False
+
+    def put(self, frames: Sequence[Any]) -> None:
+        self._offer(frames)
+        self.received += len(frames)
+        # Finishing as soon as the last frame arrives frees the encoder for the next clip.
+        if self.expected is not None and self.received >= self.expected:
+            self.close()
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._offer(_END)
+
+    def fail(self, error: BaseException) -> None:
+        if not self._closed:
+            self._closed = True
+            self._offer(_StreamFailed(error))
+
+    def _offer(self, item: Any) -> None:
+        while not self._abandoned.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        if item is not _END and not isinstance(item, _StreamFailed):
+            raise RuntimeError("The encoder stopped reading frames.")
+
+    def __iter__(self) -> Iterator[Any]:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, _StreamFailed):
+                    raise RuntimeError(f"Rendering failed: {item.error}") from item.error
+                yield from item
+        finally:
+            self._abandoned.set()
+
+
+def _frame_blocks(frames: Iterable[Any]) -> Iterator[np.ndarray]:
+    import numpy as np
+
+    # A rendered clip is one contiguous (frames, H, W, 3) uint8 buffer and goes to ffmpeg in a
+    # single write; anything else is written frame by frame, copying only if it must.
+    if isinstance(frames, np.ndarray) and frames.ndim == 4:
+        yield np.ascontiguousarray(frames, dtype=np.uint8)
+        return
+    for frame in frames:
+        yield np.ascontiguousarray(frame, dtype=np.uint8)
+
+
+def _write_ffmpeg(frames: Iterable[Any], path: Path, fps: int, options: EncodeOptions) -> None:
+    import imageio_ffmpeg
+
+    params: list[str] = []
+    if options.crf is not None:
+        params += ["-crf", str(options.crf)]
+        if options.format == "webm":
+            params += ["-b:v", "0"]
+    if options.threads:
+        params += ["-threads", str(options.threads)]
+    # Frames are piped as they arrive, so streamed clips are encoded while later frames render.
+    writer = None
+    try:
+        for block in _frame_blocks(frames):
+            if writer is None:
+                height, width = block.shape[-3:-1]
+                writer = imageio_ffmpeg.write_frames(
+                    path,
+                    (width, height),
+                    fps=fps,
+                    codec=options.codec or _DEFAULT_CODECS[options.format],
+                    quality=None if options.crf is not None else 5,
+                    output_params=params or None,
+                )
+                writer.send(None)
+            writer.send(block)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise RuntimeError("No frames to encode.")
+
+
+def _write_animated_image(
+    frames: Iterable[Any], path: Path, fps: int, options: EncodeOptions
+) -> None:
+    import numpy as np
+    from PIL import Image
+
+    images = (Image.fromarray(np.asarray(frame)) for frame in frames)
+    first = next(images)
+    extra: dict[str, Any] = {}
+    if options.format == "webp":
+        extra = {"lossless": options.crf == 0, "quality": 80, "method": 4}
+    first.save(
+        path,
+        format=options.format.upper(),
+        save_all=True,
+        append_images=images,
+        duration=max(1, round(1000 / fps)),
+        loop=0,
+        **extra,
+    )
+
+
+def _write_png_zip(frames: Iterable[Any], path: Path) -> None:
+    import numpy as np
+    from PIL import Image
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for index, frame in enumerate(frames):
+            buf = io.BytesIO()
+            Image.fromarray(np.asarray(frame)).save(buf, format="PNG")
+            archive.writestr(f"frame_{index:05d}.png", buf.getvalue())
+
+
+def write_video(
+    frames: Iterable[Any],
+    out_path: Path,
+    fps: int,
+    options: Optional[EncodeOptions] = None,
+) -> EncodeResult:
+    options = options or EncodeOptions.for_path(out_path)
+    if options.format not in FORMATS:
+        raise RuntimeError(f"Unsupported output format '{options.format}'.")
+    start = time.perf_counter()
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(f".{out_path.stem}.part{out_path.suffix}")
+    try:
+        # Post-processing such as interpolation runs lazily inside the frame iterable.
+        with stage_totals() as stages:
+            if options.format in _DEFAULT_CODECS:
+                _write_ffmpeg(frames, tmp_path, fps, options)
+            elif options.format == "png":
+                _write_png_zip(frames, tmp_path)
+            else:
+                _write_animated_image(frames, tmp_path, fps, options)
+        os.replace(tmp_path, out_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    elapsed = time.perf_counter() - start
+    observe_stage("encode", elapsed)
+    return EncodeResult(path=out_path, seconds=elapsed, stages=dict(stages))
+
+
+def _read_ffmpeg(path: Path) -> tuple[Iterator[np.ndarray], int]:
+    import imageio
+    import numpy as np
+
+    reader = imageio.get_reader(path)
+    fps = round(reader.get_meta_data().get("fps") or 8)
+
+    def frames() -> Iterator[np.ndarray]:
+        with reader:
+            for frame in reader:
+                yield np.asarray(frame)[..., :3]
+
+    return frames(), fps
+
+
+def _read_animated_image(path: Path) -> tuple[Iterator[np.ndarray], int]:
+    import numpy as np
+    from PIL import Image, ImageSequence
+
+    with Image.open(path) as image:
+        duration = image.info.get("duration") or 125
+
+    def frames() -> Iterator[np.ndarray]:
+        with Image.open(path) as image:
+            for frame in ImageSequence.Iterator(image):
+                yield np.asarray(frame.convert("RGB"))
+
+    return frames(), max(1, round(1000 / duration))
+
+
+def _read_png_zip(path: Path) -> Iterator[np.ndarray]:
+    import numpy as np
+    from PIL import Image
+
+    with zipfile.ZipFile(path) as archive:
+        for name in sorted(n for n in archive.namelist() if n.endswith(".png")):
+            with archive.open(name) as f:
+                yield np.asarray(Image.open(f).convert("RGB"))
+
+
+def read_video(path: Path) -> tuple[np.ndarray, Iterator[np.ndarray], int]:
+    suffix = path.suffix.lower()
+    if suffix == ".zip":
+        # Frame archives carry no timing; use the generator's default rate.
+        frames, fps = _read_png_zip(path), 8
+    elif suffix in (".gif", ".webp"):
+        frames, fps = _read_animated_image(path)
+    else:
+        frames, fps = _read_ffmpeg(path)
+    first = next(frames, None)
+    if first is None:
+        raise RuntimeError(f"{path} contains no frames.")
+    return first, itertools.chain([first], frames), fps
+
+
+class EncoderPool:
+    def __init__(self, workers: int, queue_depth: int) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="ovid-encode"
+        )
+        self._slots = threading.BoundedSemaphore(max(1, workers) + max(0, queue_depth))
+
+    def submit(
+        self,
+        frames: Iterable[Any],
+        out_path: Path,
+        fps: int,
+        options: Optional[EncodeOptions] = None,
+    ) -> "Future[EncodeResult]":
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(write_video, frames, out_path, fps, options)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
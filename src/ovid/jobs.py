@@ -0,0 +1,302 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+from uuid import uuid4
+
+from .encode import EncodeResult
+from .metrics import JOBS_TOTAL, observe_stage
+from .registry import ModelSpec
+
+QUEUED = "queued"
+RUNNING = "running"
+ENCODING = "encoding"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class Job:
+    id: str
+    request: Any
+    model: ModelSpec
+    key: Optional[str] = None
+    status: str = QUEUED
+    cached: bool = False
+    output: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    denoised_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    encode_seconds: Optional[float] = None
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    batch_size: int = 1
+    batch_wait: float = 0.0
+    cancel_requested: bool = False
+    events: list[Dict[str, Any]] = field(default_factory=list, repr=False)
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+    _changed: threading.Condition = field(default_factory=threading.Condition, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        with self._changed:
+            if "preview" in event:
+                for previous in self.events:
+                    previous.pop("preview", None)
+            self.events.append(event)
+            self._changed.notify_all()
+
+    def set_status(self, status: str) -> None:
+        self.status = status
+        event: Dict[str, Any] = {"type": "status", "status": status}
+        if self.finished:
+            event.update(output=self.output, error=self.error, timings=self.timings())
+        self.emit(event)
+
+    def events_since(self, index: int, timeout: float) -> list[Dict[str, Any]]:
+        with self._changed:
+            if index >= len(self.events) and not self.finished:
+                self._changed.wait(timeout)
+            return self.events[index:]
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        now = time.time()
+        queue_end = self.started_at or self.finished_at or now
+        run_end = self.finished_at or now
+        denoise_end = self.denoised_at or (None if self.finished_at else now)
+        return {
+            "queue_seconds": round(queue_end - self.created_at, 3),
+            "run_seconds": round(run_end - self.started_at, 3) if self.started_at else None,
+            "denoise_seconds": (
+                round(denoise_end - self.started_at, 3)
+                if self.started_at and denoise_end
+                else None
+            ),
+            "encode_seconds": (
+                round(self.encode_seconds, 3) if self.encode_seconds is not None else None
+            ),
+            "total_seconds": round(run_end - self.created_at, 3),
+            "batch_wait_seconds": round(self.batch_wait, 3),
+            **{f"{stage}_seconds": round(s, 3) for stage, s in self.stage_seconds.items()},
+        }
+
+
+class JobCancelled(RuntimeError):
+    def __init__(self) -> None:
+        super().__init__("Job was cancelled.")
+
+
+class QueueFullError(RuntimeError):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Job queue is full, retry later.")
+        self.retry_after = retry_after
+
+
+Runner = Callable[[list[Job]], list["Future[EncodeResult]"]]
+Publisher = Callable[[Job, EncodeResult], str]
+BatchKey = Callable[[Job], Hashable]
+
+
+def _publish_path(job: Job, result: EncodeResult) -> str:
+    return str(result.path)
+
+
+class JobQueue:
+    def __init__(
+        self,
+        runner: Runner,
+        max_size: int,
+        history: int = 256,
+        batch_key: Optional[BatchKey] = None,
+        max_batch: int = 1,
+        batch_window: float = 0.0,
+        publish: Publisher = _publish_path,
+        workers: int = 1,
+    ) -> None:
+        self.runner = runner
+        self.publish = publish
+        self.max_size = max_size
+        self.history = history
+        self.batch_key = batch_key
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window
+        self.workers = max(1, workers)
+        self._pending: "deque[Job]" = deque()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._inflight: Dict[str, Job] = {}
+        self._cond = threading.Condition()
+        self._durations: "deque[float]" = deque(maxlen=16)
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"ovid-job-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, request: Any, model: ModelSpec, key: Optional[str] = None) -> Job:
+        with self._cond:
+            if key is not None and key in self._inflight:
+                return self._inflight[key]
+            if len(self._pending) >= self.max_size:
+                raise QueueFullError(self._retry_after())
+            job = Job(id=uuid4().hex, request=request, model=model, key=key)
+            job.set_status(QUEUED)
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            if key is not None:
+                self._inflight[key] = job
+            self._trim_history()
+            self._cond.notify()
+        return job
+
+    def add_cached(self, request: Any, model: ModelSpec, key: str, output: str) -> Job:
+        now = time.time()
+        job = Job(
+            id=uuid4().hex,
+            request=request,
+            model=model,
+            key=key,
+            status=DONE,
+            cached=True,
+            output=output,
+            created_at=now,
+            started_at=now,
+            finished_at=now,
+        )
+        job.set_status(DONE)
+        job._done.set()
+        JOBS_TOTAL.inc(model=model.name, status="cached")
+        with self._cond:
+            self._jobs[job.id] = job
+            self._trim_history()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel_requested = True
+            queued = job in self._pending
+            if queued:
+                self._pending.remove(job)
+        if queued:
+            self._finish(job, CANCELLED, None, str(JobCancelled()))
+        return job
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _retry_after(self) -> int:
+        avg = sum(self._durations) / len(self._durations) if self._durations else 30.0
+        return max(1, math.ceil(avg))
+
+    def _trim_history(self) -> None:
+        excess = len(self._jobs) - self.history - len(self._pending)
+        for job_id in list(self._jobs):
+            if excess <= 0:
+                break
+            if self._jobs[job_id].finished:
+                del self._jobs[job_id]
+                excess -= 1
+
+    def _take_compatible(self, key: Hashable, batch: list[Job]) -> None:
+        for job in list(self._pending):
+            if len(batch) >= self.max_batch:
+                return
+            if self.batch_key(job) == key:
+                self._pending.remove(job)
+                batch.append(job)
+
+    def _next_batch(self) -> list[Job]:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            head = self._pending.popleft()
+            batch = [head]
+            collect_start = time.time()
+            if self.batch_key is not None and self.max_batch > 1:
+                key = self.batch_key(head)
+                deadline = head.created_at + self.batch_window
+                while True:
+                    self._take_compatible(key, batch)
+                    remaining = deadline - time.time()
+                    if len(batch) >= self.max_batch or remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            started = time.time()
+            for job in batch:
+                job.set_status(RUNNING)
+                job.started_at = started
+                job.batch_size = len(batch)
+                job.batch_wait = started - max(job.created_at, collect_start)
+                observe_stage("queue_wait", started - job.created_at)
+            return batch
+
+    def _finish(self, job: Job, status: str, output: Optional[str], error: Optional[str]) -> None:
+        job.output = output
+        job.error = error
+        job.finished_at = time.time()
+        job.set_status(status)
+        JOBS_TOTAL.inc(model=job.model.name, status=status)
+        with self._cond:
+            if job.key is not None and self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+        job._done.set()
+
+    def _on_encoded(self, job: Job, future: "Future[EncodeResult]") -> None:
+        if job.cancel_requested:
+            self._finish(job, CANCELLED, None, str(JobCancelled()))
+            return
+        try:
+            result = future.result()
+            job.encode_seconds = result.seconds
+            job.stage_seconds.update(result.stages)
+            output = self.publish(job, result)
+        except Exception as exc:
+            self._finish(job, FAILED, None, str(exc))
+        else:
+            self._finish(job, DONE, output, None)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                futures = self.runner(batch)
+            except JobCancelled as exc:
+                for job in batch:
+                    self._finish(job, CANCELLED, None, str(exc))
+                continue
+            except Exception as exc:
+                for job in batch:
+                    self._finish(job, FAILED, None, str(exc))
+                continue
+            denoised = time.time()
+            with self._cond:
+                self._durations.append(denoised - batch[0].started_at)
+            for job, future in zip(batch, futures):
+                job.denoised_at = denoised
+                job.set_status(ENCODING)
+                future.add_done_callback(lambda f, job=job: self._on_encoded(job, f))
@@ -0,0 +1,221 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from .config import load_settings
+
+NOISE = "noise"
+LATENTS = "latents"
+
+
+def refine_start(steps: int, strength: float) -> int:
+    # Steps of the full schedule a refine skips; the last step always runs.
+    return min(steps - 1, int(steps * (1 - strength)))
+
+
+@dataclass
+class Draft:
+    noise: Any
+    latents: Any
+    meta: Dict[str, Any]
+
+
+@dataclass
+class Resume:
+    latents: Any
+    noise: list[Optional[Any]]
+    strength: float
+
+
+@dataclass
+class Captured:
+    noise: Any = None
+    latents: Any = None
+
+
+class LatentStore:
+    def __init__(self, root: Path, quota_bytes: int, ttl: float) -> None:
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.quota_bytes > 0
+
+    def save(self, draft_id: str, noise: Any, latents: Any, meta: Dict[str, Any]) -> None:
+        from safetensors.torch import save_file
+
+        if not self.enabled:
+            return
+        path = self._path(draft_id)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+        tensors = {
+            NOISE: noise.detach().to("cpu").contiguous(),
+            LATENTS: latents.detach().to("cpu").contiguous(),
+        }
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            save_file(tensors, str(tmp_path), {"meta": json.dumps(meta)})
+            os.replace(tmp_path, path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            return
+        self._evict()
+
+    def meta(self, draft_id: str) -> Optional[Dict[str, Any]]:
+        draft = self._read(draft_id, None)
+        return draft.meta if draft is not None else None
+
+    def load(self, draft_id: str) -> Optional[Draft]:
+        return self._read(draft_id, (NOISE, LATENTS))
+
+    def _read(self, draft_id: str, names: Optional[tuple[str, ...]]) -> Optional[Draft]:
+        from safetensors import safe_open
+
+        path = self._path(draft_id)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            with safe_open(str(path), framework="pt", device="cpu") as f:
+                meta = json.loads((f.metadata() or {}).get("meta", "{}"))
+                tensors = {name: f.get_tensor(name) for name in names or ()}
+        except (OSError, RuntimeError, ValueError):
+            return None
+        return Draft(noise=tensors.get(NOISE), latents=tensors.get(LATENTS), meta=meta)
+
+    def _path(self, draft_id: str) -> Path:
+        return self.root / f"{draft_id}.safetensors"
+
+    def _files(self) -> list[tuple[float, int, Path]]:
+        files = []
+        for path in self.root.glob("*.safetensors"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return sorted(files)
+
+    def _evict(self) -> None:
+        with self._lock:
+            now = time.time()
+            files = self._files()
+            used = sum(size for _, size, _ in files)
+            for mtime, size, path in files:
+                if now - mtime <= self.ttl and used <= self.quota_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                used -= size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            files = [f for f in self._files() if now - f[0] <= self.ttl]
+            return {
+                "entries": len(files),
+                "used_mb": round(sum(size for _, size, _ in files) / 2**20, 1),
+                "quota_mb": round(self.quota_bytes / 2**20, 1),
+                "ttl_seconds": self.ttl,
+            }
+
+
+_latent_store: Optional[LatentStore] = None
+_latent_store_lock = threading.Lock()
+
+
+def get_latent_store() -> LatentStore:
+    global _latent_store
+    with _latent_store_lock:
+        if _latent_store is None:
+            settings = load_settings()
+            _latent_store = LatentStore(
+                settings.latents_dir, settings.latent_store_mb * 2**20, settings.latent_ttl
+            )
+        return _latent_store
+
+
+def _patch(obj: Any, name: str, fn: Callable) -> Callable[[], None]:
+    own = vars(obj).get(name)
+    setattr(obj, name, fn)
+
+    def restore() -> None:
+        if own is not None:
+            setattr(obj, name, own)
+        else:
+            delattr(obj, name)
+
+    return restore
+
+
+@contextmanager
+def latent_hooks(pipe: Any, resume: Optional[Resume] = None) -> Iterator[Captured]:
+    captured = Captured()
+    scheduler = pipe.scheduler
+    set_timesteps, prepare, decode = (
+        scheduler.set_timesteps,
+        pipe.prepare_latents,
+        pipe.decode_latents,
+    )
+    schedule: list[Any] = []
+    start = 0
+
+    def truncated_timesteps(*args: Any, **kwargs: Any) -> None:
+        nonlocal start
+        set_timesteps(*args, **kwargs)
+        if resume is None:
+            return
+        # Like the img2img pipelines: the denoising loop reads the shortened schedule, while
+        # the scheduler keeps the full one and starts stepping from begin_index.
+        order = getattr(scheduler, "order", 1)
+        schedule[:] = [scheduler.timesteps]
+        start = refine_start(len(scheduler.timesteps) // order, resume.strength) * order
+        if hasattr(scheduler, "set_begin_index"):
+            scheduler.set_begin_index(start)
+        scheduler.timesteps = scheduler.timesteps[start:]
+
+    def prepare_latents(*args: Any, **kwargs: Any) -> Any:
+        import torch
+
+        latents = prepare(*args, **kwargs)
+        captured.noise = latents / scheduler.init_noise_sigma
+        if resume is None:
+            return latents
+        scheduler.timesteps = schedule[0]
+        if tuple(resume.latents.shape) != tuple(latents.shape):
+            raise RuntimeError(
+                "The draft was rendered with different frames or size; refine it with the "
+                "draft's frames, width and height."
+            )
+        noise = torch.cat(
+            [
+                captured.noise[i : i + 1] if draft is None else draft.to(latents)
+                for i, draft in enumerate(resume.noise)
+            ]
+        )
+        captured.noise = noise
+        return scheduler.add_noise(
+            resume.latents.to(latents), noise, schedule[0][start : start + 1]
+        )
+
+    def decode_latents(latents: Any, *args: Any, **kwargs: Any) -> Any:
+        captured.latents = latents
+        return decode(latents, *args, **kwargs)
+
+    restores = [
+        _patch(scheduler, "set_timesteps", truncated_timesteps),
+        _patch(pipe, "prepare_latents", prepare_latents),
+        _patch(pipe, "decode_latents", decode_latents),
+    ]
+    try:
+        yield captured
+    finally:
+        for restore in reversed(restores):
+            restore()
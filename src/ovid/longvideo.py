@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Optional
+import weakref
+
+from .registry import ModelSpec
+
+if TYPE_CHECKING:
+    import numpy as np
+
+WEIGHTINGS = ("pyramid", "flat", "delayed_reverse_sawtooth")
+MAX_CONTEXT = 32
+NO_SPLIT = 2**31
+
+FrameSink = Callable[[int, "np.ndarray"], None]
+
+
+@dataclass(frozen=True)
+class ContextWindows:
+    length: int = 16
+    stride: int = 4
+    weighting: str = "pyramid"
+
+    @classmethod
+    def from_model(
+        cls,
+        model: ModelSpec,
+        length: Optional[int] = None,
+        stride: Optional[int] = None,
+        weighting: Optional[str] = None,
+    ) -> "ContextWindows":
+        extra = model.extra
+        windows = cls(
+            length=int(length or extra.get("context_length") or cls.length),
+            stride=int(stride or extra.get("context_stride") or cls.stride),
+            weighting=weighting or extra.get("context_weighting") or cls.weighting,
+        )
+        if not 1 <= windows.stride <= windows.length <= MAX_CONTEXT:
+            raise RuntimeError(
+                f"Context windows need 1 <= stride <= length <= {MAX_CONTEXT}, "
+                f"got length {windows.length} and stride {windows.stride}."
+            )
+        if windows.weighting not in WEIGHTINGS:
+            raise RuntimeError(f"context_weighting must be one of: {', '.join(WEIGHTINGS)}.")
+        return windows
+
+    def applies(self, frames: int) -> bool:
+        return frames > self.length
+
+
+@dataclass
+class _WindowState:
+    split_modules: list[Any]
+    windows: Optional[ContextWindows] = None
+
+
+_states: "weakref.WeakKeyDictionary[Any, _WindowState]" = weakref.WeakKeyDictionary()
+
+
+def _wrap_spatial_layers(pipe: Any) -> list[Any]:
+    from diffusers.pipelines.free_noise_utils import SplitInferenceModule
+
+    # Spatial attentions and resnets see every frame as a separate sample; running them on
+    # window-sized chunks of the (batch * frames) axis keeps activations independent of the
+    # clip length. Motion modules are left alone so FreeNoise can be reconfigured later.
+    wrapped = []
+    unet = pipe.unet
+    for block in [*unet.down_blocks, unet.mid_block, *unet.up_blocks]:
+        for attr, inputs in (
+            ("attentions", ["hidden_states", "encoder_hidden_states"]),
+            ("resnets", ["input_tensor", "temb"]),
+        ):
+            layers = getattr(block, attr, None)
+            if layers is None:
+                continue
+            for i in range(len(layers)):
+                layers[i] = SplitInferenceModule(layers[i], NO_SPLIT, 0, inputs)
+                wrapped.append(layers[i])
+    return wrapped
+
+
+def configure_windows(pipe: Any, windows: ContextWindows, frames: int, batch: int) -> None:
+    state = _states.get(pipe)
+    if not windows.applies(frames):
+        if state is not None and state.windows is not None:
+            pipe.disable_free_noise()
+            for module in state.split_modules:
+                module.split_size = NO_SPLIT
+            state.windows = None
+        return
+
+    if not hasattr(pipe, "enable_free_noise"):
+        raise RuntimeError(
+            f"Clips longer than {windows.length} frames need a diffusers release with FreeNoise "
+            "(0.31 or newer)."
+        )
+    if state is None:
+        state = _WindowState(split_modules=_wrap_spatial_layers(pipe))
+        _states[pipe] = state
+    if state.windows != windows:
+        pipe.enable_free_noise(
+            context_length=windows.length,
+            context_stride=windows.stride,
+            weighting_scheme=windows.weighting,
+        )
+        state.windows = windows
+    # One chunk holds a window's frames for every prompt, both halves of guidance included.
+    for module in state.split_modules:
+        module.split_size = 2 * batch * windows.length
+
+
+def video_to_uint8(video: Any) -> np.ndarray:
+    import torch
+
+    # video: (batch, frames, channels, h, w) in [0, 1]. Quantizing and reordering on the
+    # device leaves one uint8 copy to the host: a contiguous (batch, frames, h, w, 3) buffer.
+    video = video.mul(255).round_().clamp_(0, 255).to(torch.uint8)
+    return video.permute(0, 1, 3, 4, 2).contiguous().cpu().numpy()
+
+
+def decode_streaming(pipe: Any, latents: Any, chunk_frames: int, on_frames: FrameSink) -> None:
+    # latents: (batch, channels, frames, h, w). Videos are decoded one after another so a
+    # consumer that encodes them in order never waits on a later video.
+    for index in range(latents.shape[0]):
+        for start in range(0, latents.shape[2], chunk_frames):
+            chunk = latents[index : index + 1, :, start : start + chunk_frames]
+            video = pipe.decode_latents(chunk)
+            video = pipe.video_processor.postprocess_video(video=video, output_type="pt")
+            on_frames(index, video_to_uint8(video)[0])
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+from typing import Dict, Optional
+
+MANIFEST_NAME = ".ovid-manifest.json"
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _identity(stat: os.stat_result) -> Dict[str, int]:
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "ino": stat.st_ino}
+
+
+class Manifest:
+    def __init__(self, model_dir: Path) -> None:
+        self.path = model_dir / MANIFEST_NAME
+        self.model_dir = model_dir
+        self._lock = threading.Lock()
+        self._files: Dict[str, Dict] = self._read()
+        self._dirty = False
+
+    def _read(self) -> Dict[str, Dict]:
+        if not self.path.exists():
+            return {}
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        files = data.get("files", {})
+        return files if isinstance(files, dict) else {}
+
+    def verified_hash(self, rel_path: str) -> Optional[str]:
+        with self._lock:
+            entry = self._files.get(rel_path)
+        if not entry:
+            return None
+        try:
+            stat = (self.model_dir / rel_path).stat()
+        except OSError:
+            return None
+        if any(entry.get(k) != v for k, v in _identity(stat).items()):
+            return None
+        return entry.get("sha256")
+
+    def recorded_hash(self, rel_path: str) -> Optional[str]:
+        with self._lock:
+            entry = self._files.get(rel_path)
+        return entry.get("sha256") if entry else None
+
+    def record(self, rel_path: str, sha256: str) -> None:
+        stat = (self.model_dir / rel_path).stat()
+        with self._lock:
+            self._files[rel_path] = {"sha256": sha256.lower(), **_identity(stat)}
+            self._dirty = True
+
+    def forget(self, rel_path: str) -> None:
+        with self._lock:
+            self._dirty = self._files.pop(rel_path, None) is not None or self._dirty
+
+    def paths(self) -> list[str]:
+        with self._lock:
+            return sorted(self._files)
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            self.model_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump({"files": self._files}, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
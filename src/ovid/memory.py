@@ -0,0 +1,276 @@
+from dataclasses import dataclass
+import logging
+from typing import Any, Dict, Optional
+import weakref
+
+from .config import load_settings
+
+logger = logging.getLogger(__name__)
+
+PLACEMENTS = ("resident", "model_offload", "sequential_offload")
+VAE_MODES = ("full", "sliced", "tiled")
+
+# Rough fits for SD 1.5-class UNets and VAEs; they only need to rank configurations and keep
+# the chosen one under budget, not predict the allocator to the megabyte.
+UNET_CHANNELS = 320
+UNET_LIVE_MAPS = 12
+VAE_CHANNELS = 128
+VAE_LIVE_MAPS = 6
+VAE_TILE = 512
+VAE_DECODE_CHUNK = 16
+ATTENTION_HEADS = 8
+ATTENTION_SLICE = 4
+SEQUENTIAL_WEIGHT_FRACTION = 32
+RESERVE_BYTES = 256 * 2**20
+
+# Fastest first. With scaled_dot_product_attention, attention slicing saves nothing and
+# swaps in a slower processor, so those candidates are only tried for eager attention.
+CANDIDATES = (
+    ("resident", "full", False),
+    ("resident", "sliced", False),
+    ("resident", "tiled", False),
+    ("resident", "tiled", True),
+    ("model_offload", "sliced", False),
+    ("model_offload", "tiled", False),
+    ("model_offload", "tiled", True),
+    ("sequential_offload", "tiled", False),
+    ("sequential_offload", "tiled", True),
+)
+
+
+@dataclass(frozen=True)
+class RenderShape:
+    batch: int
+    frames: int
+    width: int
+    height: int
+
+
+@dataclass(frozen=True)
+class MemoryPlan:
+    placement: str
+    vae: str
+    attention_slicing: bool
+    peak_bytes: int
+    budget_bytes: int
+
+    @property
+    def mode(self) -> tuple[str, str, bool]:
+        return self.placement, self.vae, self.attention_slicing
+
+    @property
+    def fits(self) -> bool:
+        return self.peak_bytes <= self.budget_bytes
+
+    def describe(self) -> str:
+        attention = ", attention slicing" if self.attention_slicing else ""
+        return (
+            f"{self.placement}, vae {self.vae}{attention} "
+            f"(peak ~{self.peak_bytes / 2**20:.0f} MB of {self.budget_bytes / 2**20:.0f} MB)"
+        )
+
+
+def estimate_peak(
+    weights: Dict[str, int],
+    shape: RenderShape,
+    dtype_bytes: int,
+    placement: str,
+    vae: str,
+    attention_slicing: bool,
+    sdpa: bool = True,
+) -> int:
+    unet_weights = weights.get("unet", 0)
+    vae_weights = weights.get("vae", 0)
+    other_weights = sum(size for name, size in weights.items() if name not in ("unet", "vae"))
+
+    # Classifier-free guidance doubles the UNet batch.
+    samples = 2 * shape.batch * shape.frames
+    tokens = (shape.height // 8) * (shape.width // 8)
+    unet_act = samples * tokens * UNET_CHANNELS * UNET_LIVE_MAPS * dtype_bytes
+    if not sdpa:
+        heads = ATTENTION_SLICE if attention_slicing else samples * ATTENTION_HEADS
+        unet_act += heads * tokens * tokens * dtype_bytes
+
+    if vae == "full":
+        images = min(shape.batch * shape.frames, VAE_DECODE_CHUNK)
+        area = shape.width * shape.height
+    else:
+        images = 1
+        area = shape.width * shape.height
+        if vae == "tiled":
+            area = min(shape.width, VAE_TILE) * min(shape.height, VAE_TILE)
+    vae_act = images * area * VAE_CHANNELS * VAE_LIVE_MAPS * dtype_bytes
+
+    if placement == "resident":
+        peak = unet_weights + vae_weights + other_weights + max(unet_act, vae_act)
+    elif placement == "model_offload":
+        peak = max(unet_weights + unet_act, vae_weights + vae_act, other_weights)
+    else:
+        largest = max(unet_weights, vae_weights, other_weights)
+        peak = largest // SEQUENTIAL_WEIGHT_FRACTION + max(unet_act, vae_act)
+    return peak + RESERVE_BYTES
+
+
+def plan_memory(
+    weights: Dict[str, int],
+    shape: RenderShape,
+    budget_bytes: int,
+    dtype_bytes: int = 2,
+    sdpa: bool = True,
+    overrides: Optional[Dict[str, Any]] = None,
+    placements: tuple[str, ...] = PLACEMENTS,
+) -> MemoryPlan:
+    overrides = overrides or {}
+    candidates = []
+    for placement, vae, attention_slicing in CANDIDATES:
+        if attention_slicing and sdpa:
+            continue
+        if placement not in placements:
+            placement = placements[-1]
+        candidate = (
+            overrides.get("placement", placement),
+            overrides.get("vae", vae),
+            bool(overrides.get("attention_slicing", attention_slicing)),
+        )
+        if candidate not in candidates:
+            candidates.append(candidate)
+
+    plan = None
+    for placement, vae, attention_slicing in candidates:
+        peak = estimate_peak(
+            weights, shape, dtype_bytes, placement, vae, attention_slicing, sdpa=sdpa
+        )
+        plan = MemoryPlan(placement, vae, attention_slicing, peak, budget_bytes)
+        if plan.fits:
+            return plan
+    # Nothing fits: run with the most frugal configuration and let the allocator decide.
+    return plan
+
+
+def memory_overrides(extra: Dict[str, Any]) -> Dict[str, Any]:
+    overrides = dict(extra.get("memory") or {})
+    if overrides.get("placement", PLACEMENTS[0]) not in PLACEMENTS:
+        raise RuntimeError(f"memory.placement must be one of: {', '.join(PLACEMENTS)}.")
+    if overrides.get("vae", VAE_MODES[0]) not in VAE_MODES:
+        raise RuntimeError(f"memory.vae must be one of: {', '.join(VAE_MODES)}.")
+    return overrides
+
+
+def _available_ram() -> int:
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 2**40
+
+
+def device_budget(device: str, held_bytes: int, budget_mb: Optional[int] = None) -> int:
+    budget_mb = budget_mb or load_settings().memory_budget_mb
+    if budget_mb:
+        return budget_mb * 2**20
+    if device == "cpu":
+        return _available_ram() + held_bytes
+    import torch
+
+    index = torch.device(device).index
+    index = torch.cuda.current_device() if index is None else index
+    free, _ = torch.cuda.mem_get_info(index)
+    cached = torch.cuda.memory_reserved(index) - torch.cuda.memory_allocated(index)
+    return int((free + cached + held_bytes) * 0.95)
+
+
+def component_bytes(pipe: Any) -> Dict[str, int]:
+    import torch
+
+    sizes = {}
+    for name, component in pipe.components.items():
+        if not isinstance(component, torch.nn.Module):
+            continue
+        tensors = list(component.parameters()) + list(component.buffers())
+        sizes[name] = sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    return sizes
+
+
+@dataclass
+class _Applied:
+    weights: Dict[str, int]
+    plan: Optional[MemoryPlan] = None
+
+
+_applied: "weakref.WeakKeyDictionary[Any, _Applied]" = weakref.WeakKeyDictionary()
+
+
+def _state(pipe: Any) -> _Applied:
+    state = _applied.get(pipe)
+    if state is None:
+        state = _Applied(weights=component_bytes(pipe))
+        _applied[pipe] = state
+    return state
+
+
+def applied_plan(pipe: Any) -> Optional[MemoryPlan]:
+    state = _applied.get(pipe)
+    return state.plan if state else None
+
+
+def plan_for_pipe(
+    pipe: Any,
+    device: str,
+    shape: RenderShape,
+    dtype_bytes: int,
+    overrides: Optional[Dict[str, Any]] = None,
+) -> MemoryPlan:
+    import torch
+
+    state = _state(pipe)
+    total = sum(state.weights.values())
+    cpu = device == "cpu"
+    held = total if cpu or (state.plan and state.plan.placement == "resident") else 0
+    overrides = dict(overrides or {})
+    budget = device_budget(device, held, overrides.pop("budget_mb", None))
+    return plan_memory(
+        state.weights,
+        shape,
+        budget,
+        dtype_bytes=dtype_bytes,
+        sdpa=hasattr(torch.nn.functional, "scaled_dot_product_attention"),
+        overrides=overrides,
+        placements=("resident",) if cpu else PLACEMENTS,
+    )
+
+
+def apply_memory_plan(pipe: Any, plan: MemoryPlan, device: str) -> None:
+    state = _state(pipe)
+    previous = state.plan
+    if previous is None or previous.placement != plan.placement:
+        if device != "cpu":
+            if plan.placement == "resident":
+                pipe.remove_all_hooks()
+                pipe.to(device)
+            elif plan.placement == "model_offload":
+                pipe.enable_model_cpu_offload(device=device)
+            else:
+                pipe.enable_sequential_cpu_offload(device=device)
+    if previous is None or previous.vae != plan.vae:
+        if plan.vae == "full":
+            pipe.disable_vae_slicing()
+        else:
+            pipe.enable_vae_slicing()
+        if plan.vae == "tiled":
+            pipe.enable_vae_tiling()
+        else:
+            pipe.disable_vae_tiling()
+    if previous is None and plan.attention_slicing:
+        pipe.enable_attention_slicing()
+    elif previous is not None and previous.attention_slicing != plan.attention_slicing:
+        if plan.attention_slicing:
+            pipe.enable_attention_slicing()
+        else:
+            pipe.disable_attention_slicing()
+
+    if previous is None or previous.mode != plan.mode:
+        logger.info("Memory plan on %s: %s", device, plan.describe())
+    state.plan = plan
@@ -0,0 +1,246 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0
+)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._counts: Dict[Labels, list[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def render(self) -> Iterable[str]:
+        yield from super().render()
+        with self._lock:
+            items = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                labels = _format_labels(self.labelnames, key, le)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        collect: Callable[[], Iterable[Sample]],
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def render(self) -> Iterable[str]:
+        samples = list(self.collect())
+        if not samples:
+            return
+        yield from super().render()
+        for labels, value in samples:
+            label_text = _format_labels(self.labelnames, self._key(labels))
+            yield f"{self.name}{label_text} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> None:
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = [line for metric in metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    "ovid_stage_seconds", "Time spent in each generation stage.", ["stage"]
+)
+HTTP_SECONDS = Histogram(
+    "ovid_http_request_seconds", "HTTP handler latency.", ["method", "route", "status"]
+)
+JOBS_TOTAL = Counter("ovid_jobs_total", "Finished jobs by model and status.", ["model", "status"])
+
+_local = threading.local()
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    totals: Optional[Dict[str, float]] = getattr(_local, "totals", None)
+    if totals is not None:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def stage_totals() -> Iterator[Dict[str, float]]:
+    previous = getattr(_local, "totals", None)
+    totals: Dict[str, float] = {}
+    _local.totals = totals
+    try:
+        yield totals
+    finally:
+        _local.totals = previous
+        if previous is not None:
+            for stage, seconds in totals.items():
+                previous[stage] = previous.get(stage, 0.0) + seconds
+
+
+def host_rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _collect_rss() -> Iterable[Sample]:
+    rss = host_rss_bytes()
+    return [({}, rss)] if rss is not None else []
+
+
+def accelerator_memory() -> Dict[str, Dict[str, int]]:
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return {}
+    return {
+        f"cuda:{i}": {
+            "allocated": torch.cuda.memory_allocated(i),
+            "reserved": torch.cuda.memory_reserved(i),
+        }
+        for i in range(torch.cuda.device_count())
+    }
+
+
+def _collect_accelerator(kind: str) -> Iterable[Sample]:
+    return [({"device": device}, stats[kind]) for device, stats in accelerator_memory().items()]
+
+
+Gauge("ovid_host_rss_bytes", "Resident set size of the server process.", _collect_rss)
+Gauge(
+    "ovid_accelerator_allocated_bytes",
+    "Accelerator memory held by tensors.",
+    lambda: _collect_accelerator("allocated"),
+    ["device"],
+)
+Gauge(
+    "ovid_accelerator_reserved_bytes",
+    "Accelerator memory reserved by the caching allocator.",
+    lambda: _collect_accelerator("reserved"),
+    ["device"],
+)
@@ -1,17 +1,306 @@
-from pathlib import Path
-from typing import Optional
+from __future__ import annotations
 
-import imageio
-import numpy as np
-import torch
-from diffusers import MotionAdapter, AnimateDiffPipeline, DDIMScheduler
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import functools
+from dataclasses import dataclass, replace
+from pathlib import Path
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Optional
+import weakref
 
+from .cache import PipelineCache, PipelineKey, get_pipeline_cache
+from .config import load_settings
+from .embeddings import encoder_identity, get_embedding_cache
+from .encode import EncodeOptions, FrameStream, write_video
+from .latents import Captured, Resume, get_latent_store, latent_hooks, refine_start
+from .longvideo import (
+    ContextWindows,
+    FrameSink,
+    configure_windows,
+    decode_streaming,
+    video_to_uint8,
+)
+from .memory import (
+    RenderShape,
+    apply_memory_plan,
+    component_bytes,
+    memory_overrides,
+    plan_for_pipe,
+)
+from .metrics import observe_stage, stage_totals, timed
+from .postprocess import PostProcess
 from .registry import ModelSpec
+from .samplers import (
+    SAMPLERS,
+    Sampler,
+    apply_sampler,
+    build_scheduler,
+    model_sampler,
+    resolve_settings,
+)
+from .weights import share_pipeline_weights
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def _instrument(pipe: Any) -> None:
+    for method, stage in (("encode_prompt", "text_encode"), ("decode_latents", "vae_decode")):
+        original = getattr(pipe, method)
+
+        def wrapped(*args: Any, _original: Callable = original, _stage: str = stage, **kw: Any):
+            with timed(_stage):
+                return _original(*args, **kw)
+
+        setattr(pipe, method, wrapped)
+
+
+def _offset_sink(on_frames: FrameSink, offset: int, index: int, chunk: np.ndarray) -> None:
+    on_frames(offset + index, chunk)
+
+
+_render_locks: "weakref.WeakKeyDictionary[Any, threading.Lock]" = weakref.WeakKeyDictionary()
+_render_locks_lock = threading.Lock()
+
+
+def _render_lock(pipe: Any) -> threading.Lock:
+    # The memory plan, sampler and context windows live on the shared cached pipe, so
+    # renders on one pipe take turns while they set them.
+    with _render_locks_lock:
+        return _render_locks.setdefault(pipe, threading.Lock())
+
+
+def _load_animatediff(key: PipelineKey) -> tuple[Any, int]:
+    adapter_dir = Path(key.adapter)
+    base_dir = Path(key.base)
+    if not adapter_dir.exists():
+        raise RuntimeError(f"Adapter path not found: {adapter_dir}")
+    if not base_dir.exists():
+        raise RuntimeError(f"Base model path not found: {base_dir}")
+
+    import torch
+    from diffusers import MotionAdapter, AnimateDiffPipeline
+
+    dtype = getattr(torch, key.dtype)
+    adapter = MotionAdapter.from_pretrained(str(adapter_dir), torch_dtype=dtype)
+    pipe = AnimateDiffPipeline.from_pretrained(
+        str(base_dir), motion_adapter=adapter, torch_dtype=dtype
+    )
+    pipe.scheduler = build_scheduler(SAMPLERS["ddim"], base_dir)
+    if load_settings().mmap_weights:
+        share_pipeline_weights(pipe, adapter_dir, base_dir)
+    if key.lcm_lora:
+        # Loaded once and switched on only for the lcm sampler, so every sampler shares the UNet.
+        pipe.load_lora_weights(key.lcm_lora, adapter_name="lcm")
+        pipe.disable_lora()
+    if key.device == "cpu" and key.channels_last:
+        pipe.unet.to(memory_format=torch.channels_last)
+        pipe.vae.to(memory_format=torch.channels_last)
+    # Placement, VAE slicing/tiling and attention slicing are chosen per render by the
+    # memory planner (see memory.py).
+    _instrument(pipe)
+    return pipe, sum(component_bytes(pipe).values())
+
+
+# Linear approximation of the SD 1.5 VAE decoder: latent channels -> RGB.
+LATENT_RGB_FACTORS = (
+    (0.3512, 0.2297, 0.3227),
+    (0.3250, 0.4974, 0.2350),
+    (-0.2829, 0.1762, 0.2721),
+    (-0.2120, -0.2616, -0.7177),
+)
+
+
+def latent_preview(latents: Any) -> list[np.ndarray]:
+    import torch
+
+    # latents: (batch, channels, frames, h, w); previews the middle frame of each video.
+    middle = latents[:, :, latents.shape[2] // 2].float()
+    factors = torch.tensor(LATENT_RGB_FACTORS, device=middle.device, dtype=middle.dtype)
+    rgb = torch.einsum("bchw,cr->bhwr", middle, factors)
+    rgb = ((rgb + 1.0) * 127.5).clamp(0, 255).to(torch.uint8).cpu().numpy()
+    return list(rgb)
+
+
+@dataclass(frozen=True)
+class StepProgress:
+    step: int
+    steps: int
+    step_seconds: float
+    eta_seconds: float
+    previews: Optional[list[Optional[np.ndarray]]] = None
+
+
+StepCallback = Callable[[StepProgress], None]
+
+
+def _call_progress(on_step: StepCallback, index: int, calls: int) -> StepCallback:
+    # Progress of one call in a batch rendered call by call, reported for the whole batch.
+    def report(progress: StepProgress) -> None:
+        previews = None
+        if progress.previews is not None:
+            previews = [None] * calls
+            previews[index] = progress.previews[0]
+        remaining = (calls - index - 1) * progress.steps * progress.step_seconds
+        on_step(
+            replace(
+                progress,
+                step=index * progress.steps + progress.step,
+                steps=calls * progress.steps,
+                eta_seconds=progress.eta_seconds + remaining,
+                previews=previews,
+            )
+        )
+
+    return report
+
+
+DTYPES = ("float16", "bfloat16", "float32")
+
+
+def _flag(value: Any, default: bool) -> bool:
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return value.lower() not in ("0", "false", "no", "off")
+    return bool(value)
+
+
+def _optional_int(value: Any) -> Optional[int]:
+    return int(value) if value not in (None, "") else None
+
+
+@dataclass(frozen=True)
+class DeviceOptions:
+    device: str = "auto"
+    dtype: Optional[str] = None
+    threads: Optional[int] = None
+    interop_threads: Optional[int] = None
+    channels_last: Optional[bool] = None
+    inference_mode: Optional[bool] = None
+    onednn_fusion: Optional[bool] = None
+
+    @classmethod
+    def from_model(cls, model: ModelSpec, **overrides: Any) -> "DeviceOptions":
+        extra = model.extra
+        values = {
+            "device": extra.get("device") or "auto",
+            "dtype": extra.get("dtype"),
+            "threads": _optional_int(extra.get("threads")),
+            "interop_threads": _optional_int(extra.get("interop_threads")),
+            "channels_last": extra.get("channels_last"),
+            "inference_mode": extra.get("inference_mode"),
+            "onednn_fusion": extra.get("onednn_fusion"),
+        }
+        values.update({name: value for name, value in overrides.items() if value is not None})
+        return cls(**values)
+
+
+@dataclass(frozen=True)
+class BatchItem:
+    prompt: str
+    negative_prompt: Optional[str]
+    out_path: Path
+    fps: int = 8
+    seed: Optional[int] = None
+    draft: Optional[str] = None
+    refine: Optional[str] = None
+    refine_strength: float = 1.0
 
 
 class VideoPipeline:
-    def __init__(self, model: ModelSpec) -> None:
+    def __init__(
+        self,
+        model: ModelSpec,
+        cache: Optional[PipelineCache] = None,
+        device: Optional[str] = None,
+        dtype: Optional[str] = None,
+        threads: Optional[int] = None,
+        sampler: Optional[str] = None,
+        context: Optional[ContextWindows] = None,
+    ) -> None:
         self.model = model
+        self.sampler_name = sampler
+        self.context = context
+        self.cache = cache or get_pipeline_cache()
+        self.options = DeviceOptions.from_model(model, device=device, dtype=dtype, threads=threads)
+        self._device: Optional[str] = None
+
+    @property
+    def device(self) -> str:
+        if self._device is None:
+            device = self.options.device
+            if device == "auto":
+                import torch
+
+                device = "cuda" if torch.cuda.is_available() else "cpu"
+            if device != "cpu" and device != "cuda" and not device.startswith("cuda:"):
+                raise RuntimeError(f"Unsupported device '{device}'. Use 'cpu', 'cuda' or 'auto'.")
+            self._device = device
+        return self._device
+
+    def dtype(self) -> str:
+        cpu = self.device == "cpu"
+        dtype = self.options.dtype or ("float32" if cpu else "float16")
+        if dtype not in DTYPES:
+            raise RuntimeError(f"Unsupported dtype '{dtype}'. Use one of: {', '.join(DTYPES)}.")
+        if cpu and dtype == "float16":
+            raise RuntimeError("float16 is not supported on CPU; use float32 or bfloat16.")
+        return dtype
+
+    def sampler(self) -> Sampler:
+        return model_sampler(self.model, self.sampler_name)
+
+    def windows(self) -> ContextWindows:
+        return self.context or ContextWindows.from_model(self.model)
+
+    def cache_key(self) -> PipelineKey:
+        if self.model.pipeline != "animatediff":
+            raise RuntimeError(
+                f"Unsupported pipeline '{self.model.pipeline}'. "
+                "Set pipeline to 'animatediff' in model.json."
+            )
+        adapter_path = self.model.extra.get("adapter_path")
+        base_model_path = self.model.extra.get("base_model_path")
+        lcm_lora = self.model.extra.get("lcm_lora")
+        # Converting conv weights to channels-last copies them off the shared mapping, so
+        # with mmapped weights it is only done when the model asks for it.
+        mmap = load_settings().mmap_weights
+        if not adapter_path or not base_model_path:
+            raise RuntimeError(
+                "Animatediff requires 'adapter_path' and 'base_model_path' in model.json."
+            )
+        return PipelineKey(
+            adapter=str(Path(adapter_path).resolve()),
+            base=str(Path(base_model_path).resolve()),
+            dtype=self.dtype(),
+            device=self.device,
+            channels_last=self.device == "cpu" and _flag(self.options.channels_last, not mmap),
+            lcm_lora=str(Path(lcm_lora).resolve()) if lcm_lora else None,
+        )
+
+    def load(self) -> Any:
+        import torch
+
+        key = self.cache_key()
+        if key.device.startswith("cuda") and not torch.cuda.is_available():
+            raise RuntimeError(
+                "CUDA is not available. Set \"device\": \"cpu\" in model.json or the request "
+                "to render on the CPU."
+            )
+        return self.cache.get(key, _load_animatediff)
+
+    def _plan_memory(self, pipe: Any, shape: RenderShape) -> None:
+        dtype_bytes = 4 if self.dtype() == "float32" else 2
+        overrides = memory_overrides(self.model.extra)
+        plan = plan_for_pipe(pipe, self.device, shape, dtype_bytes, overrides)
+        apply_memory_plan(pipe, plan, self.device)
+
+    def unload(self) -> bool:
+        key = self.cache_key()
+        return self.cache.evict(lambda cached: cached == key) > 0
 
     def generate(
         self,
@@ -22,80 +311,313 @@ class VideoPipeline:
         fps: int = 8,
         width: int = 512,
         height: int = 512,
-        steps: int = 20,
-        guidance: float = 7.5,
+        steps: Optional[int] = None,
+        guidance: Optional[float] = None,
         seed: Optional[int] = None,
+        post: Optional[PostProcess] = None,
     ) -> Path:
-        if self.model.pipeline != "animatediff":
-            raise RuntimeError(
-                f"Unsupported pipeline '{self.model.pipeline}'. "
-                "Set pipeline to 'animatediff' in model.json."
+        item = BatchItem(
+            prompt=prompt, negative_prompt=negative_prompt, out_path=out_path, fps=fps, seed=seed
+        )
+        return self.generate_batch([item], frames, width, height, steps, guidance, post)[0]
+
+    def generate_batch(
+        self,
+        items: list[BatchItem],
+        frames: int = 16,
+        width: int = 512,
+        height: int = 512,
+        steps: Optional[int] = None,
+        guidance: Optional[float] = None,
+        post: Optional[PostProcess] = None,
+        options: Optional[EncodeOptions] = None,
+    ) -> list[Path]:
+        post = post or PostProcess(frames, width, height)
+        keyframes = post.keyframes()
+        render_width, render_height = post.render_size()
+        if not self.windows().applies(keyframes):
+            rendered = self.render_batch(
+                items, keyframes, render_width, render_height, steps, guidance
             )
-        return self._generate_animatediff(
-            prompt, negative_prompt, out_path, frames, fps, width, height, steps, guidance, seed
+            for item, vid_frames in zip(items, rendered):
+                write_video(post.apply(vid_frames), item.out_path, item.fps, options)
+            return [item.out_path for item in items]
+
+        streams = [FrameStream(keyframes) for _ in items]
+        with ThreadPoolExecutor(max_workers=len(items)) as pool:
+            futures = [
+                pool.submit(write_video, post.apply(stream), item.out_path, item.fps, options)
+                for item, stream in zip(items, streams)
+            ]
+            try:
+                self.render_batch(
+                    items,
+                    keyframes,
+                    render_width,
+                    render_height,
+                    steps,
+                    guidance,
+                    on_frames=lambda index, chunk: streams[index].put(chunk),
+                )
+            except BaseException as exc:
+                for stream in streams:
+                    stream.fail(exc)
+                raise
+            for stream in streams:
+                stream.close()
+            for future in futures:
+                future.result()
+        return [item.out_path for item in items]
+
+    def render_batch(
+        self,
+        items: list[BatchItem],
+        frames: int = 16,
+        width: int = 512,
+        height: int = 512,
+        steps: Optional[int] = None,
+        guidance: Optional[float] = None,
+        on_step: Optional[StepCallback] = None,
+        previews: bool = False,
+        on_frames: Optional[FrameSink] = None,
+    ) -> list[np.ndarray]:
+        return self._render_animatediff(
+            items, frames, width, height, steps, guidance, on_step, previews, on_frames
         )
 
-    def _generate_animatediff(
+    def _step_callback(self, steps: int, on_step: StepCallback, previews: bool) -> Callable:
+        started = time.perf_counter()
+        last = started
+
+        def callback(pipe: Any, step: int, timestep: Any, callback_kwargs: dict) -> dict:
+            nonlocal last
+            now = time.perf_counter()
+            done = step + 1
+            on_step(
+                StepProgress(
+                    step=done,
+                    steps=steps,
+                    step_seconds=now - last,
+                    eta_seconds=(now - started) / done * (steps - done),
+                    previews=latent_preview(callback_kwargs["latents"]) if previews else None,
+                )
+            )
+            last = now
+            return callback_kwargs
+
+        return callback
+
+    def _configure_cpu(self) -> None:
+        import torch
+
+        if self.options.threads:
+            torch.set_num_threads(self.options.threads)
+        interop = self.options.interop_threads
+        if interop and torch.get_num_interop_threads() != interop:
+            try:
+                torch.set_num_interop_threads(interop)
+            except RuntimeError:
+                # Only allowed before the first inter-op parallel region of the process.
+                pass
+        # The UNet runs eagerly; oneDNN graph fusion only applies to traced/scripted modules,
+        # so this just decides whether the eager convolutions use oneDNN kernels.
+        torch.backends.mkldnn.enabled = _flag(self.options.onednn_fusion, True)
+
+    def _render_animatediff(
         self,
-        prompt: str,
-        negative_prompt: Optional[str],
-        out_path: Path,
+        items: list[BatchItem],
+        frames: int,
+        width: int,
+        height: int,
+        steps: Optional[int],
+        guidance: Optional[float],
+        on_step: Optional[StepCallback],
+        previews: bool,
+        on_frames: Optional[FrameSink],
+    ) -> list[np.ndarray]:
+        import torch
+
+        sampler = self.sampler()
+        steps, guidance = resolve_settings(sampler, steps, guidance)
+        windows = self.windows()
+        long_clip = windows.applies(frames)
+        # FreeNoise encodes a single prompt per call, so windowed clips render one at a time.
+        calls = [[item] for item in items] if long_clip else [items]
+        # Windowed clips run the UNet one window at a time, so plan for a window's frames.
+        planned_frames = windows.length if long_clip else frames
+        pipe = self.load()
+        with _render_lock(pipe):
+            self._plan_memory(pipe, RenderShape(len(calls[0]), planned_frames, width, height))
+            key = self.cache_key()
+            apply_sampler(pipe, sampler, Path(key.base), key.lcm_lora is not None)
+            configure_windows(pipe, windows, frames, len(calls[0]))
+            stream = long_clip and on_frames is not None
+            cpu = self.device == "cpu"
+            if cpu:
+                self._configure_cpu()
+
+            videos: list[np.ndarray] = []
+            inference = _flag(self.options.inference_mode, cpu)
+            with torch.inference_mode() if inference else nullcontext():
+                for batch in calls:
+                    offset = len(videos)
+                    sink = None
+                    if stream:
+                        sink = functools.partial(_offset_sink, on_frames, offset)
+                    progress = on_step
+                    if on_step and len(calls) > 1:
+                        progress = _call_progress(on_step, offset, len(calls))
+                    videos.extend(
+                        self._denoise(
+                            pipe,
+                            batch,
+                            frames,
+                            width,
+                            height,
+                            steps,
+                            guidance,
+                            progress,
+                            previews,
+                            sink,
+                            windows if long_clip else None,
+                        )
+                    )
+        return videos
+
+    def _prompt_embeds(
+        self, pipe: Any, prompts: list[str], negative_prompts: list[str], guidance: float
+    ) -> dict:
+        import torch
+
+        cache = get_embedding_cache()
+        if not cache.enabled:
+            return {"prompt": prompts, "negative_prompt": negative_prompts}
+        key = self.cache_key()
+        device = pipe._execution_device
+        guided = guidance > 1
+        texts = prompts + negative_prompts if guided else prompts
+
+        def encode(missing: list[str]) -> Any:
+            with torch.no_grad():
+                return pipe.encode_prompt(missing, device, 1, False)[0]
+
+        embeds = cache.encode(encoder_identity(key.base, key.dtype), str(device), texts, encode)
+        return {
+            "prompt_embeds": embeds[: len(prompts)],
+            "negative_prompt_embeds": embeds[len(prompts) :] if guided else None,
+        }
+
+    def _resume(self, items: list[BatchItem]) -> Resume:
+        import torch
+
+        store = get_latent_store()
+        latents, noise = [], []
+        for item in items:
+            draft = store.load(item.refine) if item.refine else None
+            if draft is None:
+                raise RuntimeError(f"Draft '{item.refine}' was not found or has expired.")
+            latents.append(draft.latents)
+            # The draft's own noise continues its trajectory; another seed re-noises the
+            # draft with fresh noise (video-to-video).
+            same_seed = item.seed is None or item.seed == draft.meta.get("seed")
+            noise.append(draft.noise if same_seed else None)
+        return Resume(torch.cat(latents), noise, items[0].refine_strength)
+
+    def _save_drafts(
+        self,
+        items: list[BatchItem],
+        captured: Captured,
         frames: int,
-        fps: int,
         width: int,
         height: int,
         steps: int,
-        guidance: float,
-        seed: Optional[int],
-    ) -> Path:
-        adapter_path = self.model.extra.get("adapter_path")
-        base_model_path = self.model.extra.get("base_model_path")
-        if not adapter_path or not base_model_path:
-            raise RuntimeError(
-                "Animatediff requires 'adapter_path' and 'base_model_path' in model.json."
-            )
+    ) -> None:
+        if captured.latents is None or captured.noise is None:
+            return
+        store = get_latent_store()
+        for index, item in enumerate(items):
+            if item.draft:
+                meta = {
+                    "model": self.model.name,
+                    "frames": frames,
+                    "width": width,
+                    "height": height,
+                    "steps": steps,
+                    "seed": item.seed,
+                }
+                store.save(
+                    item.draft,
+                    captured.noise[index : index + 1],
+                    captured.latents[index : index + 1],
+                    meta,
+                )
 
-        adapter_dir = Path(adapter_path).resolve()
-        base_dir = Path(base_model_path).resolve()
-        if not adapter_dir.exists():
-            raise RuntimeError(f"Adapter path not found: {adapter_dir}")
-        if not base_dir.exists():
-            raise RuntimeError(f"Base model path not found: {base_dir}")
+    def _denoise(
+        self,
+        pipe: Any,
+        items: list[BatchItem],
+        frames: int,
+        width: int,
+        height: int,
+        steps: int,
+        guidance: float,
+        on_step: Optional[StepCallback],
+        previews: bool,
+        on_frames: Optional[FrameSink],
+        windows: Optional[ContextWindows],
+    ) -> list[np.ndarray]:
+        import numpy as np
+        import torch
 
-        if not torch.cuda.is_available():
-            raise RuntimeError("CUDA GPU is required for AnimateDiff on Windows.")
+        generators = []
+        for item in items:
+            # FreeNoise shuffles its windows with torch.randperm(generator=...) on the CPU, so
+            # windowed calls (one item each) take a single CPU generator.
+            generator = torch.Generator("cpu" if windows else self.device)
+            if item.seed is not None:
+                generator.manual_seed(item.seed)
+            else:
+                generator.seed()
+            generators.append(generator)
 
-        adapter = MotionAdapter.from_pretrained(str(adapter_dir), torch_dtype=torch.float16)
-        pipe = AnimateDiffPipeline.from_pretrained(
-            str(base_dir), motion_adapter=adapter, torch_dtype=torch.float16
-        )
-        scheduler = DDIMScheduler.from_pretrained(
-            str(base_dir),
-            subfolder="scheduler",
-            clip_sample=False,
-            timestep_spacing="linspace",
-            steps_offset=1,
-        )
-        pipe.scheduler = scheduler
-        pipe.enable_vae_slicing()
-        pipe.enable_model_cpu_offload()
-
-        generator = torch.Generator("cuda")
-        if seed is not None:
-            generator = generator.manual_seed(seed)
-
-        output = pipe(
-            prompt=prompt,
-            num_frames=frames,
-            negative_prompt=negative_prompt,
-            guidance_scale=guidance,
-            num_inference_steps=steps,
-            width=width,
-            height=height,
-            generator=generator,
-        )
-        vid_frames = output.frames[0]
-        out_path.parent.mkdir(parents=True, exist_ok=True)
-        arr = [np.array(frame).astype(np.uint8) for frame in vid_frames]
-        imageio.mimsave(out_path, arr, fps=fps)
-        return out_path
+        resume = self._resume(items) if items[0].refine else None
+        # A refine starts part way into the schedule and only runs the remaining steps.
+        run_steps = steps - refine_start(steps, resume.strength) if resume else steps
+        prompts = [item.prompt for item in items]
+        negative_prompts = [item.negative_prompt or "" for item in items]
+        with stage_totals() as totals:
+            start = time.perf_counter()
+            if windows:
+                # FreeNoise only takes the prompt text, so its text encoder runs every call.
+                text = {"prompt": prompts[0], "negative_prompt": negative_prompts[0]}
+            else:
+                text = self._prompt_embeds(pipe, prompts, negative_prompts, guidance)
+            hooks = resume is not None or any(item.draft for item in items)
+            with latent_hooks(pipe, resume) if hooks else nullcontext(Captured()) as captured:
+                output = pipe(
+                    **text,
+                    num_frames=frames,
+                    guidance_scale=guidance,
+                    num_inference_steps=steps,
+                    width=width,
+                    height=height,
+                    generator=generators[0] if windows else generators,
+                    output_type="latent" if on_frames else "pt",
+                    callback_on_step_end=(
+                        self._step_callback(run_steps, on_step, previews) if on_step else None
+                    ),
+                )
+            elapsed = time.perf_counter() - start
+            observe_stage(
+                "denoise",
+                elapsed - totals.get("text_encode", 0.0) - totals.get("vae_decode", 0.0),
+            )
+            if on_frames:
+                captured.latents = output.frames
+            self._save_drafts(items, captured, frames, width, height, steps)
+            if on_frames and windows:
+                # Each decoded window goes straight to the encoder; the clip is never held whole.
+                decode_streaming(pipe, output.frames, windows.length, on_frames)
+                return [np.empty((0, height, width, 3), np.uint8) for _ in items]
+        with timed("frame_convert"):
+            return list(video_to_uint8(output.frames))
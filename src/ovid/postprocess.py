@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import math
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, Optional, Sequence
+
+from .metrics import observe_stage
+
+if TYPE_CHECKING:
+    import numpy as np
+
+Interpolator = Callable[["np.ndarray", "np.ndarray", Sequence[float]], "list[np.ndarray]"]
+Upscaler = Callable[["np.ndarray", int, int], "np.ndarray"]
+
+INTERPOLATORS: Dict[str, Interpolator] = {}
+UPSCALERS: Dict[str, Upscaler] = {}
+INTERPOLATOR_GROUP = "ovid.interpolators"
+UPSCALER_GROUP = "ovid.upscalers"
+UPSCALE_CHUNK = 16
+
+
+def register_interpolator(name: str) -> Callable[[Interpolator], Interpolator]:
+    def register(fn: Interpolator) -> Interpolator:
+        INTERPOLATORS[name] = fn
+        return fn
+
+    return register
+
+
+def register_upscaler(name: str) -> Callable[[Upscaler], Upscaler]:
+    def register(fn: Upscaler) -> Upscaler:
+        UPSCALERS[name] = fn
+        return fn
+
+    return register
+
+
+def _plugin(registry: Dict[str, Any], group: str, name: str, kind: str) -> Any:
+    from importlib.metadata import entry_points
+
+    if name not in registry:
+        # Learned models (RIFE, Real-ESRGAN, ...) ship as plugins exposing the same callable.
+        for entry in entry_points(group=group):
+            if entry.name == name:
+                registry[name] = entry.load()
+                break
+    plugin = registry.get(name)
+    if plugin is None:
+        available = sorted(set(registry) | {entry.name for entry in entry_points(group=group)})
+        raise RuntimeError(f"Unknown {kind} '{name}'. Use one of: {', '.join(available)}.")
+    return plugin
+
+
+def get_interpolator(name: str) -> Interpolator:
+    return _plugin(INTERPOLATORS, INTERPOLATOR_GROUP, name, "interpolator")
+
+
+def get_upscaler(name: str) -> Upscaler:
+    return _plugin(UPSCALERS, UPSCALER_GROUP, name, "upscaler")
+
+
+def keyframe_count(frames: int, ratio: int) -> int:
+    return math.ceil((frames - 1) / ratio) + 1 if frames > 1 else frames
+
+
+@register_interpolator("blend")
+def blend(a: np.ndarray, b: np.ndarray, ts: Sequence[float]) -> list[np.ndarray]:
+    import numpy as np
+
+    a32, b32 = a.astype(np.float32), b.astype(np.float32)
+    return [((1 - t) * a32 + t * b32).round().astype(np.uint8) for t in ts]
+
+
+def _luma(frame: np.ndarray, scale: int) -> np.ndarray:
+    import numpy as np
+
+    h, w = frame.shape[0] // scale * scale, frame.shape[1] // scale * scale
+    gray = frame[:h, :w].astype(np.float32) @ np.array([0.299, 0.587, 0.114], np.float32)
+    return gray.reshape(h // scale, scale, w // scale, scale).mean(axis=(1, 3))
+
+
+def _box(values: np.ndarray, radius: int) -> np.ndarray:
+    import numpy as np
+
+    padded = np.pad(values, radius, mode="edge")
+    summed = padded.cumsum(0).cumsum(1)
+    summed = np.pad(summed, ((1, 0), (1, 0)))
+    size = 2 * radius + 1
+    inner = summed[size:, size:] - summed[:-size, size:] - summed[size:, :-size]
+    return inner + summed[:-size, :-size]
+
+
+def _block_flow(
+    a: np.ndarray, b: np.ndarray, scale: int, radius: int
+) -> tuple[np.ndarray, np.ndarray]:
+    import numpy as np
+
+    small_a, small_b = _luma(a, scale), _luma(b, scale)
+    padded_b = np.pad(small_b, radius, mode="edge")
+    h, w = small_a.shape
+    best_cost = np.full((h, w), np.inf, np.float32)
+    flow = np.zeros((h, w, 2), np.float32)
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            shifted = padded_b[radius + dy : radius + dy + h, radius + dx : radius + dx + w]
+            # Matching over a 3x3 neighbourhood, with a small bias towards no motion.
+            cost = _box(np.abs(small_a - shifted), 1) + 0.5 * (abs(dy) + abs(dx))
+            better = cost < best_cost
+            best_cost = np.where(better, cost, best_cost)
+            flow[better] = (dy, dx)
+    return flow * scale, best_cost / 9
+
+
+def _resize(field: np.ndarray, height: int, width: int) -> np.ndarray:
+    import numpy as np
+
+    h, w = field.shape[:2]
+    ys = np.clip((np.arange(height) + 0.5) * h / height - 0.5, 0, h - 1)
+    xs = np.clip((np.arange(width) + 0.5) * w / width - 0.5, 0, w - 1)
+    grid_y, grid_x = np.meshgrid(ys, xs, indexing="ij")
+    return _sample(field, grid_y, grid_x)
+
+
+def _sample(image: np.ndarray, y: np.ndarray, x: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    h, w = image.shape[:2]
+    y = np.clip(y, 0, h - 1)
+    x = np.clip(x, 0, w - 1)
+    y0, x0 = np.floor(y).astype(np.int64), np.floor(x).astype(np.int64)
+    y1, x1 = np.minimum(y0 + 1, h - 1), np.minimum(x0 + 1, w - 1)
+    wy, wx = (y - y0)[..., None], (x - x0)[..., None]
+    top = image[y0, x0] * (1 - wx) + image[y0, x1] * wx
+    bottom = image[y1, x0] * (1 - wx) + image[y1, x1] * wx
+    return top * (1 - wy) + bottom * wy
+
+
+@register_interpolator("mc")
+def motion_compensated(
+    a: np.ndarray, b: np.ndarray, ts: Sequence[float], scale: int = 8, radius: int = 4
+) -> list[np.ndarray]:
+    import numpy as np
+
+    height, width = a.shape[:2]
+    if height < scale or width < scale:
+        return blend(a, b, ts)
+    flow, cost = _block_flow(a, b, scale, radius)
+    flow = _resize(flow, height, width)
+    # Where no displacement explains the change (occlusions, cuts), fall back to a cross-fade.
+    trust = np.clip(1.5 - _resize(cost[..., None], height, width) / 24.0, 0.0, 1.0)
+    a32, b32 = a.astype(np.float32), b.astype(np.float32)
+    grid_y, grid_x = np.mgrid[0:height, 0:width].astype(np.float32)
+    frames = []
+    for t in ts:
+        from_a = _sample(a32, grid_y - t * flow[..., 0], grid_x - t * flow[..., 1])
+        from_b = _sample(b32, grid_y + (1 - t) * flow[..., 0], grid_x + (1 - t) * flow[..., 1])
+        warped = (1 - t) * from_a + t * from_b
+        faded = (1 - t) * a32 + t * b32
+        frames.append((trust * warped + (1 - trust) * faded).round().astype(np.uint8))
+    return frames
+
+
+class FrameInterpolation:
+    def __init__(
+        self,
+        frames: Iterable[np.ndarray],
+        ratio: int,
+        method: str = "mc",
+        total: Optional[int] = None,
+    ) -> None:
+        self.frames = frames
+        self.ratio = ratio
+        self.interpolator = get_interpolator(method)
+        self.total = total
+        self.seconds = 0.0
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        import numpy as np
+
+        ts = [i / self.ratio for i in range(1, self.ratio)]
+        limit = self.total if self.total is not None else math.inf
+        emitted = 0
+        previous: Optional[np.ndarray] = None
+        try:
+            for frame in self.frames:
+                # Past the requested length the source is still drained, so a streaming
+                # producer never blocks on a consumer that stopped reading.
+                if emitted >= limit:
+                    continue
+                frame = np.asarray(frame)
+                if previous is not None:
+                    start = time.perf_counter()
+                    between = self.interpolator(previous, frame, ts)
+                    self.seconds += time.perf_counter() - start
+                    for mid in between:
+                        if emitted >= limit:
+                            break
+                        emitted += 1
+                        yield mid
+                if emitted < limit:
+                    emitted += 1
+                    yield frame
+                previous = frame
+        finally:
+            observe_stage("interpolate", self.seconds)
+
+
+def _torch_resize(mode: str) -> Upscaler:
+    def resize(frames: np.ndarray, width: int, height: int) -> np.ndarray:
+        import torch
+        import torch.nn.functional as F
+
+        with torch.inference_mode():
+            stack = torch.from_numpy(frames).permute(0, 3, 1, 2).float()
+            resized = F.interpolate(
+                stack, size=(height, width), mode=mode, align_corners=False, antialias=True
+            )
+            return resized.clamp_(0, 255).round_().byte().permute(0, 2, 3, 1).numpy()
+
+    return resize
+
+
+register_upscaler("bilinear")(_torch_resize("bilinear"))
+register_upscaler("bicubic")(_torch_resize("bicubic"))
+
+
+def sharpen(frames: np.ndarray, amount: float) -> np.ndarray:
+    import torch
+    import torch.nn.functional as F
+
+    # Unsharp mask with a 5x5 Gaussian, one depthwise convolution over the whole stack.
+    taps = torch.tensor([1.0, 4.0, 6.0, 4.0, 1.0])
+    kernel = (taps[:, None] * taps[None, :] / 256).expand(3, 1, 5, 5)
+    with torch.inference_mode():
+        stack = torch.from_numpy(frames).permute(0, 3, 1, 2).float()
+        blurred = F.conv2d(F.pad(stack, (2, 2, 2, 2), mode="replicate"), kernel, groups=3)
+        sharpened = stack + amount * (stack - blurred)
+        return sharpened.clamp_(0, 255).round_().byte().permute(0, 2, 3, 1).numpy()
+
+
+class FrameUpscale:
+    def __init__(
+        self,
+        frames: Iterable[np.ndarray],
+        width: int,
+        height: int,
+        method: str = "bicubic",
+        sharpen: float = 0.0,
+        chunk: int = UPSCALE_CHUNK,
+    ) -> None:
+        self.frames = frames
+        self.width = width
+        self.height = height
+        self.upscaler = get_upscaler(method)
+        self.sharpen = sharpen
+        self.chunk = chunk
+        self.seconds = 0.0
+
+    def _upscale(self, pending: list[np.ndarray]) -> np.ndarray:
+        import numpy as np
+
+        start = time.perf_counter()
+        stack = np.stack(pending)
+        if stack.shape[1:3] != (self.height, self.width):
+            stack = self.upscaler(stack, self.width, self.height)
+        if self.sharpen:
+            stack = sharpen(stack, self.sharpen)
+        self.seconds += time.perf_counter() - start
+        return stack
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        import numpy as np
+
+        pending: list[np.ndarray] = []
+        try:
+            for frame in self.frames:
+                pending.append(np.asarray(frame))
+                if len(pending) == self.chunk:
+                    yield from self._upscale(pending)
+                    pending = []
+            if pending:
+                yield from self._upscale(pending)
+        finally:
+            observe_stage("upscale", self.seconds)
+
+
+def render_size(width: int, height: int, scale: float) -> tuple[int, int]:
+    if scale >= 1:
+        return width, height
+    # The VAE works on multiples of 8 pixels.
+    return max(64, round(width * scale / 8) * 8), max(64, round(height * scale / 8) * 8)
+
+
+@dataclass(frozen=True)
+class PostProcess:
+    frames: int
+    width: int
+    height: int
+    interpolate: int = 1
+    interpolator: str = "mc"
+    render_scale: float = 1.0
+    upscaler: str = "bicubic"
+    sharpen: float = 0.0
+
+    def keyframes(self) -> int:
+        return keyframe_count(self.frames, self.interpolate)
+
+    def render_size(self) -> tuple[int, int]:
+        return render_size(self.width, self.height, self.render_scale)
+
+    def validate(self) -> None:
+        if self.interpolate > 1:
+            get_interpolator(self.interpolator)
+        if self.render_scale < 1:
+            get_upscaler(self.upscaler)
+
+    def apply(self, frames: Iterable[np.ndarray]) -> Iterable[np.ndarray]:
+        # Interpolating before upscaling keeps motion estimation at the cheaper resolution.
+        if self.interpolate > 1:
+            frames = FrameInterpolation(frames, self.interpolate, self.interpolator, self.frames)
+        if self.render_size() != (self.width, self.height) or self.sharpen:
+            frames = FrameUpscale(frames, self.width, self.height, self.upscaler, self.sharpen)
+        return frames
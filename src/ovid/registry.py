@@ -1,12 +1,15 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
-import hashlib
 import json
 import os
 from pathlib import Path
-from typing import Dict, Optional
-from urllib.request import urlopen
+import threading
+import time
+from typing import Callable, Dict, Optional
 
 from .config import load_settings
+from .download import Downloader, ProgressCallback, TransferProgress
+from .manifest import Manifest, sha256_file
 
 
 @dataclass(frozen=True)
@@ -56,13 +59,121 @@ def discover_models(models_dir: Path) -> Dict[str, ModelSpec]:
     return models
 
 
-def list_models() -> Dict[str, ModelSpec]:
+Stamp = tuple[int, int, int]
+
+
+def _stamp(path: Path) -> Optional[Stamp]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class ModelIndex:
+    def __init__(
+        self,
+        models_dir: Path,
+        rescan_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.models_dir = models_dir
+        self.rescan_interval = rescan_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._dir_stamp: Optional[Stamp] = None
+        self._scanned_at: Optional[float] = None
+        self._entries: Dict[str, tuple[Optional[Stamp], Optional[ModelSpec]]] = {}
+        self._by_name: Dict[str, ModelSpec] = {}
+        self.scans = 0
+        self.parses = 0
+
+    def models(self) -> Dict[str, ModelSpec]:
+        with self._lock:
+            self._refresh(rescan_due=True)
+            return dict(self._by_name)
+
+    def get(self, name: str) -> Optional[ModelSpec]:
+        with self._lock:
+            self._refresh(rescan_due=False)
+            spec = self._by_name.get(name)
+            if spec is None:
+                self._refresh(rescan_due=True)
+                return self._by_name.get(name)
+            child = spec.path.name
+            stamp = _stamp(spec.path / "model.json")
+            if stamp != self._entries[child][0]:
+                self._entries[child] = (stamp, self._parse(spec.path, stamp))
+                self._rebuild()
+            return self._by_name.get(name)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._dir_stamp = None
+
+    def _refresh(self, rescan_due: bool) -> None:
+        now = self._clock()
+        stamp = _stamp(self.models_dir)
+        if stamp is None:
+            self._dir_stamp = None
+            self._entries.clear()
+            self._by_name.clear()
+            return
+        stale = self._scanned_at is None or now - self._scanned_at >= self.rescan_interval
+        if stamp != self._dir_stamp or (rescan_due and stale):
+            self._dir_stamp = stamp
+            self._scanned_at = now
+            self._scan()
+
+    def _parse(self, model_dir: Path, stamp: Optional[Stamp]) -> Optional[ModelSpec]:
+        if stamp is None:
+            return None
+        self.parses += 1
+        return _read_model_json(model_dir)
+
+    def _scan(self) -> None:
+        self.scans += 1
+        entries = {}
+        with os.scandir(self.models_dir) as it:
+            children = sorted(entry.name for entry in it if entry.is_dir())
+        for child in children:
+            model_dir = self.models_dir / child
+            stamp = _stamp(model_dir / "model.json")
+            cached = self._entries.get(child)
+            if cached is not None and cached[0] == stamp:
+                entries[child] = cached
+            else:
+                entries[child] = (stamp, self._parse(model_dir, stamp))
+        self._entries = entries
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._by_name = {
+            spec.name: spec for _, spec in self._entries.values() if spec is not None
+        }
+
+
+_model_indexes: Dict[Path, ModelIndex] = {}
+_model_indexes_lock = threading.Lock()
+
+
+def model_index(models_dir: Optional[Path] = None) -> ModelIndex:
     settings = load_settings()
-    return discover_models(settings.models_dir)
+    models_dir = models_dir or settings.models_dir
+    with _model_indexes_lock:
+        index = _model_indexes.get(models_dir)
+        if index is None:
+            index = ModelIndex(models_dir, rescan_interval=settings.model_rescan_interval)
+            _model_indexes[models_dir] = index
+        return index
+
+
+def list_models() -> Dict[str, ModelSpec]:
+    return model_index().models()
 
 
 def get_model(name: str) -> Optional[ModelSpec]:
-    return list_models().get(name)
+    return model_index().get(name)
 
 
 def _registry_path() -> Path:
@@ -72,10 +183,7 @@ def _registry_path() -> Path:
     return Path.cwd() / "registry.json"
 
 
-def _load_registry() -> Dict[str, RemoteModelSpec]:
-    reg_path = _registry_path()
-    if not reg_path.exists():
-        return {}
+def _parse_registry(reg_path: Path) -> Dict[str, RemoteModelSpec]:
     with reg_path.open("r", encoding="utf-8") as f:
         data = json.load(f)
     models = data.get("models", {})
@@ -101,49 +209,128 @@ def _load_registry() -> Dict[str, RemoteModelSpec]:
     return out
 
 
+_registry_cache: Dict[Path, tuple[Stamp, Dict[str, RemoteModelSpec]]] = {}
+_registry_cache_lock = threading.Lock()
+
+
+def _load_registry() -> Dict[str, RemoteModelSpec]:
+    reg_path = _registry_path()
+    stamp = _stamp(reg_path)
+    if stamp is None:
+        return {}
+    with _registry_cache_lock:
+        cached = _registry_cache.get(reg_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    models = _parse_registry(reg_path)
+    with _registry_cache_lock:
+        _registry_cache[reg_path] = (stamp, models)
+    return models
+
+
 def list_remote_models() -> Dict[str, RemoteModelSpec]:
-    return _load_registry()
+    return dict(_load_registry())
 
 
 def get_remote_model(name: str) -> Optional[RemoteModelSpec]:
     return _load_registry().get(name)
 
 
-def _sha256_file(path: Path) -> str:
-    h = hashlib.sha256()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
-
-
-def _download_with_checksum(url: str, dest: Path, sha256: str) -> None:
+def _download_with_checksum(
+    url: str, dest: Path, sha256: str, downloader: Optional[Downloader] = None
+) -> None:
     dest.parent.mkdir(parents=True, exist_ok=True)
     tmp_path = dest.with_suffix(dest.suffix + ".part")
-    with urlopen(url) as resp, tmp_path.open("wb") as f:
-        while True:
-            chunk = resp.read(1024 * 1024)
-            if not chunk:
-                break
-            f.write(chunk)
-    actual = _sha256_file(tmp_path)
+    actual = (downloader or Downloader()).fetch(url, tmp_path)
     if actual.lower() != sha256.lower():
         tmp_path.unlink(missing_ok=True)
         raise RuntimeError(f"Checksum mismatch for {dest.name}")
     tmp_path.replace(dest)
 
 
-def pull_model(name: str, force: bool = False) -> Path:
+def pull_model(
+    name: str,
+    force: bool = False,
+    progress: Optional[ProgressCallback] = None,
+    connections: Optional[int] = None,
+) -> Path:
     settings = load_settings()
     registry = list_remote_models()
     spec = registry.get(name)
     if not spec:
         raise RuntimeError(f"Model '{name}' not found in registry.")
     target_dir = settings.models_dir / spec.dir
+    downloader = Downloader(
+        connections=connections or settings.download_connections,
+        segment_size=settings.download_segment_mb * 2**20,
+        progress=TransferProgress(progress),
+    )
+    manifest = Manifest(target_dir)
+    pending = []
     for item in spec.files:
         dest = target_dir / item.path
-        if dest.exists() and not force:
-            if _sha256_file(dest).lower() == item.sha256.lower():
+        if not force and dest.exists():
+            known = manifest.verified_hash(item.path)
+            if known is None:
+                known = sha256_file(dest)
+                manifest.record(item.path, known)
+            if known == item.sha256.lower():
                 continue
-        _download_with_checksum(item.url, dest, item.sha256)
+        manifest.forget(item.path)
+        pending.append((item, dest))
+
+    def download(item: RemoteFileSpec, dest: Path) -> None:
+        _download_with_checksum(item.url, dest, item.sha256, downloader)
+        manifest.record(item.path, item.sha256)
+
+    try:
+        with ThreadPoolExecutor(max_workers=downloader.connections) as pool:
+            futures = [pool.submit(download, item, dest) for item, dest in pending]
+            for future in futures:
+                future.result()
+    finally:
+        manifest.save()
     return target_dir
+
+
+def _model_files(name: str) -> tuple[Path, Dict[str, Optional[str]]]:
+    spec = get_remote_model(name)
+    if spec:
+        target_dir = load_settings().models_dir / spec.dir
+        return target_dir, {item.path: item.sha256.lower() for item in spec.files}
+    local = get_model(name)
+    if not local:
+        raise RuntimeError(f"Model '{name}' not found.")
+    manifest = Manifest(local.path)
+    return local.path, {path: manifest.recorded_hash(path) for path in manifest.paths()}
+
+
+def verify_model(name: str, deep: bool = False, jobs: Optional[int] = None) -> Dict[str, str]:
+    target_dir, expected = _model_files(name)
+    if not expected:
+        raise RuntimeError(f"No recorded checksums for '{name}'. Pull it from the registry first.")
+    manifest = Manifest(target_dir)
+    results: Dict[str, str] = {}
+    to_hash = []
+    for rel_path, sha256 in expected.items():
+        if not (target_dir / rel_path).is_file():
+            results[rel_path] = "missing"
+        elif deep:
+            to_hash.append(rel_path)
+        elif sha256 and manifest.verified_hash(rel_path) == sha256:
+            results[rel_path] = "ok"
+        else:
+            results[rel_path] = "changed"
+
+    if to_hash:
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            digests = pool.map(sha256_file, [target_dir / rel_path for rel_path in to_hash])
+            for rel_path, digest in zip(to_hash, digests):
+                if digest == expected[rel_path]:
+                    manifest.record(rel_path, digest)
+                    results[rel_path] = "ok"
+                else:
+                    manifest.forget(rel_path)
+                    results[rel_path] = "mismatch"
+        manifest.save()
+    return dict(sorted(results.items()))
@@ -0,0 +1,91 @@
+from typing import Any, Dict, Literal
+
+from pydantic import BaseModel, Field
+
+from .encode import EncodeOptions
+from .longvideo import ContextWindows
+from .postprocess import PostProcess
+from .registry import ModelSpec
+from .samplers import model_sampler, resolve_settings
+
+
+class GenerateRequest(BaseModel):
+    prompt: str = Field(..., min_length=1)
+    negative_prompt: str | None = None
+    model: str | None = None
+    frames: int = Field(16, ge=1, le=240)
+    fps: int = Field(8, ge=1, le=60)
+    width: int = Field(512, ge=128, le=1024)
+    height: int = Field(512, ge=128, le=1024)
+    sampler: Literal["ddim", "dpmpp", "euler", "euler_a", "unipc", "lcm"] | None = None
+    steps: int | None = Field(None, ge=1, le=60)
+    guidance: float | None = Field(None, ge=1.0, le=15.0)
+    seed: int | None = None
+    format: Literal["mp4", "webm", "gif", "webp", "png"] = "mp4"
+    codec: str | None = Field(None, pattern=r"^[A-Za-z0-9_-]+$")
+    crf: int | None = Field(None, ge=0, le=63)
+    encode_threads: int | None = Field(None, ge=1, le=64)
+    preview: bool = True
+    device: Literal["auto", "cpu", "cuda"] | None = None
+    dtype: Literal["float16", "bfloat16", "float32"] | None = None
+    context_length: int | None = Field(None, ge=1, le=32)
+    context_stride: int | None = Field(None, ge=1, le=32)
+    context_weighting: Literal["pyramid", "flat", "delayed_reverse_sawtooth"] | None = None
+    interpolate: int = Field(1, ge=1, le=8)
+    interpolator: str = Field("mc", pattern=r"^[A-Za-z0-9_.-]+$")
+    render_scale: float = Field(1.0, ge=0.25, le=1.0)
+    upscaler: str = Field("bicubic", pattern=r"^[A-Za-z0-9_.-]+$")
+    sharpen: float = Field(0.0, ge=0.0, le=2.0)
+    draft: bool = False
+    refine: str | None = Field(None, pattern=r"^[0-9a-f]{32}$")
+    refine_strength: float = Field(0.5, gt=0.0, le=1.0)
+
+    def post_process(self) -> PostProcess:
+        return PostProcess(
+            frames=self.frames,
+            width=self.width,
+            height=self.height,
+            interpolate=self.interpolate,
+            interpolator=self.interpolator,
+            render_scale=self.render_scale,
+            upscaler=self.upscaler,
+            sharpen=self.sharpen,
+        )
+
+    def keyframes(self) -> int:
+        return self.post_process().keyframes()
+
+    def context(self) -> ContextWindows:
+        return ContextWindows(
+            self.context_length or ContextWindows.length,
+            self.context_stride or ContextWindows.stride,
+            self.context_weighting or ContextWindows.weighting,
+        )
+
+    def encode_options(self) -> EncodeOptions:
+        return EncodeOptions(
+            format=self.format, codec=self.codec, crf=self.crf, threads=self.encode_threads
+        )
+
+    def result_fields(self) -> Dict[str, Any]:
+        # preview and encode_threads change how a job runs, not the file it writes.
+        return self.model_dump(exclude={"model", "preview", "encode_threads"})
+
+
+def resolve_request(req: GenerateRequest, model: ModelSpec) -> GenerateRequest:
+    sampler = model_sampler(model, req.sampler)
+    steps, guidance = resolve_settings(sampler, req.steps, req.guidance)
+    windows = ContextWindows.from_model(
+        model, req.context_length, req.context_stride, req.context_weighting
+    )
+    req.post_process().validate()
+    return req.model_copy(
+        update={
+            "sampler": sampler.name,
+            "steps": steps,
+            "guidance": guidance,
+            "context_length": windows.length,
+            "context_stride": windows.stride,
+            "context_weighting": windows.weighting,
+        }
+    )
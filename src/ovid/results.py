@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .registry import ModelSpec
+
+INDEX_NAME = ".ovid-results.json"
+INDEX_FLUSH_SECONDS = 30.0
+
+
+def weight_identity(root: Path) -> list[list[Any]]:
+    if root.is_file():
+        stat = root.stat()
+        return [[root.name, stat.st_size, stat.st_mtime_ns]]
+    if not root.is_dir():
+        return []
+    files = []
+    for path in sorted(root.rglob("*")):
+        if path.is_file():
+            stat = path.stat()
+            files.append([path.relative_to(root).as_posix(), stat.st_size, stat.st_mtime_ns])
+    return files
+
+
+def _stat_key(path: Path) -> Optional[tuple[int, int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+_identities: Dict[Path, tuple[list[Path], tuple[Any, ...], list[list[Any]]]] = {}
+_identities_lock = threading.Lock()
+
+
+def cached_weight_identity(root: Path) -> list[list[Any]]:
+    # Re-stats the files and folders found last time instead of walking the tree. Folder
+    # stats change when entries are added, removed or renamed; file stats change when a
+    # file is rewritten or replaced.
+    with _identities_lock:
+        cached = _identities.get(root)
+    if cached is not None:
+        paths, stamps, identity = cached
+        if tuple(_stat_key(path) for path in paths) == stamps:
+            return identity
+    paths = [root, *sorted(root.rglob("*"))] if root.is_dir() else [root]
+    stamps = tuple(_stat_key(path) for path in paths)
+    identity = weight_identity(root)
+    with _identities_lock:
+        _identities[root] = (paths, stamps, identity)
+    return identity
+
+
+def result_key(model: ModelSpec, fields: Dict[str, Any]) -> str:
+    payload = {
+        "model": {"name": model.name, "pipeline": model.pipeline, "extra": model.extra},
+        "weights": {
+            name: cached_weight_identity(Path(model.extra[name]).resolve())
+            for name in ("adapter_path", "base_model_path")
+            if model.extra.get(name)
+        },
+        "request": fields,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, root: Path, quota_bytes: int) -> None:
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.index_path = root / INDEX_NAME
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = self._read_index()
+        self._dirty = False
+        self._written_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.quota_bytes > 0
+
+    def lookup(self, key: str) -> Optional[Path]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            path = self.root / entry["file"] if entry else None
+            if path is None or not path.exists():
+                if entry:
+                    del self._entries[key]
+                    self._dirty = True
+                self.misses += 1
+                return None
+            # Hits only bump last_used; the index is rewritten at most every
+            # INDEX_FLUSH_SECONDS, on the next store and on shutdown.
+            entry["last_used"] = time.time()
+            self.hits += 1
+            self._dirty = True
+            if time.monotonic() - self._written_at >= INDEX_FLUSH_SECONDS:
+                self._write_index()
+            return path
+
+    def store(self, key: str, path: Path) -> None:
+        if not self.enabled or not path.exists():
+            return
+        with self._lock:
+            now = time.time()
+            self._entries[key] = {
+                "file": path.name,
+                "size": path.stat().st_size,
+                "created": now,
+                "last_used": now,
+            }
+            self._evict()
+            self._write_index()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self._write_index()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            used = sum(entry["size"] for entry in self._entries.values())
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "used_mb": round(used / 2**20, 1),
+                "quota_mb": round(self.quota_bytes / 2**20, 1),
+            }
+
+    def _evict(self) -> None:
+        used = sum(entry["size"] for entry in self._entries.values())
+        by_age = sorted(self._entries.items(), key=lambda item: item[1]["last_used"])
+        for key, entry in by_age:
+            if used <= self.quota_bytes:
+                break
+            (self.root / entry["file"]).unlink(missing_ok=True)
+            del self._entries[key]
+            used -= entry["size"]
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        if not self.index_path.exists():
+            return {}
+        try:
+            with self.index_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        entries = data.get("entries", {})
+        return entries if isinstance(entries, dict) else {}
+
+    def _write_index(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump({"entries": self._entries}, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+        self._written_at = time.monotonic()
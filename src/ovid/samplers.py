@@ -0,0 +1,138 @@
+from dataclasses import dataclass, field
+import functools
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .registry import ModelSpec
+
+
+@dataclass(frozen=True)
+class Sampler:
+    name: str
+    scheduler: str
+    min_steps: int
+    max_steps: int
+    default_steps: int
+    default_guidance: float = 7.5
+    max_guidance: Optional[float] = None
+    lcm: bool = False
+    config: Dict[str, Any] = field(default_factory=dict)
+
+
+SAMPLERS: Dict[str, Sampler] = {
+    sampler.name: sampler
+    for sampler in (
+        Sampler(
+            "ddim",
+            "DDIMScheduler",
+            min_steps=5,
+            max_steps=60,
+            default_steps=20,
+            config={"clip_sample": False, "timestep_spacing": "linspace", "steps_offset": 1},
+        ),
+        Sampler(
+            "dpmpp",
+            "DPMSolverMultistepScheduler",
+            min_steps=4,
+            max_steps=60,
+            default_steps=12,
+            config={
+                "algorithm_type": "dpmsolver++",
+                "solver_order": 2,
+                "use_karras_sigmas": True,
+                "timestep_spacing": "linspace",
+                "steps_offset": 1,
+            },
+        ),
+        Sampler(
+            "euler",
+            "EulerDiscreteScheduler",
+            min_steps=5,
+            max_steps=60,
+            default_steps=15,
+            config={"timestep_spacing": "linspace", "steps_offset": 1},
+        ),
+        Sampler(
+            "euler_a",
+            "EulerAncestralDiscreteScheduler",
+            min_steps=5,
+            max_steps=60,
+            default_steps=15,
+            config={"timestep_spacing": "linspace", "steps_offset": 1},
+        ),
+        Sampler(
+            "unipc",
+            "UniPCMultistepScheduler",
+            min_steps=4,
+            max_steps=60,
+            default_steps=10,
+            config={"timestep_spacing": "linspace", "steps_offset": 1},
+        ),
+        Sampler(
+            "lcm",
+            "LCMScheduler",
+            min_steps=1,
+            max_steps=8,
+            default_steps=4,
+            default_guidance=1.5,
+            max_guidance=2.0,
+            lcm=True,
+            config={"beta_schedule": "linear"},
+        ),
+    )
+}
+
+DEFAULT_SAMPLER = "ddim"
+
+
+def model_sampler(model: ModelSpec, name: Optional[str] = None) -> Sampler:
+    name = name or model.extra.get("sampler") or DEFAULT_SAMPLER
+    sampler = SAMPLERS.get(name)
+    if sampler is None:
+        raise RuntimeError(f"Unknown sampler '{name}'. Use one of: {', '.join(SAMPLERS)}.")
+    if sampler.lcm and not model.extra.get("lcm_lora"):
+        raise RuntimeError(
+            f"Sampler 'lcm' needs an LCM motion LoRA; set 'lcm_lora' in {model.name}'s model.json."
+        )
+    return sampler
+
+
+def resolve_settings(
+    sampler: Sampler, steps: Optional[int], guidance: Optional[float]
+) -> tuple[int, float]:
+    steps = sampler.default_steps if steps is None else steps
+    guidance = sampler.default_guidance if guidance is None else guidance
+    if not sampler.min_steps <= steps <= sampler.max_steps:
+        raise RuntimeError(
+            f"Sampler '{sampler.name}' takes {sampler.min_steps}-{sampler.max_steps} steps, "
+            f"got {steps}."
+        )
+    if sampler.max_guidance is not None and guidance > sampler.max_guidance:
+        raise RuntimeError(
+            f"Sampler '{sampler.name}' needs guidance <= {sampler.max_guidance}, got {guidance}."
+        )
+    return steps, guidance
+
+
+@functools.lru_cache(maxsize=16)
+def _base_config(base_dir: str) -> Dict[str, Any]:
+    from diffusers import DDIMScheduler
+
+    return dict(DDIMScheduler.load_config(base_dir, subfolder="scheduler"))
+
+
+def build_scheduler(sampler: Sampler, base_dir: Path) -> Any:
+    import diffusers
+
+    scheduler_cls = getattr(diffusers, sampler.scheduler)
+    return scheduler_cls.from_config(_base_config(str(base_dir)), **sampler.config)
+
+
+def apply_sampler(pipe: Any, sampler: Sampler, base_dir: Path, lcm_lora: bool) -> None:
+    # Schedulers hold no weights, so swapping one leaves the resident UNet untouched.
+    pipe.scheduler = build_scheduler(sampler, base_dir)
+    if lcm_lora:
+        if sampler.lcm:
+            pipe.enable_lora()
+        else:
+            pipe.disable_lora()
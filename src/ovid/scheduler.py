@@ -0,0 +1,450 @@
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from .cache import PipelineKey, get_pipeline_cache
+from .embeddings import get_embedding_cache
+from .jobs import JobCancelled
+from .metrics import accelerator_memory, host_rss_bytes, observe_stage, stage_totals
+from .longvideo import FrameSink
+from .pipeline import BatchItem, StepCallback, VideoPipeline
+from .registry import ModelSpec
+
+
+@dataclass(frozen=True)
+class DeviceSlot:
+    device: str
+    threads: Optional[int] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.device}:{self.threads}t" if self.threads else self.device
+
+
+def parse_devices(spec: str) -> list[DeviceSlot]:
+    slots = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        if item.startswith("cpu"):
+            _, _, threads = item.partition(":")
+            slots.append(DeviceSlot("cpu", int(threads) if threads else None))
+        elif item == "cuda" or item.startswith("cuda:"):
+            slots.append(DeviceSlot(item))
+        else:
+            raise RuntimeError(f"Unknown device '{item}' in OVID_DEVICES.")
+    return slots
+
+
+THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+_spawn_env_lock = threading.Lock()
+
+
+@contextmanager
+def _thread_env(threads: Optional[int]) -> Iterator[None]:
+    # Thread pools read these once, when the library loads, so a worker has to be started
+    # with them already set; spawned and forked children copy the environment at start.
+    if not threads:
+        yield
+        return
+    with _spawn_env_lock:
+        saved = {name: os.environ.get(name) for name in THREAD_VARS}
+        os.environ.update({name: str(threads) for name in THREAD_VARS})
+        try:
+            yield
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def _worker_main(slot: DeviceSlot, conn: Any) -> None:
+    backlog: "deque[tuple]" = deque()
+    cancelled: set[int] = set()
+    keys: Dict[PipelineKey, str] = {}
+
+    def drain() -> None:
+        while conn.poll():
+            message = conn.recv()
+            if message[0] == "cancel":
+                cancelled.add(message[1])
+            else:
+                backlog.append(message)
+
+    def resident() -> list[str]:
+        cache = get_pipeline_cache()
+        return sorted({name for key, name in keys.items() if cache.contains(key)})
+
+    def memory() -> Dict[str, Any]:
+        # Rendering happens here, not in the API process, so its gauges cannot see this.
+        device = "cuda:0" if slot.device == "cuda" else slot.device
+        accelerator = accelerator_memory()
+        return {
+            "rss": host_rss_bytes(),
+            "accelerator": {device: accelerator[device]} if device in accelerator else {},
+        }
+
+    def run(kind: str, task_id: int, payload: Any) -> Any:
+        model: ModelSpec = payload[0]
+        options: Dict[str, Any] = payload[1]
+        pipeline = VideoPipeline(model, device=slot.device, threads=slot.threads, **options)
+        keys[pipeline.cache_key()] = model.name
+        if kind == "load":
+            pipeline.load()
+            return None
+        if kind == "unload":
+            return pipeline.unload()
+        _, _, items, frames, width, height, steps, guidance, report, previews, stream = payload
+
+        def on_step(progress: Any) -> None:
+            if report:
+                conn.send(("step", task_id, progress))
+            drain()
+            if task_id in cancelled:
+                raise JobCancelled()
+
+        def on_frames(index: int, chunk: Any) -> None:
+            conn.send(("frames", task_id, (index, chunk)))
+
+        return pipeline.render_batch(
+            items,
+            frames,
+            width,
+            height,
+            steps,
+            guidance,
+            on_step=on_step,
+            previews=previews,
+            on_frames=on_frames if stream else None,
+        )
+
+    conn.send(("ready", -1, memory()))
+    while True:
+        try:
+            message = backlog.popleft() if backlog else conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        kind, task_id, payload = message
+        if kind == "stop":
+            return
+        if kind == "cancel":
+            cancelled.add(task_id)
+            continue
+        if task_id in cancelled:
+            conn.send(("cancelled", task_id, None))
+            continue
+        try:
+            with stage_totals() as totals:
+                value = run(kind, task_id, payload)
+        except JobCancelled:
+            conn.send(("cancelled", task_id, None))
+        except Exception as exc:
+            conn.send(("error", task_id, str(exc) or type(exc).__name__))
+        else:
+            embeddings = get_embedding_cache().stats()
+            conn.send(
+                ("result", task_id, (value, dict(totals), resident(), embeddings, memory()))
+            )
+        cancelled.discard(task_id)
+
+
+@dataclass
+class _Task:
+    id: int
+    future: "Future[Any]"
+    on_step: Optional[StepCallback] = None
+    on_frames: Optional[FrameSink] = None
+    cancel_sent: bool = False
+
+
+@dataclass
+class _Worker:
+    index: int
+    slot: DeviceSlot
+    process: Any = None
+    conn: Any = None
+    alive: bool = False
+    crashes: int = 0
+    tasks: Dict[int, _Task] = field(default_factory=dict)
+    resident: set[str] = field(default_factory=set)
+    embeddings: Dict[str, Any] = field(default_factory=dict)
+    memory: Dict[str, Any] = field(default_factory=dict)
+    send_lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class DeviceScheduler:
+    def __init__(
+        self,
+        slots: list[DeviceSlot],
+        start_method: str = "spawn",
+        restart_delay: float = 1.0,
+        wait_timeout: float = 120.0,
+        spill_depth: int = 2,
+    ) -> None:
+        if not slots:
+            raise RuntimeError("At least one device slot is required.")
+        self.restart_delay = restart_delay
+        self.wait_timeout = wait_timeout
+        self.spill_depth = spill_depth
+        self._ctx = multiprocessing.get_context(start_method)
+        self._workers = [_Worker(index=i, slot=slot) for i, slot in enumerate(slots)]
+        self._cond = threading.Condition()
+        self._ids = itertools.count()
+        self._closing = False
+
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+
+    def start(self) -> None:
+        for worker in self._workers:
+            if worker.process is None:
+                self._spawn(worker)
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._closing = True
+        for worker in self._workers:
+            if worker.alive:
+                self._send(worker, ("stop", -1, None))
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+
+    def render(
+        self,
+        model: ModelSpec,
+        items: list[BatchItem],
+        frames: int,
+        width: int,
+        height: int,
+        steps: Optional[int],
+        guidance: Optional[float],
+        on_step: Optional[StepCallback] = None,
+        previews: bool = False,
+        device: Optional[str] = None,
+        on_frames: Optional[FrameSink] = None,
+        **options: Any,
+    ) -> list[Any]:
+        report = on_step is not None
+        stream = on_frames is not None
+        payload = (
+            model, options, items, frames, width, height, steps, guidance, report, previews, stream
+        )
+        worker = self._pick(model, device)
+        return self._submit(worker, "render", payload, on_step, on_frames).result()
+
+    def load(self, model: ModelSpec, device: Optional[str] = None) -> None:
+        self._submit(self._pick(model, device), "load", (model, {})).result()
+
+    def unload(self, model: ModelSpec) -> bool:
+        with self._cond:
+            holders = [w for w in self._workers if w.alive and model.name in w.resident]
+        futures = [self._submit(worker, "unload", (model, {})) for worker in holders]
+        return any([future.result() for future in futures])
+
+    def resident_count(self) -> int:
+        with self._cond:
+            return sum(len(worker.resident) for worker in self._workers)
+
+    def memory_samples(self, kind: str) -> list[tuple[Dict[str, str], float]]:
+        # As of each worker's start or last finished task; kind is "rss", "allocated" or "reserved".
+        samples = []
+        with self._cond:
+            for worker in self._workers:
+                memory = worker.memory
+                if kind == "rss":
+                    if memory.get("rss") is not None:
+                        labels = {"worker": str(worker.index), "device": worker.slot.device}
+                        samples.append((labels, memory["rss"]))
+                    continue
+                for device, values in memory.get("accelerator", {}).items():
+                    samples.append(({"worker": str(worker.index), "device": device}, values[kind]))
+        return samples
+
+    def stats(self) -> list[Dict[str, Any]]:
+        with self._cond:
+            return [
+                {
+                    "device": worker.slot.device,
+                    "threads": worker.slot.threads,
+                    "pid": worker.process.pid if worker.process is not None else None,
+                    "alive": worker.alive,
+                    "tasks": len(worker.tasks),
+                    "resident": sorted(worker.resident),
+                    "crashes": worker.crashes,
+                    "embeddings": worker.embeddings,
+                    "memory": worker.memory,
+                }
+                for worker in self._workers
+            ]
+
+    def _pick(self, model: ModelSpec, device: Optional[str] = None) -> _Worker:
+        kind = (device or model.extra.get("device") or "auto").split(":")[0]
+        candidates = [w for w in self._workers if kind == "auto" or w.slot.device.startswith(kind)]
+        if not candidates:
+            raise RuntimeError(f"No worker in OVID_DEVICES can run on '{kind}'.")
+        model_name = model.name
+        deadline = time.monotonic() + self.wait_timeout
+        with self._cond:
+            while True:
+                alive = [worker for worker in candidates if worker.alive]
+                if alive:
+                    # A worker that holds the model wins: loading it elsewhere costs more than
+                    # waiting for a batch. Past spill_depth queued batches it competes on load
+                    # like the rest, then the one holding the fewest other models wins.
+                    def rank(w: _Worker) -> tuple:
+                        holds = model_name in w.resident and len(w.tasks) < self.spill_depth
+                        return (not holds, len(w.tasks), len(w.resident), w.index)
+
+                    return min(alive, key=rank)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._closing:
+                    raise RuntimeError("No device workers are running.")
+                self._cond.wait(remaining)
+
+    def _submit(
+        self,
+        worker: _Worker,
+        kind: str,
+        payload: Any,
+        on_step: Optional[StepCallback] = None,
+        on_frames: Optional[FrameSink] = None,
+    ) -> "Future[Any]":
+        task = _Task(id=next(self._ids), future=Future(), on_step=on_step, on_frames=on_frames)
+        with self._cond:
+            if not worker.alive:
+                raise RuntimeError(f"Device worker {worker.slot.label} is not running.")
+            worker.tasks[task.id] = task
+        if not self._send(worker, (kind, task.id, payload)):
+            with self._cond:
+                worker.tasks.pop(task.id, None)
+            raise RuntimeError(f"Device worker {worker.slot.label} is not running.")
+        return task.future
+
+    def _send(self, worker: _Worker, message: tuple) -> bool:
+        try:
+            with worker.send_lock:
+                worker.conn.send(message)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def _spawn(self, worker: _Worker) -> None:
+        with self._cond:
+            if self._closing:
+                return
+        parent, child = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.slot, child),
+            name=f"ovid-device-{worker.slot.label}",
+            daemon=True,
+        )
+        with _thread_env(worker.slot.threads):
+            process.start()
+        child.close()
+        with self._cond:
+            worker.process = process
+            worker.conn = parent
+            worker.alive = True
+            self._cond.notify_all()
+        threading.Thread(
+            target=self._read,
+            args=(worker, parent, process),
+            name=f"ovid-device-reader-{worker.index}",
+            daemon=True,
+        ).start()
+
+    def _read(self, worker: _Worker, conn: Any, process: Any) -> None:
+        while True:
+            try:
+                kind, task_id, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "step":
+                self._on_step(worker, task_id, payload)
+                continue
+            if kind == "frames":
+                self._on_frames(worker, task_id, payload)
+                continue
+            if kind == "ready":
+                with self._cond:
+                    worker.memory = payload
+                continue
+            with self._cond:
+                task = worker.tasks.pop(task_id, None)
+                if kind == "result":
+                    worker.crashes = 0
+                    worker.resident = set(payload[2])
+                    worker.embeddings = payload[3]
+                    worker.memory = payload[4]
+                self._cond.notify_all()
+            if task is None:
+                continue
+            if kind == "result":
+                value, totals = payload[0], payload[1]
+                for stage, seconds in totals.items():
+                    observe_stage(stage, seconds)
+                task.future.set_result(value)
+            elif kind == "cancelled":
+                task.future.set_exception(JobCancelled())
+            else:
+                task.future.set_exception(RuntimeError(payload))
+        self._on_exit(worker, conn, process)
+
+    def _on_step(self, worker: _Worker, task_id: int, progress: Any) -> None:
+        with self._cond:
+            task = worker.tasks.get(task_id)
+        if task is None or task.on_step is None:
+            return
+        try:
+            task.on_step(progress)
+        except JobCancelled:
+            if not task.cancel_sent:
+                task.cancel_sent = True
+                self._send(worker, ("cancel", task_id, None))
+
+    def _on_frames(self, worker: _Worker, task_id: int, payload: Any) -> None:
+        with self._cond:
+            task = worker.tasks.get(task_id)
+        if task is None or task.on_frames is None:
+            return
+        index, chunk = payload
+        try:
+            task.on_frames(index, chunk)
+        except RuntimeError:
+            # The encoder gave up on this clip; keep reading so the render can still finish.
+            task.on_frames = None
+
+    def _on_exit(self, worker: _Worker, conn: Any, process: Any) -> None:
+        conn.close()
+        process.join(5)
+        with self._cond:
+            worker.alive = False
+            tasks = list(worker.tasks.values())
+            worker.tasks.clear()
+            worker.resident.clear()
+            worker.memory = {}
+            if self._closing:
+                return
+            worker.crashes += 1
+            delay = min(30.0, self.restart_delay * 2 ** (worker.crashes - 1))
+        error = RuntimeError(
+            f"Device worker {worker.slot.label} exited unexpectedly "
+            f"(exit code {process.exitcode})."
+        )
+        for task in tasks:
+            task.future.set_exception(error)
+        timer = threading.Timer(delay, self._spawn, args=(worker,))
+        timer.daemon = True
+        timer.start()
@@ -1,25 +1,32 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse
-from pydantic import BaseModel, Field
-from uuid import uuid4
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, FileResponse, Response, StreamingResponse
+from pydantic import BaseModel
+import base64
+from concurrent.futures import Future
+import functools
+import io
+import json
 from pathlib import Path
+import time
+from typing import TYPE_CHECKING, Iterator, Optional
 
+from .cache import get_pipeline_cache
 from .config import load_settings
-from .pipeline import VideoPipeline
-from .registry import list_models, get_model
+from .embeddings import get_embedding_cache
+from .encode import FORMATS, EncodeResult, EncoderPool, FrameStream
+from .jobs import DONE, Job, JobCancelled, JobQueue, QueueFullError
+from .latents import get_latent_store
+from .longvideo import FrameSink
+from .metrics import CONTENT_TYPE, HTTP_SECONDS, REGISTRY, Gauge
+from .outputs import serve_file
+from .pipeline import BatchItem, StepProgress, VideoPipeline
+from .registry import ModelSpec, list_models, get_model
+from .request import GenerateRequest, resolve_request
+from .results import ResultCache, result_key
+from .scheduler import DeviceScheduler, parse_devices
 
-
-class GenerateRequest(BaseModel):
-    prompt: str = Field(..., min_length=1)
-    negative_prompt: str | None = None
-    model: str | None = None
-    frames: int = Field(16, ge=1, le=240)
-    fps: int = Field(8, ge=1, le=60)
-    width: int = Field(512, ge=128, le=1024)
-    height: int = Field(512, ge=128, le=1024)
-    steps: int = Field(20, ge=5, le=60)
-    guidance: float = Field(7.5, ge=1.0, le=15.0)
-    seed: int | None = None
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class GenerateResponse(BaseModel):
@@ -28,8 +35,322 @@ class GenerateResponse(BaseModel):
     output: str
 
 
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    model: str
+    cached: bool
+    output: str | None = None
+    error: str | None = None
+    batch_size: int
+    timings: dict[str, float | None]
+
+
+def _job_response(job: Job) -> JobResponse:
+    return JobResponse(
+        id=job.id,
+        status=job.status,
+        model=job.model.name,
+        cached=job.cached,
+        output=job.output,
+        error=job.error,
+        batch_size=job.batch_size,
+        timings=job.timings(),
+    )
+
+
+def _resolve_model(req: GenerateRequest) -> ModelSpec:
+    if req.model:
+        model_spec = get_model(req.model)
+    else:
+        model_spec = next(iter(list_models().values()), None)
+    if model_spec:
+        return model_spec
+    if not list_models():
+        raise HTTPException(status_code=400, detail="No local models found in models/.")
+    raise HTTPException(status_code=404, detail="Model not found.")
+
+
+def _resolve_render_options(req: GenerateRequest, model_spec: ModelSpec) -> GenerateRequest:
+    try:
+        return resolve_request(req, model_spec)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+def _batch_key(job: Job) -> tuple:
+    req: GenerateRequest = job.request
+    return (
+        job.model.name,
+        *req.post_process().render_size(),
+        req.keyframes(),
+        req.sampler,
+        req.steps,
+        req.guidance,
+        req.device,
+        req.dtype,
+        req.context_length,
+        req.context_stride,
+        req.context_weighting,
+        req.refine_strength if req.refine else None,
+    )
+
+
+def _preview_url(preview) -> str:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.fromarray(preview).save(buf, format="JPEG", quality=80)
+    return "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def _progress_reporter(jobs: list[Job]):
+    def on_step(progress: StepProgress) -> None:
+        for index, job in enumerate(jobs):
+            event = {
+                "type": "step",
+                "step": progress.step,
+                "steps": progress.steps,
+                "step_seconds": round(progress.step_seconds, 3),
+                "eta_seconds": round(progress.eta_seconds, 1),
+            }
+            preview = progress.previews[index] if progress.previews is not None else None
+            if preview is not None and job.request.preview:
+                event["preview"] = _preview_url(preview)
+            job.emit(event)
+        if all(job.cancel_requested for job in jobs):
+            raise JobCancelled()
+
+    return on_step
+
+
+def _job_output(filename: str) -> bool:
+    # Job outputs are written once under a fresh job id; other files in the folder, such as
+    # ovid generate's default ovid-output.mp4, may be overwritten in place.
+    stem, dot, suffix = filename.partition(".")
+    return (
+        len(stem) == 32
+        and all(c in "0123456789abcdef" for c in stem)
+        and dot + suffix in FORMATS.values()
+    )
+
+
+def _batch_items(jobs: list[Job], outputs_dir: Path) -> list[BatchItem]:
+    return [
+        BatchItem(
+            prompt=job.request.prompt,
+            negative_prompt=job.request.negative_prompt,
+            out_path=outputs_dir / f"{job.id}{FORMATS[job.request.format]}",
+            fps=job.request.fps,
+            seed=job.request.seed,
+            draft=job.id if job.request.draft else None,
+            refine=job.request.refine,
+            refine_strength=job.request.refine_strength,
+        )
+        for job in jobs
+    ]
+
+
+def _render_batch(
+    jobs: list[Job],
+    items: list[BatchItem],
+    scheduler: Optional[DeviceScheduler] = None,
+    on_frames: Optional[FrameSink] = None,
+) -> list["np.ndarray"]:
+    req: GenerateRequest = jobs[0].request
+    options = {"dtype": req.dtype, "sampler": req.sampler, "context": req.context()}
+
+    if scheduler:
+        render = functools.partial(
+            scheduler.render, jobs[0].model, device=req.device, on_frames=on_frames, **options
+        )
+    else:
+        render = functools.partial(
+            VideoPipeline(jobs[0].model, device=req.device, **options).render_batch,
+            on_frames=on_frames,
+        )
+    width, height = req.post_process().render_size()
+    return render(
+        items,
+        frames=req.keyframes(),
+        width=width,
+        height=height,
+        steps=req.steps,
+        guidance=req.guidance,
+        on_step=_progress_reporter(jobs),
+        previews=any(job.request.preview for job in jobs),
+    )
+
+
+def _check_refine(req: GenerateRequest, model_spec: ModelSpec) -> None:
+    if not req.refine:
+        return
+    meta = get_latent_store().meta(req.refine)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Draft not found or expired.")
+    width, height = req.post_process().render_size()
+    if meta.get("model") != model_spec.name:
+        raise HTTPException(
+            status_code=400, detail=f"Draft was rendered with model '{meta.get('model')}'."
+        )
+    if (meta.get("frames"), meta.get("width"), meta.get("height")) != (
+        req.keyframes(),
+        width,
+        height,
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail="Refine with the draft's frames, width, height, interpolate and render_scale.",
+        )
+
+
+def _interpolation_saved(job: Job) -> Optional[float]:
+    req: GenerateRequest = job.request
+    if req.interpolate <= 1 or job.started_at is None or job.denoised_at is None:
+        return None
+    # Denoising grows about linearly with frames, so native generation would have taken
+    # frames / keyframes times as long.
+    denoise = job.denoised_at - job.started_at
+    native = denoise * req.frames / req.keyframes()
+    return native - denoise - job.stage_seconds.get("interpolate", 0.0)
+
+
 def create_app() -> FastAPI:
     app = FastAPI(title="OVID", version="0.1.0")
+    settings = load_settings()
+    get_pipeline_cache().start_reaper()
+    slots = parse_devices(settings.devices)
+    scheduler = DeviceScheduler(slots) if slots else None
+    if scheduler:
+        scheduler.start()
+    results = ResultCache(settings.outputs_dir, settings.result_cache_mb * 2**20)
+    app.add_event_handler("shutdown", results.flush)
+    encoder = EncoderPool(settings.encode_workers, settings.encode_queue)
+
+    def run_batch(jobs: list[Job]) -> list["Future[EncodeResult]"]:
+        settings.outputs_dir.mkdir(parents=True, exist_ok=True)
+        items = _batch_items(jobs, settings.outputs_dir)
+        req: GenerateRequest = jobs[0].request
+        if not req.context().applies(req.keyframes()):
+            rendered = _render_batch(jobs, items, scheduler)
+            return [
+                encoder.submit(
+                    job.request.post_process().apply(frames),
+                    item.out_path,
+                    item.fps,
+                    job.request.encode_options(),
+                )
+                for job, item, frames in zip(jobs, items, rendered)
+            ]
+
+        # Long clips are encoded while they render; frames arrive one window at a time and
+        # clips finish in order, so each encoder is only claimed once its clip starts.
+        streams = [FrameStream(req.keyframes()) for _ in jobs]
+        futures: list[Optional["Future[EncodeResult]"]] = [None] * len(jobs)
+
+        def on_frames(index: int, chunk: "np.ndarray") -> None:
+            if futures[index] is None:
+                job, item = jobs[index], items[index]
+                futures[index] = encoder.submit(
+                    job.request.post_process().apply(streams[index]),
+                    item.out_path,
+                    item.fps,
+                    job.request.encode_options(),
+                )
+            streams[index].put(chunk)
+
+        try:
+            _render_batch(jobs, items, scheduler, on_frames=on_frames)
+        except BaseException as exc:
+            for stream in streams:
+                stream.fail(exc)
+            raise
+        for stream in streams:
+            stream.close()
+        if any(future is None for future in futures):
+            raise RuntimeError("The renderer finished without producing every clip.")
+        return [future for future in futures if future is not None]
+
+    def publish(job: Job, result: EncodeResult) -> str:
+        saved = _interpolation_saved(job)
+        if saved is not None:
+            job.stage_seconds["interpolation_saved"] = saved
+        if job.key is not None:
+            results.store(job.key, result.path)
+        return f"/outputs/{result.path.name}"
+
+    queue = JobQueue(
+        run_batch,
+        max_size=settings.queue_size,
+        history=settings.job_history,
+        batch_key=_batch_key,
+        max_batch=settings.batch_max,
+        batch_window=settings.batch_window,
+        publish=publish,
+        workers=scheduler.size if scheduler else 1,
+    )
+    queue.start()
+
+    Gauge(
+        "ovid_resident_models",
+        "Pipelines currently held in the pipeline cache.",
+        lambda: [
+            ({}, scheduler.resident_count() if scheduler else len(get_pipeline_cache()))
+        ],
+    )
+    Gauge("ovid_queue_depth", "Jobs waiting for the worker.", lambda: [({}, queue.depth())])
+    if scheduler:
+        Gauge(
+            "ovid_worker_rss_bytes",
+            "Resident set size of each device worker process.",
+            lambda: scheduler.memory_samples("rss"),
+            ["worker", "device"],
+        )
+        Gauge(
+            "ovid_worker_accelerator_allocated_bytes",
+            "Accelerator memory held by tensors in each device worker.",
+            lambda: scheduler.memory_samples("allocated"),
+            ["worker", "device"],
+        )
+        Gauge(
+            "ovid_worker_accelerator_reserved_bytes",
+            "Accelerator memory reserved by the caching allocator in each device worker.",
+            lambda: scheduler.memory_samples("reserved"),
+            ["worker", "device"],
+        )
+
+    @app.middleware("http")
+    async def record_latency(request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(response.status_code),
+        )
+        return response
+
+    def submit(req: GenerateRequest) -> Job:
+        model_spec = _resolve_model(req)
+        req = _resolve_render_options(req, model_spec)
+        _check_refine(req, model_spec)
+        key = None
+        # A draft must render to leave its latents behind, so it never reuses a result.
+        if results.enabled and req.seed is not None and not req.draft:
+            key = result_key(model_spec, req.result_fields())
+            cached = results.lookup(key)
+            if cached is not None:
+                return queue.add_cached(req, model_spec, key, f"/outputs/{cached.name}")
+        try:
+            return queue.submit(req, model_spec, key=key)
+        except QueueFullError as exc:
+            raise HTTPException(
+                status_code=429,
+                detail=str(exc),
+                headers={"Retry-After": str(exc.retry_after)},
+            ) from exc
 
     @app.get("/", response_class=HTMLResponse)
     def index():
@@ -200,6 +521,32 @@ def create_app() -> FastAPI:
     .status { margin-top: 14px; font-size: 14px; color: var(--muted); }
     .output { margin-top: 10px; }
     .output video { width: 100%; border-radius: 12px; margin-top: 8px; }
+    .output img.preview {
+      width: 100%;
+      border-radius: 12px;
+      margin-top: 8px;
+      image-rendering: auto;
+      filter: blur(0.5px);
+    }
+    .progress {
+      height: 6px;
+      margin-top: 10px;
+      border-radius: 999px;
+      background: rgba(148,163,184,0.15);
+      overflow: hidden;
+    }
+    .progress > div {
+      height: 100%;
+      width: 0;
+      background: linear-gradient(120deg, var(--accent), var(--accent-2));
+      transition: width 200ms ease;
+    }
+    button.secondary {
+      background: rgba(15,23,42,0.8);
+      color: var(--text);
+      border: 1px solid var(--line);
+      margin-left: 8px;
+    }
     .hint { color: var(--muted); font-size: 12px; margin-top: 6px; }
     .chip {
       display: inline-flex;
@@ -285,6 +632,32 @@ def create_app() -> FastAPI:
           </div>
         </div>
 
+        <label for="sampler">Sampler</label>
+        <select id="sampler">
+          <option value="">Model default</option>
+          <option value="ddim">DDIM</option>
+          <option value="dpmpp">DPM-Solver++</option>
+          <option value="euler">Euler</option>
+          <option value="euler_a">Euler ancestral</option>
+          <option value="unipc">UniPC</option>
+          <option value="lcm">LCM (needs LCM LoRA)</option>
+        </select>
+
+        <label for="interpolate">Frame interpolation</label>
+        <select id="interpolate">
+          <option value="1">Off (denoise every frame)</option>
+          <option value="2">2x (denoise every 2nd frame)</option>
+          <option value="3">3x</option>
+          <option value="4">4x</option>
+        </select>
+
+        <label for="render-scale">Render resolution</label>
+        <select id="render-scale">
+          <option value="1">Full (no upscaling)</option>
+          <option value="0.75">75%, upscaled</option>
+          <option value="0.5">50%, upscaled</option>
+        </select>
+
         <div class="row-4">
           <div>
             <label for="frames">Frames</label>
@@ -292,11 +665,11 @@ def create_app() -> FastAPI:
           </div>
           <div>
             <label for="steps">Steps</label>
-            <input id="steps" type="number" min="5" max="60" value="20" />
+            <input id="steps" type="number" min="1" max="60" placeholder="auto" />
           </div>
           <div>
             <label for="guidance">Guidance</label>
-            <input id="guidance" type="number" min="1" max="15" step="0.5" value="7.5" />
+            <input id="guidance" type="number" min="1" max="15" step="0.5" placeholder="auto" />
           </div>
           <div>
             <label for="seed">Seed</label>
@@ -305,6 +678,8 @@ def create_app() -> FastAPI:
         </div>
 
         <button id="go">Generate</button>
+        <button id="cancel" class="secondary" style="display:none;">Cancel</button>
+        <div class="progress"><div id="bar"></div></div>
         <div class="status" id="status"></div>
       </div>
 
@@ -362,8 +737,88 @@ def create_app() -> FastAPI:
       });
     }
 
+    const barEl = document.getElementById("bar");
+    const cancelEl = document.getElementById("cancel");
+    let currentJob = null;
+    let currentEvents = null;
+
+    function errorMessage(detail) {
+      // Validation errors (422) carry a list of {loc, msg} objects instead of a string.
+      if (typeof detail === "string") return detail;
+      if (!Array.isArray(detail)) return "Failed.";
+      return detail
+        .map((d) => {
+          const field = (d.loc || []).filter((part) => part !== "body").join(".");
+          return field ? `${field}: ${d.msg}` : d.msg;
+        })
+        .join("; ");
+    }
+
+    function showVideo(url) {
+      outputEl.innerHTML = "";
+      const video = document.createElement("video");
+      video.controls = true;
+      video.src = url;
+      outputEl.appendChild(video);
+    }
+
+    function showPreview(dataUrl) {
+      let img = outputEl.querySelector("img.preview");
+      if (!img) {
+        outputEl.innerHTML = "";
+        img = document.createElement("img");
+        img.className = "preview";
+        outputEl.appendChild(img);
+      }
+      img.src = dataUrl;
+    }
+
+    function finishJob() {
+      if (currentEvents) currentEvents.close();
+      currentEvents = null;
+      currentJob = null;
+      cancelEl.style.display = "none";
+    }
+
+    function followJob(jobId) {
+      currentEvents = new EventSource(`/v1/jobs/${jobId}/events`);
+      currentEvents.addEventListener("step", (e) => {
+        const data = JSON.parse(e.data);
+        barEl.style.width = `${Math.round((100 * data.step) / data.steps)}%`;
+        statusEl.textContent =
+          `Step ${data.step}/${data.steps} · ${data.step_seconds.toFixed(2)}s/step · ` +
+          `ETA ${Math.ceil(data.eta_seconds)}s`;
+        if (data.preview) showPreview(data.preview);
+      });
+      currentEvents.addEventListener("status", (e) => {
+        const data = JSON.parse(e.data);
+        if (data.status === "queued") statusEl.textContent = "Queued...";
+        if (data.status === "running") statusEl.textContent = "Starting...";
+        if (data.status === "encoding") statusEl.textContent = "Encoding video...";
+        if (data.status === "done") {
+          barEl.style.width = "100%";
+          const saved = data.timings && data.timings.interpolation_saved_seconds;
+          statusEl.textContent = saved
+            ? `Done. Interpolation saved ~${saved.toFixed(1)}s.`
+            : "Done.";
+          showVideo(data.output);
+          finishJob();
+        }
+        if (data.status === "failed" || data.status === "cancelled") {
+          statusEl.textContent = data.error || "Failed.";
+          finishJob();
+        }
+      });
+      currentEvents.onerror = () => {
+        if (currentJob) statusEl.textContent = "Lost connection to progress stream.";
+        finishJob();
+      };
+    }
+
     async function generate() {
-      statusEl.textContent = "Generating...";
+      if (currentJob) return;
+      statusEl.textContent = "Submitting...";
+      barEl.style.width = "0";
       outputEl.innerHTML = "";
       updateFramesFromDuration();
       const payload = {
@@ -374,30 +829,44 @@ def create_app() -> FastAPI:
         fps: parseInt(fpsEl.value, 10) || 8,
         width: parseInt(widthEl.value, 10) || 512,
         height: parseInt(heightEl.value, 10) || 512,
-        steps: parseInt(document.getElementById("steps").value, 10) || 20,
-        guidance: parseFloat(document.getElementById("guidance").value) || 7.5,
+        sampler: document.getElementById("sampler").value || null,
+        interpolate: parseInt(document.getElementById("interpolate").value, 10) || 1,
+        render_scale: parseFloat(document.getElementById("render-scale").value) || 1,
+        steps: parseInt(document.getElementById("steps").value, 10) || null,
+        guidance: parseFloat(document.getElementById("guidance").value) || null,
         seed: document.getElementById("seed").value
           ? parseInt(document.getElementById("seed").value, 10)
           : null,
       };
-      const res = await fetch("/v1/generate", {
+      const res = await fetch("/v1/jobs", {
         method: "POST",
         headers: {"Content-Type": "application/json"},
         body: JSON.stringify(payload),
       });
       const data = await res.json();
       if (!res.ok) {
-        statusEl.textContent = data.detail || "Failed.";
+        statusEl.textContent = errorMessage(data.detail);
         return;
       }
-      statusEl.textContent = "Done.";
-      const video = document.createElement("video");
-      video.controls = true;
-      video.src = data.output;
-      outputEl.appendChild(video);
+      if (data.status === "done") {
+        statusEl.textContent = "Done (cached).";
+        barEl.style.width = "100%";
+        showVideo(data.output);
+        return;
+      }
+      currentJob = data.id;
+      cancelEl.style.display = "inline-block";
+      followJob(data.id);
+    }
+
+    async function cancel() {
+      if (!currentJob) return;
+      await fetch(`/v1/jobs/${currentJob}`, {method: "DELETE"});
+      statusEl.textContent = "Cancelling...";
     }
 
     document.getElementById("go").addEventListener("click", generate);
+    cancelEl.addEventListener("click", cancel);
     presetEl.addEventListener("change", applyPreset);
     fpsEl.addEventListener("change", updateFramesFromDuration);
     durationEl.addEventListener("input", updateFramesFromDuration);
@@ -419,48 +888,109 @@ def create_app() -> FastAPI:
     def models():
         return {"models": [m.name for m in list_models().values()]}
 
+    @app.post("/v1/models/{name}/load")
+    def load_model(name: str):
+        model_spec = get_model(name)
+        if not model_spec:
+            raise HTTPException(status_code=404, detail="Model not found.")
+        try:
+            if scheduler:
+                scheduler.load(model_spec)
+            else:
+                VideoPipeline(model_spec).load()
+        except RuntimeError as exc:
+            raise HTTPException(status_code=501, detail=str(exc)) from exc
+        return {"model": name, "status": "loaded"}
+
+    @app.post("/v1/models/{name}/unload")
+    def unload_model(name: str):
+        model_spec = get_model(name)
+        if not model_spec:
+            raise HTTPException(status_code=404, detail="Model not found.")
+        try:
+            if scheduler:
+                unloaded = scheduler.unload(model_spec)
+            else:
+                unloaded = VideoPipeline(model_spec).unload()
+        except RuntimeError as exc:
+            raise HTTPException(status_code=501, detail=str(exc)) from exc
+        return {"model": name, "status": "unloaded" if unloaded else "not_loaded"}
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+    @app.get("/v1/cache")
+    def cache_stats():
+        stats = {
+            "pipelines": get_pipeline_cache().stats(),
+            "results": results.stats(),
+            "embeddings": get_embedding_cache().stats(),
+            "latents": get_latent_store().stats(),
+        }
+        if scheduler:
+            stats["workers"] = scheduler.stats()
+        return stats
+
     @app.get("/outputs/{filename}")
-    def outputs(filename: str):
+    def outputs(filename: str, request: Request):
         settings = load_settings()
         target = (settings.outputs_dir / filename).resolve()
         if settings.outputs_dir.resolve() not in target.parents:
             raise HTTPException(status_code=400, detail="Invalid filename.")
-        if not target.exists():
+        if not target.is_file():
             raise HTTPException(status_code=404, detail="Output not found.")
-        return FileResponse(target, media_type="video/mp4")
+        return serve_file(target, request.headers, immutable=_job_output(filename))
 
-    @app.post("/v1/generate", response_model=GenerateResponse)
-    def generate(req: GenerateRequest):
-        models = list_models()
-        if not models:
-            raise HTTPException(status_code=400, detail="No local models found in models/.")
+    @app.post("/v1/jobs", response_model=JobResponse, status_code=202)
+    def create_job(req: GenerateRequest):
+        return _job_response(submit(req))
 
-        model_spec = get_model(req.model) if req.model else next(iter(models.values()))
-        if not model_spec:
-            raise HTTPException(status_code=404, detail="Model not found.")
+    @app.get("/v1/jobs/{job_id}", response_model=JobResponse)
+    def get_job(job_id: str):
+        job = queue.get(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found.")
+        return _job_response(job)
 
-        settings = load_settings()
-        settings.outputs_dir.mkdir(parents=True, exist_ok=True)
-        job_id = uuid4().hex
-        out_path = settings.outputs_dir / f"{job_id}.mp4"
+    @app.delete("/v1/jobs/{job_id}", response_model=JobResponse)
+    def cancel_job(job_id: str):
+        job = queue.cancel(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found.")
+        return _job_response(job)
 
-        try:
-            pipeline = VideoPipeline(model_spec)
-            pipeline.generate(
-                prompt=req.prompt,
-                negative_prompt=req.negative_prompt,
-                out_path=out_path,
-                frames=req.frames,
-                fps=req.fps,
-                width=req.width,
-                height=req.height,
-                steps=req.steps,
-                guidance=req.guidance,
-                seed=req.seed,
-            )
-        except RuntimeError as exc:
-            raise HTTPException(status_code=501, detail=str(exc)) from exc
+    @app.get("/v1/jobs/{job_id}/events")
+    def job_events(job_id: str):
+        job = queue.get(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found.")
+
+        def stream() -> Iterator[str]:
+            sent = 0
+            while True:
+                events = job.events_since(sent, timeout=15.0)
+                if not events:
+                    if job.finished:
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                for event in events:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                sent += len(events)
 
-        return GenerateResponse(id=job_id, status="ok", output=f"/outputs/{out_path.name}")
+        return StreamingResponse(
+            stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.post("/v1/generate", response_model=GenerateResponse)
+    def generate(req: GenerateRequest):
+        job = submit(req)
+        job.wait()
+        if job.status != DONE:
+            raise HTTPException(status_code=501, detail=job.error)
+        return GenerateResponse(id=job.id, status="ok", output=job.output)
 
     return app
@@ -0,0 +1,87 @@
+import ctypes
+import json
+import mmap
+from pathlib import Path
+import struct
+from typing import Any, Dict, Iterable
+
+SAFETENSORS_DTYPES = {
+    "F64": "float64",
+    "F32": "float32",
+    "F16": "float16",
+    "BF16": "bfloat16",
+    "I64": "int64",
+    "I32": "int32",
+    "I16": "int16",
+    "I8": "int8",
+    "U8": "uint8",
+    "BOOL": "bool",
+}
+
+
+def read_safetensors_header(path: Path) -> tuple[int, Dict[str, Any]]:
+    with path.open("rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    header.pop("__metadata__", None)
+    return 8 + length, header
+
+
+def mmap_safetensors(path: Path) -> Dict[str, Any]:
+    import torch
+
+    data_start, header = read_safetensors_header(path)
+    with path.open("rb") as f:
+        # ACCESS_COPY maps the file MAP_PRIVATE: pages come straight from the page cache and
+        # are shared by every process mapping the same file until one of them writes.
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    tensors = {}
+    for name, info in header.items():
+        dtype = getattr(torch, SAFETENSORS_DTYPES[info["dtype"]])
+        start, end = info["data_offsets"]
+        shape = info["shape"]
+        if end == start:
+            tensors[name] = torch.empty(shape, dtype=dtype)
+            continue
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        flat = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + start)
+        tensors[name] = flat.view(shape)
+    return tensors
+
+
+def _trim_heap() -> None:
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def share_module_weights(module: Any, files: Iterable[Path]) -> int:
+    targets = module.state_dict(keep_vars=True)
+    matched: Dict[str, Any] = {}
+    for path in files:
+        for name, tensor in mmap_safetensors(path).items():
+            target = targets.get(name)
+            if target is None or name in matched or target.device.type != "cpu":
+                continue
+            if target.dtype != tensor.dtype or target.shape != tensor.shape:
+                continue
+            matched[name] = tensor
+    if matched:
+        module.load_state_dict(matched, strict=False, assign=True)
+    return sum(t.numel() * t.element_size() for t in matched.values())
+
+
+def share_pipeline_weights(pipe: Any, adapter_dir: Path, base_dir: Path) -> int:
+    import torch
+
+    shared = 0
+    for name, component in pipe.components.items():
+        if not isinstance(component, torch.nn.Module):
+            continue
+        dirs = [base_dir / name] + ([adapter_dir] if name == "unet" else [])
+        files = [path for folder in dirs for path in sorted(folder.glob("*.safetensors"))]
+        if files:
+            shared += share_module_weights(component, files)
+    _trim_heap()
+    return shared
@@ -0,0 +1,152 @@
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Optional
+
+import pytest
+
+from ovid.download import CHUNK_SIZE, Downloader
+from ovid.registry import _download_with_checksum
+
+DATA = os.urandom(4 * CHUNK_SIZE + 12345)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    data = DATA
+    advertise_ranges = True
+    honor_ranges = True
+    # Bytes sent per response before the connection drops; None sends everything.
+    cut_after: Optional[int] = None
+    delay = 0.0
+    log: list
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self._respond(body=False)
+
+    def do_GET(self) -> None:
+        self._respond(body=True)
+
+    def _respond(self, body: bool) -> None:
+        size = len(self.data)
+        start, end, status = 0, size - 1, 200
+        header = self.headers.get("Range")
+        if header and self.honor_ranges:
+            first, _, last = header.removeprefix("bytes=").partition("-")
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Length", str(end - start + 1))
+        if self.advertise_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not body:
+            return
+        payload = self.data[start : end + 1]
+        if self.cut_after is not None:
+            payload = payload[: self.cut_after]
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        try:
+            time.sleep(self.delay)
+            self.wfile.write(payload)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+        self.log.append((header, status, len(payload)))
+
+
+@pytest.fixture
+def server():
+    handler = type("Handler", (_Handler,), {"log": [], "lock": threading.Lock()})
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    handler.url = f"http://127.0.0.1:{httpd.server_address[1]}/model.bin"
+    yield handler
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_segments_download_in_parallel(server, tmp_path: Path):
+    server.delay = 0.1
+    part = tmp_path / "model.bin.part"
+    digest = Downloader(connections=4, segment_size=CHUNK_SIZE).fetch(server.url, part)
+    assert digest == _sha(DATA)
+    assert part.read_bytes() == DATA
+    ranged = [entry for entry in server.log if entry[1] == 206]
+    assert len(ranged) == 5
+    assert server.peak > 1
+    assert not part.with_name(part.name + ".json").exists()
+
+
+def test_segmented_download_resumes_after_dropped_connections(server, tmp_path: Path):
+    part = tmp_path / "model.bin.part"
+    server.cut_after = CHUNK_SIZE // 4
+    with pytest.raises(Exception):
+        Downloader(connections=4, segment_size=CHUNK_SIZE).fetch(server.url, part)
+    assert part.with_name(part.name + ".json").exists()
+
+    server.cut_after = None
+    server.log.clear()
+    digest = Downloader(connections=4, segment_size=CHUNK_SIZE).fetch(server.url, part)
+    assert digest == _sha(DATA)
+    assert part.read_bytes() == DATA
+    # Segments pick up where they stopped instead of starting over.
+    assert sum(sent for _, _, sent in server.log) < len(DATA)
+
+
+def test_single_stream_resumes_a_truncated_part(server, tmp_path: Path):
+    server.data = DATA[: CHUNK_SIZE + 5000]
+    part = tmp_path / "model.bin.part"
+    part.write_bytes(server.data[:300000])
+    digest = Downloader(segment_size=CHUNK_SIZE).fetch(server.url, part)
+    assert digest == _sha(server.data)
+    assert part.read_bytes() == server.data
+    assert server.log[-1] == ("bytes=300000-", 206, len(server.data) - 300000)
+
+
+def test_server_without_ranges_falls_back_to_a_full_download(server, tmp_path: Path):
+    server.advertise_ranges = False
+    server.honor_ranges = False
+    part = tmp_path / "model.bin.part"
+    part.write_bytes(b"stale partial bytes")
+    digest = Downloader(connections=4, segment_size=CHUNK_SIZE).fetch(server.url, part)
+    assert digest == _sha(DATA)
+    assert part.read_bytes() == DATA
+    assert all(status == 200 for _, status, _ in server.log)
+
+
+def test_ignored_range_restarts_from_the_beginning(server, tmp_path: Path):
+    server.data = DATA[: CHUNK_SIZE + 5000]
+    server.honor_ranges = False
+    part = tmp_path / "model.bin.part"
+    part.write_bytes(b"x" * 300000)
+    digest = Downloader(segment_size=CHUNK_SIZE).fetch(server.url, part)
+    assert digest == _sha(server.data)
+    assert part.read_bytes() == server.data
+
+
+def test_checksum_mismatch_discards_the_download(server, tmp_path: Path):
+    dest = tmp_path / "model.bin"
+    with pytest.raises(RuntimeError, match="Checksum mismatch"):
+        _download_with_checksum(server.url, dest, "0" * 64, Downloader(segment_size=CHUNK_SIZE))
+    assert not dest.exists()
+    assert not dest.with_suffix(".bin.part").exists()
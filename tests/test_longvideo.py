@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("diffusers")
+
+from ovid.bench.tiny import build_tiny_model, load_spec  # noqa: E402
+from ovid.cache import PipelineCache  # noqa: E402
+from ovid.longvideo import ContextWindows  # noqa: E402
+from ovid.pipeline import BatchItem, VideoPipeline  # noqa: E402
+
+
+@pytest.fixture
+def tiny(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("OVID_HOME", str(tmp_path))
+    return load_spec(build_tiny_model(tmp_path / "models"))
+
+
+def _render(spec, frames: int, seeds: list[int]) -> list:
+    pipeline = VideoPipeline(
+        spec,
+        cache=PipelineCache(budget_bytes=0, idle_ttl=0),
+        device="cpu",
+        context=ContextWindows(length=8, stride=4),
+    )
+    items = [
+        BatchItem(prompt="a cat", negative_prompt=None, out_path=Path("unused"), seed=seed)
+        for seed in seeds
+    ]
+    return pipeline.render_batch(items, frames, 64, 64, 5)
+
+
+def test_windowed_render(tiny):
+    videos = _render(tiny, 12, [0, 1])
+    assert [video.shape for video in videos] == [(12, 64, 64, 3)] * 2
+
+
+def test_windowed_render_is_seeded(tiny):
+    first, second = _render(tiny, 12, [3])[0], _render(tiny, 12, [3])[0]
+    assert (first == second).all()